@@ -0,0 +1,237 @@
+"""Benchmark de bout en bout du débit d'export des reviews.
+
+Pour chaque taille de corpus, un serveur d'API simulé (`pf_api_explorer.mock_server`) est lancé
+dans un processus séparé, puis un processus « worker » exécute la chaîne d'export de l'application :
+pagination (`paginate_export_reviews`, avec le découpage des sélections trop longues, la boucle de
+`execute_export_process` et `execute_bulk_export`) par les appels de l'application (`fetch_reviews_page`
+: cache de fetch, pool de tokens, contrôle du débit, réessais, disjoncteur), normalisation
+(`normalize_reviews`), format à plat (`postprocess_reviews`) et encodage CSV / Excel. Seuls les secrets
+Streamlit sont remplacés (token du serveur simulé) ; l'état de session est celui du mode « bare » de
+Streamlit. Chaque taille tourne dans son propre processus pour isoler le pic mémoire.
+
+Exemples :
+
+    python benchmarks/export_throughput.py --sizes 10000,100000
+    python benchmarks/export_throughput.py --sizes 10000,100000,1000000,5000000 --latency-ms 30
+    python benchmarks/export_throughput.py --compare benchmarks/results/A.json benchmarks/results/B.json
+
+Les résultats sont enregistrés en JSON dans `benchmarks/results/` (horodatage + commit git).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+# « decode » (décodage JSON fait par get_result) est compris dans « fetch »
+STAGES = ["fetch", "decode", "normalize", "flatten", "encode"]
+EXCEL_MAX_ROWS = 1_048_575
+DEFAULT_SIZES = "10000,100000,1000000,5000000"
+
+
+def run_worker(base_url, token, rows, flatten, excel):
+    """Exécute une chaîne d'export complète par le code de l'application et retourne ses mesures"""
+    os.environ["PF_API_BASE_URL"] = base_url  # Lu à l'import de l'application
+    from pf_api_explorer import app
+    from pf_api_explorer.export_pipeline import dataframe_to_excel_bytes, normalize_reviews, postprocess_reviews
+    from pf_api_explorer.instrumentation import get_registry, track_calls
+    from pf_api_explorer.token_pool import PoolToken, TokenPool
+
+    # Seuls les secrets Streamlit manquent hors serveur : pool réduit au token du serveur simulé
+    pool = TokenPool([PoolToken("benchmark", token)])
+    app.get_token_pool = lambda: pool
+
+    stages = dict.fromkeys(STAGES, 0.0)
+    counters = {"pages": 0}
+
+    def fetch_page(page_params):
+        fetch_start = time.perf_counter()
+        with track_calls() as calls:
+            result = app.fetch_reviews_page(page_params)
+        stages["fetch"] += time.perf_counter() - fetch_start
+        stages["decode"] += calls.decode
+        counters["pages"] += 1
+        if not result:
+            raise RuntimeError(f"Erreur API à la page {counters['pages']}")
+        return result
+
+    params = {"start-date": "2000-01-01", "end-date": datetime.date.today().isoformat(), "rows": rows}
+    start = time.perf_counter()
+    time_to_first_row = None
+    docs = []
+    for _, page_docs, _ in app.paginate_export_reviews(fetch_page, params, max_pages=10 ** 9):
+        if page_docs and time_to_first_row is None:
+            time_to_first_row = time.perf_counter() - start
+        docs.extend(page_docs)
+    fetched_at = time.perf_counter()
+
+    stage_start = time.perf_counter()
+    df = normalize_reviews(docs)
+    stages["normalize"] = time.perf_counter() - stage_start
+
+    encode_start = time.perf_counter()
+    csv_size = len(df.to_csv(index=False).encode("utf-8"))
+    excel_size = None
+    if excel and len(df) <= EXCEL_MAX_ROWS:
+        excel_size = len(dataframe_to_excel_bytes(df))
+    stages["encode"] = time.perf_counter() - encode_start
+
+    flat_csv_size = None
+    if flatten:
+        stage_start = time.perf_counter()
+        df_flat = postprocess_reviews(df.copy())
+        stages["flatten"] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        flat_csv_size = len(df_flat.to_csv(index=False, sep=';').encode("utf-8"))
+        stages["encode"] += time.perf_counter() - stage_start
+
+    wall = time.perf_counter() - start
+    fetch_wall = fetched_at - start
+    return {
+        "reviews": len(docs),
+        "pages": counters["pages"],
+        "response_bytes": sum(row["bytes"] for row in get_registry().endpoint_summary() if row["endpoint"] == "/reviews"),
+        "wall_s": wall,
+        "reviews_per_s": len(docs) / wall if wall else None,
+        "fetch_reviews_per_s": len(docs) / fetch_wall if fetch_wall else None,
+        "time_to_first_row_s": time_to_first_row,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stages_s": stages,
+        "csv_bytes": csv_size,
+        "flat_csv_bytes": flat_csv_size,
+        "excel_bytes": excel_size
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Le serveur simulé n'a pas démarré sur le port {port}")
+
+
+def run_size(size, args):
+    """Lance le serveur simulé et le worker pour une taille de corpus"""
+    port = _free_port()
+    server = subprocess.Popen([
+        sys.executable, "-m", "pf_api_explorer.mock_server",
+        "--port", str(port), "--reviews", str(size), "--seed", str(args.seed),
+        "--latency-ms", str(args.latency_ms), "--quota", str(10 ** 12)
+    ], cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    try:
+        _wait_for_port(port)
+        worker_cmd = [
+            sys.executable, __file__, "--worker", "--base-url", f"http://127.0.0.1:{port}",
+            "--rows", str(args.rows)
+        ]
+        if args.no_flatten:
+            worker_cmd.append("--no-flatten")
+        if args.excel:
+            worker_cmd.append("--excel")
+        completed = subprocess.run(worker_cmd, cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+    result["corpus_size"] = size
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results):
+    header = f"{'Corpus':>10} {'Reviews/s':>10} {'TTFR (s)':>9} {'RSS (Mo)':>9} " + " ".join(f"{stage:>9}" for stage in STAGES)
+    print(header)
+    for result in results:
+        stages = " ".join(f"{result['stages_s'][stage]:>9.2f}" for stage in STAGES)
+        print(f"{result['corpus_size']:>10,} {result['reviews_per_s']:>10,.0f} {result['time_to_first_row_s'] or 0:>9.3f} {result['peak_rss_mb']:>9.0f} {stages}")
+
+
+def compare(old_path, new_path):
+    """Compare deux fichiers de résultats (même tailles de corpus)"""
+    old = {r["corpus_size"]: r for r in json.loads(Path(old_path).read_text())["results"]}
+    new = json.loads(Path(new_path).read_text())
+    print(f"Comparaison {old_path} -> {new_path}")
+    for result in new["results"]:
+        size = result["corpus_size"]
+        if size not in old:
+            continue
+        before = old[size]
+        ratio = result["reviews_per_s"] / before["reviews_per_s"] if before["reviews_per_s"] else float("nan")
+        print(f"- {size:,} reviews : {before['reviews_per_s']:,.0f} -> {result['reviews_per_s']:,.0f} reviews/s (x{ratio:.2f}), "
+              f"RSS {before['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} Mo")
+        for stage in STAGES:
+            print(f"    {stage:<10} {before['stages_s'][stage]:>8.2f}s -> {result['stages_s'][stage]:>8.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark du débit d'export des reviews")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Tailles de corpus séparées par des virgules")
+    parser.add_argument("--rows", type=int, default=1000, help="Reviews par page (paramètre rows)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latence simulée par requête")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-flatten", action="store_true", help="Ne pas mesurer le format à plat")
+    parser.add_argument("--excel", action="store_true", help="Mesurer aussi l'encodage Excel (jusqu'à 1 048 575 lignes)")
+    parser.add_argument("--output-dir", default=str(REPO_ROOT / "benchmarks" / "results"))
+    parser.add_argument("--compare", nargs=2, metavar=("ANCIEN", "NOUVEAU"), help="Compare deux fichiers de résultats")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--token", default="benchmark", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.worker:
+        print(json.dumps(run_worker(args.base_url, args.token, args.rows, not args.no_flatten, args.excel)))
+        return
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        print(f"⏱️  Corpus de {size:,} reviews...", flush=True)
+        results.append(run_size(size, args))
+    print_results(results)
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"rows": args.rows, "latency_ms": args.latency_ms, "seed": args.seed, "flatten": not args.no_flatten, "excel": args.excel},
+        "results": results
+    }
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{datetime.datetime.now():%Y%m%d-%H%M%S}_{commit}.json"
+    output_path.write_text(json.dumps(report, indent=2))
+    print(f"📝 Résultats enregistrés dans {output_path}")
+
+
+if __name__ == "__main__":
+    main()
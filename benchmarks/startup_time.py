@@ -0,0 +1,202 @@
+"""Contrôle du démarrage à froid de l'application.
+
+Deux mesures, chacune dans un processus neuf :
+
+1. Import : durée de l'import de `pf_api_explorer/app.py` (détail par module avec `-X importtime`)
+   et modules lourds chargés à l'import (altair, openpyxl, duckdb doivent rester différés).
+2. Premier affichage : l'application est exécutée avec `streamlit.testing` face au serveur d'API
+   simulé (`pf_api_explorer.mock_server`, latence configurable), pour la première session du
+   processus (imports compris) puis pour une nouvelle session (caches de l'API vidés). Chaque
+   élément envoyé au navigateur est horodaté :
+   - « premier affichage » : premier élément (titre) ;
+   - « coquille » : page d'accueil affichée (titre, quotas, sidebar, message de bienvenue) ;
+   - « filtres prêts » : filtres de la sidebar affichés une fois les données de référence chargées.
+
+Le script se termine en erreur si la coquille d'une nouvelle session dépasse le budget (les imports
+ne sont payés qu'une fois par processus serveur) ou si un module lourd est chargé au démarrage :
+il peut servir de contrôle automatique.
+
+Exemples :
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --latency-ms 1500 --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+APP_PATH = REPO_ROOT / "pf_api_explorer" / "app.py"
+# Modules dont l'import est différé jusqu'à leur première utilisation
+LAZY_MODULES = ["altair", "openpyxl", "duckdb"]
+WELCOME_MARKER = "Bienvenue"
+FILTER_LABEL = "Catégorie"
+
+
+def measure_import():
+    """Importe l'application dans un processus neuf : durée totale, modules les plus lents, modules différés chargés"""
+    code = (
+        "import sys, time, json; start = time.perf_counter(); import pf_api_explorer.app; "
+        "print(json.dumps({'import_s': time.perf_counter() - start, "
+        f"'lazy_loaded': [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))"
+    )
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    top_level = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Modules importés directement par l'application (premier niveau d'imbrication sous pf_api_explorer.app)
+        if len(name) - len(name.lstrip()) == 3 and cumulative.strip().isdigit():
+            top_level.append((name.strip(), int(cumulative) / 1e6))
+    result["slowest_imports"] = sorted(top_level, key=lambda item: item[1], reverse=True)[:8]
+    return result
+
+
+def run_session(events, timeout):
+    """Exécute l'application pour une nouvelle session et mesure ses étapes d'affichage"""
+    from streamlit.testing.v1 import AppTest
+
+    events.clear()
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    at.secrets["api"] = {"token": "startup"}
+    start = time.perf_counter()
+    at.run()
+    first_run = time.perf_counter() - start
+
+    def first_event(predicate):
+        return next((at_time - start for at_time, element in events if predicate(element)), None)
+
+    first_paint = events[0][0] - start if events else None
+    shell = first_event(lambda element: element.WhichOneof("type") == "markdown" and WELCOME_MARKER in element.markdown.body)
+    lazy_loaded = [m for m in LAZY_MODULES if m in sys.modules]
+
+    # Les fragments de suivi ne tournent pas sous streamlit.testing : relances jusqu'à l'affichage des filtres
+    filters_ready = None
+    while time.perf_counter() - start < timeout:
+        filters_ready = first_event(lambda element: element.WhichOneof("type") == "selectbox" and element.selectbox.label == FILTER_LABEL)
+        if filters_ready is not None:
+            break
+        time.sleep(0.1)
+        at.run()
+
+    return {
+        "first_paint_s": first_paint,
+        "shell_s": shell,
+        "first_run_s": first_run,
+        "filters_ready_s": filters_ready,
+        "exceptions": [e.value for e in at.exception],
+        "lazy_loaded": lazy_loaded
+    }
+
+
+def run_worker(base_url, timeout):
+    """Mesure la première session d'un serveur (imports de l'application compris), puis une nouvelle
+    session une fois les modules importés, caches de l'API vidés"""
+    os.environ["PF_API_BASE_URL"] = base_url
+    import streamlit as st
+    from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+
+    events = []
+    original_enqueue = ScriptRunContext.enqueue
+
+    def enqueue(self, msg):
+        if msg.HasField("delta") and msg.delta.HasField("new_element"):
+            events.append((time.perf_counter(), msg.delta.new_element))
+        original_enqueue(self, msg)
+
+    ScriptRunContext.enqueue = enqueue
+
+    process_start = run_session(events, timeout)
+    st.cache_data.clear()
+    new_session = run_session(events, timeout)
+    return {"process_start": process_start, "new_session": new_session}
+
+
+def measure_first_paint(args):
+    """Lance le serveur simulé puis un worker qui exécute l'application"""
+    from benchmarks.export_throughput import _free_port, _wait_for_port
+
+    port = _free_port()
+    server = subprocess.Popen([
+        sys.executable, "-m", "pf_api_explorer.mock_server",
+        "--port", str(port), "--reviews", "1000", "--latency-ms", str(args.latency_ms)
+    ], cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    try:
+        _wait_for_port(port)
+        completed = subprocess.run(
+            [sys.executable, __file__, "--worker", "--base-url", f"http://127.0.0.1:{port}", "--timeout", str(args.timeout)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        )
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _format_seconds(value):
+    return "n/a" if value is None else f"{value * 1000:.0f} ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Contrôle du démarrage à froid de l'application")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Latence simulée par requête de l'API")
+    parser.add_argument("--budget-ms", type=float, default=1000.0, help="Durée maximale jusqu'à l'affichage de la coquille")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Durée maximale d'exécution de l'application (s)")
+    parser.add_argument("--json", action="store_true", help="Affiche aussi les mesures en JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.base_url, args.timeout)))
+        return 0
+
+    imports = measure_import()
+    paint = measure_first_paint(args)
+    session = paint["new_session"]
+
+    print(f"Import de l'application : {_format_seconds(imports['import_s'])}")
+    for name, seconds in imports["slowest_imports"]:
+        print(f"    {name:<40} {_format_seconds(seconds):>8}")
+    print(f"Latence API simulée     : {args.latency_ms:.0f} ms")
+    for label, measures in (("Première session du serveur (imports compris)", paint["process_start"]),
+                            ("Nouvelle session (caches de l'API vides)", session)):
+        print(label)
+        print(f"    Premier affichage       : {_format_seconds(measures['first_paint_s'])}")
+        print(f"    Coquille affichée       : {_format_seconds(measures['shell_s'])}")
+        print(f"    Premier rerun terminé   : {_format_seconds(measures['first_run_s'])}")
+        print(f"    Filtres prêts           : {_format_seconds(measures['filters_ready_s'])}")
+    if args.json:
+        print(json.dumps({"imports": imports, "first_paint": paint}, indent=2))
+
+    # Les imports ne sont payés qu'une fois par processus serveur : le budget s'applique à chaque nouvelle session
+    failures = []
+    lazy_loaded = sorted(set(imports["lazy_loaded"]) | set(paint["process_start"]["lazy_loaded"]))
+    if lazy_loaded:
+        failures.append(f"modules chargés au démarrage au lieu d'être différés : {', '.join(lazy_loaded)}")
+    exceptions = paint["process_start"]["exceptions"] + session["exceptions"]
+    if exceptions:
+        failures.append(f"exceptions pendant le premier rerun : {exceptions}")
+    if session["shell_s"] is None:
+        failures.append("le message de bienvenue n'a pas été affiché")
+    elif session["shell_s"] * 1000 > args.budget_ms:
+        failures.append(f"coquille affichée en {session['shell_s'] * 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Démarrage à froid dans le budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
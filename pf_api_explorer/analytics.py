@@ -0,0 +1,237 @@
+import ast
+import json
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from pf_api_explorer.export_pipeline import PREDEFINED_ATTRIBUTES
+
+REVIEW_COLUMNS = ["id", "date", "brand", "product", "category", "subcategory", "country", "source", "market", "rating"]
+MAX_RESULT_ROWS = 10_000
+# Tables interrogeables par les requêtes (libres ou prêtes à l'emploi)
+ANALYTICS_TABLES = ("reviews", "review_attributes")
+# Options DuckDB : aucun accès aux fichiers (read_text, COPY, ATTACH...) ni modification de la configuration
+DUCKDB_CONFIG = {"enable_external_access": False, "lock_configuration": True}
+# Opérations SQLite autorisées une fois les tables chargées : lecture seule
+SQLITE_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+# Requêtes prêtes à l'emploi (syntaxe commune à DuckDB et SQLite)
+PREBUILT_QUERIES = {
+    "Note moyenne par marque et par mois": """
+SELECT brand, month, COUNT(*) AS reviews, ROUND(AVG(rating), 2) AS note_moyenne
+FROM reviews
+GROUP BY brand, month
+ORDER BY brand, month""",
+    "Polarité des attributs": """
+SELECT attribute, polarity, COUNT(*) AS reviews
+FROM review_attributes
+GROUP BY attribute, polarity
+ORDER BY attribute, polarity""",
+    "Polarité des attributs par marque": """
+SELECT brand, attribute,
+       COUNT(CASE WHEN polarity = 'positive' THEN 1 END) AS positive,
+       COUNT(CASE WHEN polarity = 'negative' THEN 1 END) AS negative,
+       COUNT(CASE WHEN polarity = 'neutre' THEN 1 END) AS neutre
+FROM review_attributes
+GROUP BY brand, attribute
+ORDER BY brand, attribute""",
+    "Part Sampling par marque": """
+SELECT brand, COUNT(*) AS reviews, CAST(SUM(sampling) AS INTEGER) AS sampling,
+       ROUND(100.0 * SUM(sampling) / COUNT(*), 1) AS part_sampling_pct
+FROM reviews
+GROUP BY brand
+ORDER BY reviews DESC""",
+    "Distribution des notes": """
+SELECT rating, COUNT(*) AS reviews
+FROM reviews
+GROUP BY rating
+ORDER BY rating""",
+    "Produits les plus commentés": """
+SELECT brand, product, COUNT(*) AS reviews, ROUND(AVG(rating), 2) AS note_moyenne
+FROM reviews
+GROUP BY brand, product
+ORDER BY reviews DESC
+LIMIT 50"""
+}
+
+# Agrégations servant aux graphiques des résultats : seuls ces agrégats sont envoyés au navigateur
+CHART_QUERIES = {
+    "volume_by_month": """
+SELECT month, brand, COUNT(*) AS reviews
+FROM reviews
+WHERE month IS NOT NULL
+GROUP BY month, brand""",
+    "rating_distribution": """
+SELECT brand, rating, COUNT(*) AS reviews
+FROM reviews
+WHERE rating IS NOT NULL
+GROUP BY brand, rating""",
+    "polarity_by_brand": """
+SELECT brand, attribute, polarity, COUNT(*) AS reviews
+FROM review_attributes
+GROUP BY brand, attribute, polarity"""
+}
+
+
+def _import_duckdb():
+    """Import différé de DuckDB (long à importer) : None s'il manque dans l'environnement"""
+    try:
+        import duckdb
+    except ImportError:  # Dépendance de l'application ; à défaut, repli dégradé sur SQLite en mémoire
+        return None
+    return duckdb
+
+
+def _as_attribute_set(value):
+    """Attributs d'une review (liste JSON, ou texte d'une liste après normalisation)"""
+    if not value:
+        return set()
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return set()
+    return {attr for attr in value if attr in PREDEFINED_ATTRIBUTES}
+
+
+def attribute_polarity(mentioned, positive, negative):
+    """Polarité par attribut, selon les règles du format à plat (positive, negative ou neutre)"""
+    polarities = {attr: "neutre" for attr in mentioned - positive - negative}
+    for attr in positive - negative:
+        polarities[attr] = "positive"
+    for attr in negative - positive:
+        polarities[attr] = "negative"
+    for attr in positive & negative:
+        polarities[attr] = "neutre"
+    return polarities
+
+
+def build_review_tables(docs):
+    """Construit les tables colonnes d'analyse à partir des reviews brutes :
+    `reviews` (une ligne par review, colonnes attribute_<nom>) et `review_attributes` (une ligne par attribut cité)"""
+    docs = list(docs)
+    reviews = pd.DataFrame({column: [doc.get(column) for doc in docs] for column in REVIEW_COLUMNS})
+    reviews["rating"] = pd.to_numeric(reviews["rating"], errors="coerce")
+    dates = pd.to_datetime(reviews["date"], errors="coerce")
+    reviews["date"] = dates.dt.strftime("%Y-%m-%d")
+    reviews["month"] = dates.dt.strftime("%Y-%m")
+    reviews["sampling"] = pd.Series([doc.get("business indicator") for doc in docs], dtype=object).astype(str).str.contains("Sampling Rate", regex=False).astype(int)
+
+    attribute_rows = {"review_index": [], "attribute": [], "polarity": []}
+    attribute_columns = {attr: ["0"] * len(docs) for attr in PREDEFINED_ATTRIBUTES}
+    for index, doc in enumerate(docs):
+        polarities = attribute_polarity(
+            _as_attribute_set(doc.get("attributes")),
+            _as_attribute_set(doc.get("attributes positive")),
+            _as_attribute_set(doc.get("attributes negative"))
+        )
+        for attr, polarity in polarities.items():
+            attribute_rows["review_index"].append(index)
+            attribute_rows["attribute"].append(attr)
+            attribute_rows["polarity"].append(polarity)
+            attribute_columns[attr][index] = polarity
+    for attr, values in attribute_columns.items():
+        reviews[f"attribute_{attr}"] = values
+
+    review_attributes = pd.DataFrame(attribute_rows)
+    # Entiers même sans attribut cité (colonne vide de type object sinon, inutilisable comme indices)
+    positions = np.asarray(attribute_rows["review_index"], dtype=np.intp)
+    for column in ("id", "brand", "product", "month", "rating"):
+        review_attributes[column] = reviews[column].to_numpy()[positions]
+    return {"reviews": reviews, "review_attributes": review_attributes.drop(columns="review_index")}
+
+
+def _collect_relations(node, tables, functions, ctes):
+    """Parcourt l'arbre d'une requête DuckDB (json_serialize_sql) : tables, fonctions table et CTE référencées"""
+    if isinstance(node, list):
+        for child in node:
+            _collect_relations(child, tables, functions, ctes)
+        return
+    if not isinstance(node, dict):
+        return
+    if node.get("type") == "BASE_TABLE":
+        tables.add(".".join(part for part in (node.get("catalog_name"), node.get("schema_name"), node.get("table_name")) if part))
+    elif node.get("type") == "TABLE_FUNCTION":
+        functions.add(node.get("function", {}).get("function_name", "?"))
+    for entry in node.get("cte_map", {}).get("map", []) if isinstance(node.get("cte_map"), dict) else []:
+        ctes.add(entry.get("key"))
+    for child in node.values():
+        _collect_relations(child, tables, functions, ctes)
+
+
+def _sqlite_authorizer(action, arg1, arg2, db_name, trigger):
+    """Autorise seulement la lecture des tables d'analyse (ni ATTACH, ni PRAGMA, ni écriture)"""
+    if action not in SQLITE_ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_READ and arg1 not in ANALYTICS_TABLES:
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+class AnalyticsEngine:
+    """Moteur SQL en mémoire sur les tables d'analyse : DuckDB (colonnes, vectorisé), ou SQLite en mode dégradé s'il manque.
+    Les requêtes sont saisies par les utilisateurs : seule une requête SELECT (ou WITH) sur les tables
+    d'analyse est acceptée, et le moteur n'a accès ni aux fichiers du serveur ni à d'autres bases"""
+
+    def __init__(self, tables):
+        # Les DataFrames sources ne sont pas conservés : le moteur garde sa propre copie des données
+        self.row_counts = {name: len(df) for name, df in tables.items()}
+        self._columns = {name: list(df.columns) for name, df in tables.items()}
+        self._lock = threading.Lock()
+        duckdb = self._duckdb = _import_duckdb()
+        if duckdb is not None:
+            self.backend = "duckdb"
+            self._conn = duckdb.connect(":memory:", config=DUCKDB_CONFIG)
+            for name, df in tables.items():
+                # Copie en table native (colonnes) : les requêtes ne relisent plus le DataFrame pandas
+                self._conn.register("source_frame", df)
+                self._conn.execute(f"CREATE TABLE {name} AS SELECT * FROM source_frame")
+                self._conn.unregister("source_frame")
+        else:
+            self.backend = "sqlite"
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            for name, df in tables.items():
+                df.to_sql(name, self._conn, index=False)
+            self._conn.execute("CREATE INDEX reviews_brand_month ON reviews (brand, month)")
+            self._conn.set_authorizer(_sqlite_authorizer)
+
+    def check_query(self, sql):
+        """Refuse (ValueError) tout ce qui n'est pas une requête SELECT / WITH unique sur les tables d'analyse"""
+        if not re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+            raise ValueError("Seules les requêtes SELECT (ou WITH ... SELECT) sont autorisées")
+        if self.backend != "duckdb":
+            return  # SQLite : une seule instruction par appel, et l'autorisateur restreint aux lectures des tables d'analyse
+        statements = self._duckdb.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != self._duckdb.StatementType.SELECT:
+            raise ValueError("Une seule requête SELECT (ou WITH ... SELECT) est autorisée")
+        tree = json.loads(self._conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+        if tree.get("error"):
+            raise ValueError(f"Requête invalide : {tree.get('error_message', '')}")
+        tables, functions, ctes = set(), set(), set()
+        _collect_relations(tree["statements"], tables, functions, ctes)
+        unknown = tables - set(ANALYTICS_TABLES) - ctes
+        if unknown or functions:
+            raise ValueError(f"Tables non autorisées : {', '.join(sorted(unknown | functions))} (seules {', '.join(ANALYTICS_TABLES)} sont interrogeables)")
+
+    def query(self, sql):
+        """Exécute une requête (voir check_query) et retourne (DataFrame limité à MAX_RESULT_ROWS lignes, durée en ms)"""
+        start = time.perf_counter()
+        with self._lock:
+            self.check_query(sql)
+            if self.backend == "duckdb":
+                df = self._conn.execute(sql).df()
+            else:
+                df = pd.read_sql_query(sql, self._conn)
+        return df.head(MAX_RESULT_ROWS), (time.perf_counter() - start) * 1000
+
+    def describe(self):
+        """Colonnes disponibles par table"""
+        return dict(self._columns)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
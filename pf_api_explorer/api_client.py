@@ -0,0 +1,127 @@
+import time
+import urllib.parse
+from functools import partial
+
+import requests
+
+from pf_api_explorer.circuit_breaker import get_circuit_breaker
+from pf_api_explorer.hedging import get_hedging_policy
+from pf_api_explorer.instrumentation import get_registry
+from pf_api_explorer.rate_control import MAX_RETRIES, backoff_delay, get_rate_controller, parse_retry_after
+
+DEFAULT_BASE_URL = "https://api-pf.ratingsandreviews-beauty.com"
+# Statuts réessayés (les appels sont des GET idempotents) ; les autres erreurs sont définitives
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Délais (connexion, lecture) en secondes : une connexion bloquée ne fige plus les reruns
+CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 15
+READ_TIMEOUTS = {"/metrics": 30, "/products": 30, "/reviews": 60}
+
+
+class ApiError(Exception):
+    """Erreur renvoyée par l'API Ratings & Reviews (statut HTTP non 200 ou échec de connexion)"""
+
+    def __init__(self, message, status_code=None, url=None, body=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.url = url
+        self.body = body
+
+
+class CircuitOpenError(ApiError):
+    """Appel refusé sans contacter l'API : le disjoncteur est ouvert après des échecs répétés"""
+
+
+def parse_quota_volume(value):
+    """Convertit un volume de quota de l'API (nombre ou texte, éventuellement avec séparateurs) en entier"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = "".join(c for c in str(value) if c.isdigit())
+    return int(digits) if digits else None
+
+
+def quote_strict(string, safe='/', encoding=None, errors=None):
+    """Encode tous les caractères réservés, y compris '/'"""
+    return urllib.parse.quote(string, safe='', encoding=encoding, errors=errors)
+
+
+def build_url(base_url, endpoint, params, token):
+    """Construit l'URL complète d'un appel API (token inclus) sans modifier `params`"""
+    if params is None:
+        params = {}
+    if isinstance(params, dict):
+        query_params = dict(params)
+        query_params["token"] = token
+    else:
+        query_params = list(params) + [("token", token)]
+    query_string = urllib.parse.urlencode(query_params, doseq=True, quote_via=quote_strict)
+    return f"{base_url}{endpoint}?{query_string}"
+
+
+def get_timeout(endpoint):
+    """Délais (connexion, lecture) d'un endpoint"""
+    return (CONNECT_TIMEOUT, READ_TIMEOUTS.get(endpoint, DEFAULT_READ_TIMEOUT))
+
+
+def get_result(endpoint, params, base_url, token, max_retries=MAX_RETRIES):
+    """Appelle l'API et retourne le champ `result` de la réponse, ou lève ApiError.
+
+    L'appel passe par le contrôleur de débit du token et le disjoncteur du processus (CircuitOpenError si
+    l'API est jugée indisponible). Les 429, erreurs serveur et échecs de connexion sont réessayés
+    (attente exponentielle avec gigue, Retry-After respecté). Si le mode est actif, les lectures
+    de /metrics et /products lentes sont doublées (voir hedging.py)."""
+    url = build_url(base_url, endpoint, params, token)
+    policy = get_hedging_policy()
+    if policy.applies(endpoint):
+        return policy.call(endpoint, partial(_get_with_retries, endpoint, url, token, max_retries))
+    return _get_with_retries(endpoint, url, token, max_retries)
+
+
+def _get_with_retries(endpoint, url, token, max_retries):
+    controller = get_rate_controller(token)
+    breaker = get_circuit_breaker()
+    registry = get_registry()
+    for attempt in range(max_retries + 1):
+        if not breaker.allow():
+            raise CircuitOpenError(f"API indisponible (nouvel essai dans {breaker.retry_in():.0f} s)", url=url)
+        retry_after = None
+        with controller.slot():
+            start = time.perf_counter()
+            try:
+                response = requests.get(url, headers={"Accept": "application/json"}, timeout=get_timeout(endpoint))
+            except requests.RequestException as e:
+                registry.record_request(endpoint, None, time.perf_counter() - start)
+                breaker.record_failure()
+                error = ApiError(f"Erreur de connexion: {str(e)}", url=url)
+                error.__cause__ = e
+            else:
+                registry.record_request(endpoint, response.status_code, time.perf_counter() - start, len(response.content))
+                # Toute réponse hors 5xx (429 compris) prouve que l'API est joignable
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code == 200:
+                    controller.on_success()
+                    decode_start = time.perf_counter()
+                    result = response.json().get("result", {})
+                    registry.record_decode(time.perf_counter() - decode_start)
+                    if endpoint == "/quotas":
+                        controller.update_quota(parse_quota_volume(result.get("used volume")),
+                                                parse_quota_volume(result.get("remaining volume")),
+                                                parse_quota_volume(result.get("quota")))
+                    return result
+                error = ApiError(f"Erreur {response.status_code} sur {url}", status_code=response.status_code, url=url, body=response.text)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+        if error.status_code == 429:
+            controller.on_throttle(retry_after)
+        elif error.status_code is None or error.status_code >= 500:
+            controller.on_server_error()
+        if attempt == max_retries or (error.status_code is not None and error.status_code not in RETRY_STATUSES):
+            raise error
+        registry.record_retry(endpoint)
+        # Le Retry-After éventuel est appliqué par le contrôleur à la prochaine prise de place
+        time.sleep(backoff_delay(attempt))
@@ -1,16 +1,48 @@
 import streamlit as st
-import requests
 import pandas as pd
+import numpy as np
 import datetime
-import io
-import altair as alt
-import urllib.parse
+from contextlib import nullcontext
 from functools import partial
-import ast
 import json
+import logging
 import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# `streamlit run pf_api_explorer/app.py` n'ajoute que le dossier du script au sys.path :
+# on y ajoute la racine du dépôt pour que les modules du package restent importables
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pf_api_explorer.analytics import CHART_QUERIES, PREBUILT_QUERIES, AnalyticsEngine, build_review_tables
+from pf_api_explorer.api_client import DEFAULT_BASE_URL, ApiError, CircuitOpenError, build_url, get_result, parse_quota_volume
+from pf_api_explorer.catalog_store import CatalogStore
+from pf_api_explorer.circuit_breaker import LastGoodCache, get_circuit_breaker
+from pf_api_explorer.export_pipeline import (
+    dataframe_to_excel_bytes, normalize_reviews, paginate_reviews, paginate_reviews_concurrently, postprocess_reviews
+)
+from pf_api_explorer.data_dir import data_path
+from pf_api_explorer.export_telemetry import ExportTelemetry, load_export_telemetry, save_export_telemetry
+from pf_api_explorer.hedging import get_hedging_policy
+from pf_api_explorer.instrumentation import get_registry, start_metrics_server
+from pf_api_explorer.memory_governor import MemoryGovernor
+from pf_api_explorer.profiling import find_regressions, get_history, profile_functions, run_profiled, summarize_cprofile
+from pf_api_explorer.query_chunking import split_params
+from pf_api_explorer.query_spec import DEFAULT_CACHE_TTL, RECENT_CACHE_TTL, QuerySpec, params_from_filters
+from pf_api_explorer.rate_control import get_rate_controller
+from pf_api_explorer.review_warehouse import ReviewWarehouse
+from pf_api_explorer.search_index import ProductSearchIndex
+from pf_api_explorer.token_pool import TokenPool, parse_token_config
+
+logger = logging.getLogger(__name__)
+
 st.set_page_config(page_title="Explorateur API Ratings & Reviews", layout="wide")
 
 # Initialisation des variables de session
@@ -20,7 +52,11 @@ session_defaults = {
     "current_page": 1,
     "all_docs": [],
     "next_cursor": None,
-    "selected_product_ids": [],
+    "selected_products": set(),
+    "product_selection_rev": 0,
+    "product_catalog_version": 0,
+    "product_table_page": 1,
+    "product_count_state": {},
     "is_preview_mode": True,
     "export_params": {},
     "switch_to_full_export": False,
@@ -33,11 +69,86 @@ session_defaults = {
 for key, default_value in session_defaults.items():
     st.session_state.setdefault(key, default_value)
 
-@st.cache_data(ttl=3600)
-def fetch_cached(endpoint, params=None):
-    """Fonction pour récupérer les données de l'API avec cache"""
-    BASE_URL = "https://api-pf.ratingsandreviews-beauty.com"
-    TOKEN = st.secrets["api"]["token"]
+def get_api_base_url():
+    """URL de base de l'API : variable d'environnement PF_API_BASE_URL, sinon `base_url` de la section
+    [api] des secrets, sinon l'API de production (permet de pointer vers `mock_server.py`)"""
+    env_url = os.environ.get("PF_API_BASE_URL")
+    if env_url:
+        return env_url.rstrip("/")
+    try:
+        return st.secrets["api"].get("base_url", DEFAULT_BASE_URL).rstrip("/")
+    except Exception:
+        return DEFAULT_BASE_URL
+
+BASE_URL = get_api_base_url()
+EXPORT_LOG_FILE_NAME = "review_exports_log.csv"
+# Un relevé de quota plus récent que ce délai (secondes) sert de point de départ à l'export suivant du même centre de coûts
+QUOTA_SNAPSHOT_MAX_AGE = 600
+# La fraîcheur des réponses (fetch, catalogue, compteurs, estimations) dépend de la période demandée
+# (QuerySpec.cache_ttl). Sur une période close, les réponses légères de ces endpoints sont gardées sur
+# disque sans expiration (les pages de /reviews déjà exportées sont servies par l'entrepôt local)
+PERSISTENT_HISTORY_ENDPOINTS = {"/metrics"}
+# Gouverneur mémoire : seuil par session, budget global (Mo) et inactivité (s) avant déchargement sur disque
+SESSION_MEMORY_MB = int(os.environ.get("PF_SESSION_MEMORY_MB", "256"))
+MEMORY_BUDGET_MB = int(os.environ.get("PF_MEMORY_BUDGET_MB", "2048"))
+IDLE_SPILL_SECONDS = int(os.environ.get("PF_IDLE_SPILL_SECONDS", "900"))
+# Marqueur par thread : positionné quand le corps d'un cache de fetch s'exécute (cache manqué)
+_fetch_cache_probe = threading.local()
+# Sous-requêtes /reviews simultanées au plus pour un export découpé (URL trop longue, voir query_chunking.py)
+SUB_QUERY_CONCURRENCY = 8
+# Un compteur /metrics est la somme de compteurs mensuels mis en cache jusqu'à cette durée de période (mois)
+MAX_COMPOSED_MONTHS = 36
+# Termes /metrics (mois, lots de produits) appelés simultanément au plus par un calcul de compteurs, tous compteurs confondus
+COUNT_GRID_CONCURRENCY = 32
+# Dimensions de la matrice des volumes : libellé -> (paramètre API, endpoint de référence, clé de la réponse)
+COUNT_MATRIX_DIMENSIONS = {"Pays": ("country", "/countries", "countries"), "Source": ("source", "/sources", "sources")}
+# Cellules au plus dans la matrice des volumes (un appel /metrics par cellule absente du cache)
+MAX_COUNT_MATRIX_CELLS = 2000
+# Produits détaillés au plus dans la vue des tendances
+MAX_TREND_PRODUCTS = 20
+# Endpoints servis depuis leur dernière réponse correcte quand l'API est indisponible
+STALE_FALLBACK_ENDPOINTS = {"/categories", "/brands", "/countries", "/sources", "/markets", "/attributes", "/metrics"}
+
+def _altair():
+    """Import différé d'altair (~0,4 s) : seulement quand un graphique est affiché"""
+    import altair
+    return altair
+
+@st.cache_resource
+def get_last_good_cache():
+    """Dernières réponses correctes des données de référence et des compteurs, partagées par les sessions"""
+    return LastGoodCache()
+
+@st.cache_resource
+def get_token_pool():
+    """Pool des tokens API de la section [api] des secrets, partagé par toutes les sessions du serveur"""
+    return TokenPool(parse_token_config(st.secrets["api"]))
+
+@st.cache_data(ttl=DEFAULT_CACHE_TTL)
+def fetch_cached(endpoint, params=None, _cost_center=None):
+    """Fonction pour récupérer les données de l'API avec cache (les erreurs ne sont pas mises en cache)"""
+    return fetch_from_api(endpoint, params, _cost_center)
+
+@st.cache_data(ttl=RECENT_CACHE_TTL)
+def fetch_cached_recent(endpoint, params=None, _cost_center=None):
+    """Cache court des requêtes dont la période touche les jours récents (encore alimentés)"""
+    return fetch_from_api(endpoint, params, _cost_center)
+
+@st.cache_data(persist="disk")
+def fetch_cached_history(endpoint, params=None, _cost_center=None):
+    """Cache sur disque, sans expiration, des requêtes légères sur une période close (immuable)"""
+    return fetch_from_api(endpoint, params, _cost_center)
+
+def get_fetch_cache(endpoint, params):
+    """Cache de fetch adapté à la période de la requête"""
+    ttl = QuerySpec.from_params(endpoint, params).cache_ttl() if isinstance(params, dict) else DEFAULT_CACHE_TTL
+    if ttl is None:
+        return fetch_cached_history if endpoint in PERSISTENT_HISTORY_ENDPOINTS else fetch_cached
+    return fetch_cached_recent if ttl == RECENT_CACHE_TTL else fetch_cached
+
+def fetch_from_api(endpoint, params, cost_center):
+    """Appel API d'un cache de fetch, avec le token le moins chargé du pool (du centre de coûts `cost_center`)"""
+    _fetch_cache_probe.miss = True
     show_debug = False
 
     if params is None:
@@ -46,51 +157,43 @@ def fetch_cached(endpoint, params=None):
         st.error("❌ ERREUR: `params` doit être un dict ou une liste de tuples, pas une chaîne.")
         return {}
 
-    def quote_strict(string, safe='/', encoding=None, errors=None):
-        return urllib.parse.quote(string, safe='', encoding=encoding, errors=errors)
-
-    if isinstance(params, dict):
-        params["token"] = TOKEN
-        query_string = urllib.parse.urlencode(params, doseq=True, quote_via=quote_strict)
-    else:
-        params.append(("token", TOKEN))
-        query_string = urllib.parse.urlencode(params, doseq=True, quote_via=quote_strict)
-
-    url = f"{BASE_URL}{endpoint}?{query_string}"
-
+    pool = get_token_pool()
     if show_debug:
-        st.write("🔎 URL générée:", url)
+        st.write("🔎 URL générée:", build_url(BASE_URL, endpoint, params, pool.choose(cost_center).token))
         st.write("Paramètres analysés:", params)
 
     try:
-        response = requests.get(url, headers={"Accept": "application/json"})
-        if response.status_code == 200:
-            return response.json().get("result", {})
-        else:
-            st.error(f"Erreur {response.status_code} sur {url}")
-            st.error(f"Réponse: {response.text}")
-            return {}
+        with pool.lease(cost_center) as token:
+            return get_result(endpoint, params, BASE_URL, token.token)
+    except ApiError:
+        raise
     except Exception as e:
-        st.error(f"Erreur de connexion: {str(e)}")
-        return {}
+        raise ApiError(f"Erreur de connexion: {str(e)}") from e
+
+def load_products_from_api(brand, context, pool):
+    """Charge la liste des produits d'une marque pour un contexte de filtres (appelé par le catalogue partagé)"""
+    params = context.to_params()
+    params["brand"] = brand
+    with pool.lease() as token:
+        return get_result("/products", params, BASE_URL, token.token).get("products", [])
+
+@st.cache_resource
+def get_catalog_store():
+    """Catalogue produits partagé par toutes les sessions du serveur"""
+    # Le pool est lu ici : les rechargements en arrière-plan n'ont pas accès au contexte de session
+    return CatalogStore(partial(load_products_from_api, pool=get_token_pool()), ttl=QuerySpec.cache_ttl)
+
+def get_products_context(filters):
+    """Contexte de filtres (hors marque) qui détermine la liste des produits d'une marque"""
+    params = params_from_filters(filters, include_attributes=False)
+    return QuerySpec.from_params("/products", params).without("brand")
+
+def fetch_products_by_brand(brand, filters):
+    """Récupère les produits pour une marque donnée avec filtres, via le catalogue partagé"""
+    return get_catalog_store().get(brand, get_products_context(filters))
 
-@st.cache_data(ttl=3600)
-def fetch_products_by_brand(brand, category, subcategory, start_date, end_date):
-    """Récupère les produits pour une marque donnée avec filtres"""
-    params = {
-        "brand": brand,
-        "start-date": start_date,
-        "end-date": end_date
-    }
-    if category != "ALL":
-        params["category"] = category
-    if subcategory != "ALL":
-        params["subcategory"] = subcategory
-    return fetch_cached("/products", params)
-
-@st.cache_data(ttl=3600)
 def fetch_attributes_dynamic(category, subcategory, brand):
-    """Récupère les attributs dynamiquement selon les filtres"""
+    """Récupère les attributs dynamiquement selon les filtres (mis en cache par fetch_cached)"""
     params = {}
     if category != "ALL":
         params["category"] = category
@@ -98,118 +201,389 @@ def fetch_attributes_dynamic(category, subcategory, brand):
         params["subcategory"] = subcategory
     if brand:
         params["brand"] = ",".join(brand)
-    return fetch_cached("/attributes", params)
-
-def fetch(endpoint, params=None):
-    """Wrapper pour la fonction fetch_cached"""
-    return fetch_cached(endpoint, params)
+    return fetch("/attributes", params)
+
+def fetch(endpoint, params=None, cost_center=None, by_month=True, report=None):
+    """Wrapper pour la fonction fetch_cached (mesure les hits / misses du cache). Si l'API est
+    indisponible, les données de référence et les compteurs sont servis depuis la dernière réponse
+    correcte, signalée comme périmée. Un compteur /metrics est calculé par sous-requêtes si son URL
+    serait trop longue, et par mois si la période en couvre plusieurs (compteurs mensuels en cache) ;
+    `by_month=False` le calcule en un seul appel (matrices de compteurs, où le découpage multiplierait les appels).
+    Hors session (calculs partagés lancés en arrière-plan), `report` (voir new_fetch_report) reçoit les marques
+    de péremption et les erreurs, qui ne sont alors ni écrites dans la session ni affichées"""
+    if endpoint == "/metrics" and isinstance(params, dict) and len(get_count_terms(params, by_month)) > 1:
+        spec = QuerySpec.from_params(endpoint, params)
+        count = fetch_counts_concurrently([spec], cost_center=cost_center, by_month=by_month, report=report)[spec]
+        return {} if count is None else {"nbDocs": count}
+    _fetch_cache_probe.miss = False
+    try:
+        result = get_fetch_cache(endpoint, params)(endpoint, params, _cost_center=cost_center)
+    except ApiError as e:
+        return fetch_degraded(endpoint, params, e, report)
+    get_registry().record_cache("fetch_cached", endpoint, "miss" if _fetch_cache_probe.miss else "hit")
+    if _fetch_cache_probe.miss and result and endpoint in STALE_FALLBACK_ENDPOINTS:
+        get_last_good_cache().put(QuerySpec.from_params(endpoint, params), result)
+    return result
+
+def create_sub_query_executor(count, max_workers=SUB_QUERY_CONCURRENCY):
+    """Threads des sous-requêtes d'une requête découpée, rattachés à la session (cache, erreurs affichées)"""
+    return ThreadPoolExecutor(max_workers=min(count, max_workers), thread_name_prefix="sub-query",
+                              initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx()))
+
+def get_count_terms(params, by_month=True):
+    """Sous-requêtes disjointes dont les compteurs /metrics s'additionnent en celui de `params` : listes de
+    produits ou de marques trop longues pour une URL, puis mois de la période (si `by_month`)"""
+    terms = []
+    for chunk in split_params(params, BASE_URL, "/metrics"):
+        month_pieces = QuerySpec.from_params("/metrics", chunk).month_pieces() if by_month else []
+        if 1 < len(month_pieces) <= MAX_COMPOSED_MONTHS:
+            terms.extend(piece.to_params() for piece in month_pieces)
+        else:
+            terms.append(chunk)
+    return terms
+
+def fetch_counts_concurrently(specs, on_progress=None, cost_center=None, by_month=True, report=None):
+    """Compteurs /metrics (nbDocs) de QuerySpec indépendantes. Les termes de tous les compteurs (voir
+    get_count_terms) sont appelés ensemble dans un seul pool (COUNT_GRID_CONCURRENCY threads au plus, débit
+    borné par le contrôleur de chaque token) et servis par le cache de fetch ; chaque compteur est leur somme.
+    Retourne {spec: nbDocs}, None pour un compteur dont un terme est en erreur ; `on_progress(faits, total)`
+    compte les termes. Un compteur est signalé périmé, à la date de son terme le plus ancien, si l'un des termes l'est
+    (dans la session, ou dans `report` pour un calcul hors session, voir fetch)"""
+    terms = {
+        spec: [QuerySpec.from_params("/metrics", term) for term in get_count_terms(spec.to_params(), by_month)]
+        for spec in specs
+    }
+    unique_terms = list(dict.fromkeys(term for spec_terms in terms.values() for term in spec_terms))
+    results = {}
 
-def postprocess_reviews(df):
-    """Fonction de postprocessing des reviews"""
-    if df.empty:
-        return df
-        
-    df.rename(columns={
-        'id': 'guid',
-        'category': 'categories',
-        'content trad': 'verbatim_content',
-        'product': 'product_name_SEMANTIWEB'
-    }, inplace=True)
-    
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df['date'] = df['date'].dt.strftime('01/%m/%Y')
+    def fetch_term(term):
+        try:
+            result = fetch("/metrics", term.to_params(), cost_center, by_month, report)
+        except Exception:
+            return None
+        return result.get("nbDocs", 0) if result else None
+
+    if len(unique_terms) == 1:
+        results[unique_terms[0]] = fetch_term(unique_terms[0])
+        if on_progress:
+            on_progress(1, 1)
+    elif unique_terms:
+        executor = create_sub_query_executor(len(unique_terms), COUNT_GRID_CONCURRENCY)
+        with executor:
+            futures = {executor.submit(fetch_term, term): term for term in unique_terms}
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if on_progress:
+                    on_progress(done, len(futures))
+
+    stale = st.session_state.setdefault("stale_data", {}) if report is None else report["stale"]
+    counts = {}
+    for spec, spec_terms in terms.items():
+        values = [results[term] for term in spec_terms]
+        counts[spec] = None if None in values else sum(values)
+        stale_since = [stale[term] for term in spec_terms if term in stale]
+        if stale_since and len(spec_terms) > 1:
+            stale[spec] = min(stale_since)
+    return counts
+
+def paginate_export_reviews(fetch_page, params, max_pages):
+    """Pagination /reviews d'un export ; une sélection trop longue pour une seule URL est découpée en
+    sous-requêtes parcourues en parallèle, dont les reviews sont fusionnées sans doublon"""
+    sub_queries = split_params(params, BASE_URL, "/reviews")
+    if len(sub_queries) == 1 or max_pages == 0:
+        yield from paginate_reviews(fetch_page, params, max_pages)
+        return
+    st.info(f"✂️ Sélection trop longue pour une seule requête : export découpé en {len(sub_queries)} sous-requêtes parallèles")
+    executor = create_sub_query_executor(len(sub_queries))
+    try:
+        yield from paginate_reviews_concurrently(fetch_page, sub_queries, max_pages, executor)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def new_fetch_report():
+    """Collecte des marques de péremption ({QuerySpec: date}) et des erreurs d'un calcul hors session"""
+    return {"stale": {}, "errors": []}
+
+def fetch_degraded(endpoint, params, error, report=None):
+    """Réponse de repli d'un appel en échec : dernière valeur connue si elle existe, sinon {} et l'erreur
+    (marque de péremption et erreur consignées dans `report` plutôt que dans la session, si fourni)"""
+    spec = QuerySpec.from_params(endpoint, params)
+    last_good = get_last_good_cache().get(spec) if endpoint in STALE_FALLBACK_ENDPOINTS else None
+    if last_good is not None:
+        value, fetched_at = last_good
+        get_registry().record_cache("fetch_cached", endpoint, "stale")
+        stale = st.session_state.setdefault("stale_data", {}) if report is None else report["stale"]
+        stale[spec] = fetched_at
+        return value
+    get_registry().record_cache("fetch_cached", endpoint, "miss")
+    if report is not None:
+        report["errors"].append(str(error))
+        return {}
+    if isinstance(error, CircuitOpenError):
+        st.error(f"🔌 {str(error)}")
+    else:
+        st.error(str(error))
+        if error.body is not None:
+            st.error(f"Réponse: {error.body}")
+    return {}
 
-    if 'business indicator' in df.columns:
-        df['Sampling'] = df['business indicator'].apply(lambda x: 1 if 'Sampling Rate' in str(x) else 0)
-    
-    df = df.drop(columns=['content origin'], errors='ignore')
+def fetch_reviews_page(params, cost_center=None):
+    """Récupère une page de /reviews (utilisé par la pagination par curseur), avec les tokens d'un centre de coûts"""
+    return fetch("/reviews", params, cost_center=cost_center)
 
-    predefined_attributes = [
-        'Composition', 'Efficiency', 'Packaging', 'Price', 
-        'Quality', 'Safety', 'Scent', 'Taste', 'Texture'
+@st.cache_data(ttl=3600)
+def fetch_token_quotas(name):
+    """Réponse de /quotas pour un token du pool (chaque token a son propre quota)"""
+    return get_result("/quotas", {}, BASE_URL, get_token_pool().get(name).token)
+
+def fetch_quotas(cost_center=None):
+    """Quotas des tokens du pool (d'un centre de coûts) : liste de (token, réponse de /quotas, {} en cas d'erreur)"""
+    rows = []
+    for token in get_token_pool().candidates(cost_center):
+        try:
+            rows.append((token, fetch_token_quotas(token.name)))
+        except ApiError as e:
+            st.error(f"Quotas du token « {token.name} » indisponibles : {str(e)}")
+            rows.append((token, {}))
+    return rows
+
+@st.cache_resource
+def get_memory_governor():
+    """Gouverneur mémoire partagé par toutes les sessions du serveur"""
+    spill_dir = os.environ.get("PF_SPILL_DIR") or Path(tempfile.gettempdir()) / "pf_api_explorer_spill"
+    governor = MemoryGovernor(SESSION_MEMORY_MB * 1024 ** 2, MEMORY_BUDGET_MB * 1024 ** 2, IDLE_SPILL_SECONDS, spill_dir)
+    governor.start_periodic_enforcement()
+    return governor
+
+def set_session_list(key, items, items_mutable=True):
+    """Stocke une liste volumineuse (reviews, produits) dans la session sous le contrôle du gouverneur mémoire :
+    elle peut être déchargée sur disque et reste utilisable comme une liste (rechargement à l'accès)"""
+    st.session_state[key] = get_memory_governor().create(get_session_id(), key, items, items_mutable=items_mutable)
+
+# Données de référence nécessaires aux filtres de la sidebar
+SIDEBAR_REFERENCE_DATA = ["/categories", "/brands", "/countries", "/sources", "/markets", "/attributes"]
+# Attente maximale du préchargement avant d'afficher la sidebar en attente (secondes)
+REFERENCE_WAIT_SECONDS = 0.1
+
+def get_reference_warmup_jobs():
+    """Appels indépendants nécessaires au premier affichage (mêmes arguments que la sidebar)"""
+    return [
+        ("/categories", fetch, "/categories", None),
+        ("/brands", fetch, "/brands", {}),
+        ("/countries", fetch, "/countries", None),
+        ("/sources", fetch, "/sources", {}),
+        ("/markets", fetch, "/markets", None),
+        ("/attributes", fetch_attributes_dynamic, "ALL", "ALL", []),
+        ("/quotas", fetch_quotas)
     ]
-    attribute_columns = {attr: f"attribute_{attr}" for attr in predefined_attributes}
-    for col_name in attribute_columns.values():
-        df[col_name] = '0'
 
-    pos_attributes_by_row = {}
-    neg_attributes_by_row = {}
-    all_attributes_by_row = {}
+def start_reference_warmup():
+    """Lance en arrière-plan, sans l'attendre, le préchargement parallèle des données de référence de la
+    sidebar et des quotas, une fois par session. Les caches étant partagés, seule la première session
+    d'un serveur paie réellement les appels."""
+    if "reference_warmup_futures" in st.session_state:
+        return st.session_state.reference_warmup_futures
+    
+    ctx = get_script_run_ctx()
+    jobs = get_reference_warmup_jobs()
+    timings = {}
+    start = time.perf_counter()
+    
+    def run_job(job):
+        name, func, *args = job
+        add_script_run_ctx(threading.current_thread(), ctx)
+        job_start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception:
+            pass  # L'erreur sera affichée par l'appel normal de la sidebar
+        timings[name] = (job_start - start, time.perf_counter() - job_start)
+    
+    executor = ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="reference-warmup")
+    futures = {job[0]: executor.submit(run_job, job) for job in jobs}
+    executor.shutdown(wait=False)
+    st.session_state.reference_warmup_futures = futures
+    st.session_state.reference_warmup_timings = timings
+    return futures
+
+def get_pending_reference_data(names=None, timeout=0):
+    """Appels du préchargement encore en cours (parmi `names`), après une attente d'au plus `timeout` secondes"""
+    futures = start_reference_warmup()
+    selected = [future for name, future in futures.items() if names is None or name in names]
+    if timeout:
+        wait(selected, timeout=timeout)
+    pending = [future for future in selected if not future.done()]
+    if not pending and "reference_warmup" not in st.session_state and all(f.done() for f in futures.values()):
+        timings = st.session_state.reference_warmup_timings
+        st.session_state.reference_warmup = {
+            "total_ms": max(offset + duration for offset, duration in timings.values()) * 1000,
+            "sequential_ms": sum(duration for _, duration in timings.values()) * 1000,
+            "endpoints": {name: duration * 1000 for name, (_, duration) in timings.items()}
+        }
+    return pending
+
+@st.fragment(run_every=0.5)
+def poll_reference_data(pending, message):
+    """Affiche un indicateur d'attente et relance la page quand les données de référence sont chargées"""
+    if all(future.done() for future in pending):
+        st.rerun()
+    st.info(message)
+
+def display_warmup_stats():
+    """Affiche la latence du préchargement des données de référence"""
+    stats = st.session_state.get("reference_warmup")
+    if stats:
+        st.caption(f"⚡ Données de référence préchargées en {stats['total_ms']:.0f} ms "
+                   f"({len(stats['endpoints'])} appels parallèles, {stats['sequential_ms']:.0f} ms cumulés)")
+
+@st.cache_resource
+def ensure_metrics_exporter():
+    """Démarre une fois par processus l'export Prometheus HTTP si PF_METRICS_PORT est défini"""
+    port = os.environ.get("PF_METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return start_metrics_server(int(port))
+    except (OSError, ValueError) as e:
+        logger.warning("Export des métriques impossible sur le port %s : %s", port, e)
+        return None
 
-    for idx, row in df.iterrows():
-        pos_attrs_set = set()
-        neg_attrs_set = set()
-        all_attrs_set = set()
+def is_debug_mode():
+    """Le panneau de métriques est affiché avec `?debug=1` dans l'URL ou PF_DEBUG=1"""
+    return st.query_params.get("debug") == "1" or os.environ.get("PF_DEBUG") == "1"
+
+def display_metrics_panel():
+    """Panneau de debug : latences, volumes, erreurs par endpoint et taux de hit des caches"""
+    registry = get_registry()
+    with st.expander("🛠️ Métriques API", expanded=False):
+        endpoint_rows = registry.endpoint_summary()
+        if endpoint_rows:
+            st.markdown("**Appels API par endpoint** (latences sur les derniers appels)")
+            df_endpoints = pd.DataFrame(endpoint_rows).rename(columns={
+                "endpoint": "Endpoint", "requests": "Appels", "errors": "Erreurs", "retries": "Réessais", "bytes": "Octets",
+                "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "p99_ms": "p99 (ms)"
+            })
+            st.dataframe(df_endpoints, hide_index=True, use_container_width=True)
+        else:
+            st.info("Aucun appel API enregistré depuis le démarrage du serveur")
+        
+        cache_rows = registry.cache_summary()
+        if cache_rows:
+            st.markdown("**Caches**")
+            df_caches = pd.DataFrame(cache_rows).rename(columns={
+                "cache": "Cache", "endpoint": "Endpoint", "hit": "Hits", "miss": "Misses",
+                "stale": "Périmés servis", "hit_ratio": "Taux de hit"
+            })
+            df_caches["Taux de hit"] = df_caches["Taux de hit"].map(lambda ratio: f"{ratio:.0%}" if ratio is not None else "")
+            st.dataframe(df_caches, hide_index=True, use_container_width=True)
+        
+        hedging = get_hedging_policy()
+        hedging_enabled = st.toggle("Requêtes de couverture sur /metrics et /products (tout le serveur)", value=hedging.enabled,
+                                    help="Double un appel plus lent que le 95e percentile récent ; au plus 1 doublon pour 10 appels")
+        if hedging_enabled != hedging.enabled:
+            hedging.enabled = hedging_enabled
+        hedging_rows = hedging.summary()
+        if hedging_rows:
+            st.markdown("**Requêtes de couverture** (latences sans doublon → observées)")
+            st.dataframe(pd.DataFrame([{
+                "Endpoint": row["endpoint"], "Appels": row["calls"], "Doublons": row["hedged"], "Doublons gagnants": row["hedge_wins"],
+                "p50 (ms)": f"{row['primary_p50_ms']} → {row['observed_p50_ms']}",
+                "p95 (ms)": f"{row['primary_p95_ms']} → {row['observed_p95_ms']}",
+                "p99 (ms)": f"{row['primary_p99_ms']} → {row['observed_p99_ms']}"
+            } for row in hedging_rows]), hide_index=True, use_container_width=True)
+        
+        breaker = get_circuit_breaker().snapshot()
+        state_label = {"closed": "fermé", "open": "ouvert", "half_open": "demi-ouvert"}[breaker["state"]]
+        st.caption(f"🔌 Disjoncteur : {state_label}, {breaker['failures']} échecs consécutifs, "
+                   f"ouvert {breaker['opened_count']} fois depuis le démarrage")
+        
+        for control in get_token_pool().snapshot():
+            st.caption(f"🚦 Débit API (token {control['name']}"
+                       + (f", {control['cost_center']}" if control['cost_center'] else "")
+                       + f") : {control['rate']:.1f} req/s (plafond {control['rate_ceiling']:.0f}), "
+                       f"{control['in_flight']}/{control['concurrency']} requêtes simultanées, "
+                       f"{control['throttled']} réponses 429, {control['server_errors']} erreurs serveur"
+                       + (f", pause Retry-After {control['blocked_for']:.0f} s" if control['blocked_for'] else ""))
+        
+        memory = get_memory_governor().stats()
+        st.caption(f"🧠 Résultats des sessions : {memory['resident_bytes'] / 1e6:.0f} Mo en mémoire "
+                   f"(budget {MEMORY_BUDGET_MB} Mo), {memory['spilled_values']} déchargés sur disque "
+                   f"({memory['spilled_bytes'] / 1e6:.0f} Mo), {memory['sessions']} sessions "
+                   f"(reviews et listes de produits ; hors caches dérivés : tableaux de produits, analyse SQL, tendances, matrice)")
         
-        if pd.notna(row.get('attributes')):
-            try:
-                all_attrs = ast.literal_eval(row['attributes'])
-                all_attrs_set = {attr for attr in all_attrs if attr in predefined_attributes}
-            except (ValueError, SyntaxError):
-                pass
-                
-        if pd.notna(row.get('attributes positive')):
-            try:
-                pos_attrs = ast.literal_eval(row['attributes positive'])
-                pos_attrs_set = {attr for attr in pos_attrs if attr in predefined_attributes}
-            except (ValueError, SyntaxError):
-                pass
-                
-        if pd.notna(row.get('attributes negative')):
-            try:
-                neg_attrs = ast.literal_eval(row['attributes negative'])
-                neg_attrs_set = {attr for attr in neg_attrs if attr in predefined_attributes}
-            except (ValueError, SyntaxError):
-                pass
-                
-        pos_attributes_by_row[idx] = pos_attrs_set
-        neg_attributes_by_row[idx] = neg_attrs_set
-        all_attributes_by_row[idx] = all_attrs_set
-
-    for idx in all_attributes_by_row:
-        all_attrs = all_attributes_by_row[idx]
-        pos_attrs = pos_attributes_by_row[idx]
-        neg_attrs = neg_attributes_by_row[idx]
-        neutral_attrs = pos_attrs.intersection(neg_attrs)
-        only_pos_attrs = pos_attrs - neutral_attrs
-        only_neg_attrs = neg_attrs - neutral_attrs
-        implicit_neutral_attrs = all_attrs - pos_attrs - neg_attrs
-        
-        for attr in neutral_attrs:
-            df.at[idx, attribute_columns[attr]] = 'neutre'
-        for attr in only_pos_attrs:
-            df.at[idx, attribute_columns[attr]] = 'positive'
-        for attr in only_neg_attrs:
-            df.at[idx, attribute_columns[attr]] = 'negative'
-        for attr in implicit_neutral_attrs:
-            df.at[idx, attribute_columns[attr]] = 'neutre'
-
-    original_columns = [col for col in df.columns if col not in ['attributes', 'attributes positive', 'attributes negative']]
-    original_columns = [col for col in original_columns if not col.startswith('attribute_')]
-
-    df['safety'] = '0'
-    for idx in all_attributes_by_row:
-        pos_attrs = pos_attributes_by_row[idx]
-        neg_attrs = neg_attributes_by_row[idx]
-        all_attrs = all_attributes_by_row[idx]
-        safety_attrs = {'Safety', 'Composition'}
-        safety_neutral = any(attr in (all_attrs - pos_attrs - neg_attrs) for attr in safety_attrs)
-        safety_positive = any(attr in pos_attrs for attr in safety_attrs)
-        safety_negative = any(attr in neg_attrs for attr in safety_attrs)
-        
-        if safety_positive and safety_negative:
-            df.at[idx, 'safety'] = 'neutre'
-        elif safety_positive:
-            df.at[idx, 'safety'] = 'positive'
-        elif safety_negative:
-            df.at[idx, 'safety'] = 'negative'
-        elif safety_neutral:
-            df.at[idx, 'safety'] = 'neutre'
-
-    final_columns = original_columns + list(attribute_columns.values()) + ['safety']
-    available_columns = [col for col in final_columns if col in df.columns]
-    return df[available_columns]
+        try:
+            warehouse = get_review_warehouse().stats()
+            st.caption(f"📦 Entrepôt local : {warehouse['reviews']:,} reviews uniques, {warehouse['contexts']} contextes couverts, "
+                       f"{warehouse['bytes'] / 1e6:.0f} Mo")
+        except sqlite3.Error as e:
+            st.caption(f"📦 Entrepôt local indisponible : {e}")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("⬇️ Exporter (format Prometheus)", registry.render_prometheus(),
+                               file_name="pf_api_metrics.prom", mime="text/plain")
+        with col2:
+            if st.button("🔄 Réinitialiser les métriques"):
+                registry.reset()
+                st.rerun()
+        if os.environ.get("PF_METRICS_PORT"):
+            st.caption(f"Métriques exposées sur le port {os.environ['PF_METRICS_PORT']} (/metrics)")
+        if os.environ.get("PF_METRICS_FILE"):
+            st.caption(f"Métriques écrites dans {os.environ['PF_METRICS_FILE']}")
+
+def is_profiling_enabled():
+    """Le profilage des reruns est activé avec `?profile=1` dans l'URL ou PF_PROFILE=1"""
+    return st.query_params.get("profile") == "1" or os.environ.get("PF_PROFILE") == "1"
+
+def get_session_id():
+    """Identifiant court de la session Streamlit courante"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id[:8] if ctx else None
+
+def display_profiling_panel():
+    """Durées des fonctions display_* / load_* par rerun, régressions et capture d'un rerun sur disque"""
+    with st.expander("⏱️ Profilage des reruns", expanded=False):
+        all_sessions = st.checkbox("Inclure les reruns des autres sessions et des démarrages précédents", key="profile_all_sessions")
+        history = get_history(None if all_sessions else get_session_id())
+        if history:
+            latest = history[-1]
+            st.markdown(f"**Dernier rerun : {latest['total'] * 1000:.0f} ms**")
+            df_latest = pd.DataFrame([
+                {"Fonction": name, "Appels": stats["calls"], "Durée (ms)": round(stats["seconds"] * 1000, 1),
+                 "Imbriquée": "✓" if stats["nested"] else ""}
+                for name, stats in latest["functions"].items()
+            ])
+            if not df_latest.empty:
+                st.dataframe(df_latest.sort_values("Durée (ms)", ascending=False), hide_index=True, use_container_width=True)
+            
+            for regression in find_regressions(history):
+                st.warning(f"⚠️ `{regression['function']}` : {regression['seconds'] * 1000:.0f} ms "
+                           f"(médiane des reruns précédents : {regression['median'] * 1000:.0f} ms)")
+            
+            if len(history) > 1:
+                st.markdown(f"**Historique ({len(history)} reruns, fonctions de premier niveau)**")
+                df_history = pd.DataFrame([
+                    {name: stats["seconds"] * 1000 for name, stats in entry["functions"].items() if not stats["nested"]}
+                    for entry in history[-50:]
+                ]).fillna(0)
+                st.bar_chart(df_history)
+            
+            capture_path = latest.get("capture_path")
+            if capture_path and os.path.exists(capture_path):
+                st.caption(f"📁 Capture enregistrée : {capture_path}")
+                if capture_path.endswith(".prof"):
+                    st.code(summarize_cprofile(capture_path), language="text")
+                with open(capture_path, "rb") as f:
+                    st.download_button("⬇️ Télécharger la capture", f.read(), file_name=os.path.basename(capture_path))
+        else:
+            st.info("Aucun rerun profilé pour cette session")
+        
+        capture_modes = {"cProfile (.prof)": "cprofile", "Échantillonnage (.folded, flamegraph)": "sampling"}
+        capture_label = st.radio("Capture", list(capture_modes), horizontal=True, key="profile_capture_mode")
+        if st.button("🎯 Capturer le prochain rerun"):
+            st.session_state.profile_capture_armed = capture_modes[capture_label]
+        if st.session_state.get("profile_capture_armed"):
+            st.caption("La prochaine interaction sera capturée sur disque")
 
 def generate_export_filename(params, mode="complete", page=None, extension="csv"):
     """Génère un nom de fichier basé sur les paramètres d'export"""
@@ -258,18 +632,77 @@ def generate_export_filename(params, mode="complete", page=None, extension="csv"
     return filename
 
 def display_quotas():
-    """Affiche les quotas API"""
-    result = fetch("/quotas")
-    if result:
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Volume utilisé", result.get('used volume', 'N/A'))
-        with col2:
-            st.metric("Volume restant", result.get('remaining volume', 'N/A'))
-        with col3:
-            st.metric("Quota total", result.get('quota', 'N/A'))
-        with col4:
-            st.metric("Valable jusqu'au", result.get('end date', 'N/A'))
+    """Affiche les quotas API (indicateur d'attente tant que le préchargement n'a pas répondu)"""
+    pending = get_pending_reference_data(["/quotas"])
+    if pending:
+        poll_reference_data(pending, "⏳ Chargement des quotas...")
+        return
+    display_quota_metrics()
+
+def display_quota_metrics(cost_center=None):
+    """Quotas des tokens du pool (d'un centre de coûts) : totaux, et détail par token s'il y en a plusieurs"""
+    rows = [(token, result) for token, result in fetch_quotas(cost_center) if result]
+    if not rows:
+        return
+    if len(rows) == 1:
+        result = rows[0][1]
+        used, remaining, total = result.get('used volume', 'N/A'), result.get('remaining volume', 'N/A'), result.get('quota', 'N/A')
+        end_date = result.get('end date', 'N/A')
+    else:
+        def total_of(field):
+            values = [parse_quota_volume(result.get(field)) for _, result in rows]
+            return f"{sum(values):,}" if None not in values else 'N/A'
+        used, remaining, total = total_of('used volume'), total_of('remaining volume'), total_of('quota')
+        end_date = min((result['end date'] for _, result in rows if result.get('end date')), default='N/A')
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Volume utilisé", used)
+    with col2:
+        st.metric("Volume restant", remaining)
+    with col3:
+        st.metric("Quota total", total)
+    with col4:
+        st.metric("Valable jusqu'au", end_date)
+    if len(rows) > 1:
+        st.dataframe(pd.DataFrame([{
+            "Token": token.name, "Centre de coûts": token.cost_center or "",
+            "Volume utilisé": result.get('used volume'), "Volume restant": result.get('remaining volume'),
+            "Quota total": result.get('quota'), "Valable jusqu'au": result.get('end date')
+        } for token, result in rows]), hide_index=True, use_container_width=True)
+
+def display_degraded_mode_banner(placeholder):
+    """Signale le mode dégradé : API jugée indisponible (disjoncteur ouvert) ou données périmées servies pendant ce rerun"""
+    breaker = get_circuit_breaker().snapshot()
+    stale = st.session_state.get("stale_data") or {}
+    lines = []
+    if breaker["state"] != "closed":
+        lines.append(f"🔌 API indisponible : les appels sont suspendus, nouvel essai dans {breaker['retry_in']:.0f} s.")
+    if stale:
+        endpoints = ", ".join(sorted({spec.endpoint for spec in stale}))
+        oldest = datetime.datetime.fromtimestamp(min(stale.values()))
+        lines.append(f"🕒 Données périmées affichées ({endpoints}) : réponses de l'API datant au plus tôt du "
+                     f"{oldest:%d/%m/%Y à %H:%M}.")
+    if lines:
+        placeholder.warning("\n\n".join(lines))
+
+def display_quota_headroom_warning(cost_center=None):
+    """Signale les tokens dont le débit est plafonné car leur quota restant est faible"""
+    for token in get_token_pool().candidates(cost_center):
+        controller = get_rate_controller(token.token)
+        if controller.quota_low:
+            st.warning(f"⚠️ Quota presque épuisé (token {token.name}) : le débit de ses appels API est limité à "
+                       f"{controller.rate_ceiling:.0f} requêtes/s")
+
+def select_export_cost_center(key):
+    """Centre de coûts auquel rattacher un export (None : tous les tokens du pool) ; masqué sans centre configuré"""
+    cost_centers = get_token_pool().cost_centers()
+    if not cost_centers:
+        return None
+    choice = st.selectbox("Centre de coûts", ["Tous les tokens"] + cost_centers, key=key,
+                          help="Les pages de l'export sont récupérées uniquement avec les tokens de ce centre de coûts")
+    cost_center = None if choice == "Tous les tokens" else choice
+    st.session_state.export_cost_center = cost_center
+    return cost_center
 
 def load_filters_from_json(json_input):
     """Charge les filtres depuis un JSON"""
@@ -389,6 +822,12 @@ def display_sidebar_filters():
     """Affiche les filtres dans la sidebar"""
     with st.sidebar:
         st.header("Filtres")
+        # Les filtres dépendent des données de référence : la page s'affiche sans les attendre
+        pending = get_pending_reference_data(SIDEBAR_REFERENCE_DATA, timeout=REFERENCE_WAIT_SECONDS)
+        if pending:
+            poll_reference_data(pending, "⏳ Chargement des catégories, marques et pays...")
+            return
+        display_warmup_stats()
 
         st.markdown("### 📎 Charger une configuration via URL ou JSON")
         json_input = st.text_area("📥 Collez ici vos paramètres (JSON)", height=150, 
@@ -488,53 +927,104 @@ def display_sidebar_filters():
             else:
                 st.info("🔍 Mode précis sélectionné : La liste des produits va être chargée")
                 
-                # Estimation du nombre de produits à charger
-                total_products_estimate = 0
-                with st.spinner("Estimation du nombre de produits..."):
-                    # Faire une estimation groupée pour éviter trop d'appels API
-                    sample_brands = st.session_state.filters["brand"][:3]  # Échantillon de 3 marques max
-                    
-                    for brand in sample_brands:
-                        products = fetch_products_by_brand(
-                            brand, 
-                            st.session_state.filters["category"], 
-                            st.session_state.filters["subcategory"], 
-                            st.session_state.filters["start_date"], 
-                            st.session_state.filters["end_date"]
-                        )
-                        if products and products.get("products"):
-                            total_products_estimate += len(products["products"])
-                
-                # Extrapoler pour toutes les marques
-                if len(st.session_state.filters["brand"]) > len(sample_brands):
-                    avg_products_per_brand = total_products_estimate / len(sample_brands) if sample_brands else 0
-                    total_products_estimate = int(avg_products_per_brand * len(st.session_state.filters["brand"]))
-                
-                if total_products_estimate > 500:
-                    st.warning(f"⚠️ Estimation : ~{total_products_estimate} produits à charger. Cela peut prendre du temps et consommer du quota API.")
-                    
-                    # Estimation du nombre de reviews pour comparaison
-                    with st.spinner("Estimation du volume de reviews..."):
-                        estimation_params = {
-                            "brand": ",".join(st.session_state.filters["brand"]),
-                            "start-date": st.session_state.filters["start_date"],
-                            "end-date": st.session_state.filters["end_date"]
-                        }
-                        if st.session_state.filters["category"] != "ALL":
-                            estimation_params["category"] = st.session_state.filters["category"]
-                        if st.session_state.filters["subcategory"] != "ALL":
-                            estimation_params["subcategory"] = st.session_state.filters["subcategory"]
-                        
-                        total_reviews_metrics = fetch("/metrics", estimation_params)
-                        total_reviews = total_reviews_metrics.get("nbDocs", 0) if total_reviews_metrics else 0
-                        
-                        st.info(f"💡 Ces marques représentent ~{total_reviews:,} reviews au total")
-                    
-                    if st.button("🔄 Changer pour l'export en masse", key="switch_to_bulk"):
-                        st.session_state.export_strategy = "🚀 Export en masse par marque (recommandé pour beaucoup de produits)"
-                        st.rerun()
-                else:
-                    st.success(f"✅ Estimation : ~{total_products_estimate} produits à charger")
+                # Estimation du nombre de produits à charger (calculée en arrière-plan)
+                display_product_volume_estimate(st.session_state.filters)
+
+@st.cache_resource
+def get_background_executor():
+    """Pool de threads partagé pour les calculs lancés en arrière-plan"""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+
+@st.cache_resource
+def get_estimate_registry():
+    """Estimations de volume en cours ou terminées, partagées entre sessions : ({clé des filtres: (future, date)}, verrou)"""
+    return {}, threading.Lock()
+
+def compute_product_volume_estimate(store, filters):
+    """Estime le nombre de produits (échantillon de 3 marques extrapolé) et, si élevé, le volume de reviews"""
+    context = get_products_context(filters)
+    sample_brands = filters["brand"][:3]  # Échantillon de 3 marques max
+    errors = []
+    total_products_estimate = 0
+    for brand in sample_brands:
+        try:
+            total_products_estimate += len(store.get(brand, context))
+        except ApiError as e:
+            errors.append(f"Erreur pour la marque {brand}: {str(e)}")
+    
+    # Extrapoler pour toutes les marques
+    if len(filters["brand"]) > len(sample_brands):
+        avg_products_per_brand = total_products_estimate / len(sample_brands) if sample_brands else 0
+        total_products_estimate = int(avg_products_per_brand * len(filters["brand"]))
+    
+    # Estimation du nombre de reviews pour comparaison
+    total_reviews = None
+    report = new_fetch_report()
+    if total_products_estimate > 500:
+        # Même requête et même cache que les compteurs affichés (découpage par mois et par lots, mode dégradé).
+        # Calcul partagé hors session : péremption et erreurs sont rendues avec l'estimation
+        spec = QuerySpec.from_params("/metrics", params_from_filters(filters))
+        total_reviews = fetch_counts_concurrently([spec], report=report)[spec]
+        errors.extend(f"Estimation du volume de reviews : {error}" for error in dict.fromkeys(report["errors"]))
+        if total_reviews is None:
+            errors.append("Erreur lors de l'estimation du volume de reviews (API indisponible)")
+            total_reviews = 0
+    
+    return {"products": total_products_estimate, "reviews": total_reviews, "errors": errors, "stale": report["stale"]}
+
+def get_product_volume_estimate_future(filters):
+    """Retourne le calcul (mémorisé par empreinte des filtres) de l'estimation, en le lançant si besoin"""
+    key = QuerySpec.from_params("/estimate", params_from_filters(filters))
+    registry, lock = get_estimate_registry()
+    now = time.time()
+    ttl = key.cache_ttl()
+    with lock:
+        entry = registry.get(key)
+        if entry is None or (ttl is not None and now - entry[1] > ttl):
+            if len(registry) >= 256:
+                for old_key in sorted(registry, key=lambda k: registry[k][1])[:64]:
+                    registry.pop(old_key, None)
+            future = get_background_executor().submit(compute_product_volume_estimate, get_catalog_store(), dict(filters))
+            entry = (future, now)
+            registry[key] = entry
+    return entry[0]
+
+@st.fragment(run_every=1)
+def poll_product_volume_estimate(future):
+    """Affiche un indicateur d'attente et relance la page quand l'estimation est prête"""
+    if future.done():
+        st.rerun()
+    st.info("⏳ Estimation du nombre de produits en cours...")
+
+def display_product_volume_estimate(filters):
+    """Affiche l'estimation du volume de produits sans bloquer la sidebar"""
+    future = get_product_volume_estimate_future(filters)
+    if not future.done():
+        poll_product_volume_estimate(future)
+        return
+    
+    try:
+        estimate = future.result()
+    except Exception as e:
+        st.warning(f"⚠️ Estimation impossible : {str(e)}")
+        return
+    
+    for error in estimate["errors"]:
+        st.warning(error)
+    # Compteurs servis depuis leur dernière valeur connue : signalés dans la session qui affiche l'estimation
+    if estimate["stale"]:
+        st.session_state.setdefault("stale_data", {}).update(estimate["stale"])
+    
+    total_products_estimate = estimate["products"]
+    if total_products_estimate > 500:
+        st.warning(f"⚠️ Estimation : ~{total_products_estimate} produits à charger. Cela peut prendre du temps et consommer du quota API.")
+        st.info(f"💡 Ces marques représentent ~{estimate['reviews']:,} reviews au total")
+        
+        if st.button("🔄 Changer pour l'export en masse", key="switch_to_bulk"):
+            st.session_state.export_strategy = "🚀 Export en masse par marque (recommandé pour beaucoup de produits)"
+            st.rerun()
+    else:
+        st.success(f"✅ Estimation : ~{total_products_estimate} produits à charger")
 
 def display_filter_summary():
     """Affiche le résumé des filtres appliqués"""
@@ -608,27 +1098,13 @@ def load_brand_products(filters):
         for i, brand in enumerate(filters["brand"]):
             st.write(f"🔍 {i+1}/{len(filters['brand'])} : {brand}")
             
-            # Préparation des paramètres
-            params = {
-                "brand": brand,
-                "start-date": filters["start_date"],
-                "end-date": filters["end_date"]
-            }
-            if filters["category"] != "ALL":
-                params["category"] = filters["category"]
-            if filters["subcategory"] != "ALL":
-                params["subcategory"] = filters["subcategory"]
-            if filters["country"] and "ALL" not in filters["country"]:
-                params["country"] = ",".join(filters["country"])
-            if filters["source"] and "ALL" not in filters["source"]:
-                params["source"] = ",".join(filters["source"])
-            if filters["market"] and "ALL" not in filters["market"]:
-                params["market"] = ",".join(filters["market"])
-            
-            # Récupération des produits
-            products_data = fetch_cached("/products", params)
+            try:
+                products = fetch_products_by_brand(brand, filters)
+            except ApiError as e:
+                st.warning(f"Erreur pour la marque {brand}: {str(e)}")
+                continue
             
-            for product in products_data.get("products", []):
+            for product in products:
                 product_info = {
                     "Marque": brand, 
                     "Produit": product,
@@ -636,7 +1112,7 @@ def load_brand_products(filters):
                 }
                 product_rows.append(product_info)
         
-        st.session_state.brand_products_cache = product_rows
+        set_session_list("brand_products_cache", product_rows)
         st.session_state.brand_products_loaded = True
         st.success(f"✅ {len(product_rows)} produits chargés avec succès!")
         st.rerun()
@@ -645,61 +1121,17 @@ def load_brand_products(filters):
 def load_brand_reviews_counts(filters):
     """Charge les compteurs d'avis pour les produits par marque"""
     with st.spinner("Chargement des compteurs d'avis..."):
-        updated_cache = []
+        progress_bar = st.progress(0.0)
         
-        for i, product_info in enumerate(st.session_state.brand_products_cache):
-            brand = product_info["Marque"]
-            product = product_info["Produit"]
-            
-            if i % 10 == 0:  # Affichage du progrès tous les 10 produits
-                st.write(f"📊 {i+1}/{len(st.session_state.brand_products_cache)} produits traités...")
-            
-            try:
-                # Préparation des paramètres pour les métriques
-                params = {
-                    "brand": brand,
-                    "product": product,
-                    "start-date": filters["start_date"],
-                    "end-date": filters["end_date"]
-                }
-                if filters["category"] != "ALL":
-                    params["category"] = filters["category"]
-                if filters["subcategory"] != "ALL":
-                    params["subcategory"] = filters["subcategory"]
-                if filters["country"] and "ALL" not in filters["country"]:
-                    params["country"] = ",".join(filters["country"])
-                if filters["source"] and "ALL" not in filters["source"]:
-                    params["source"] = ",".join(filters["source"])
-                if filters["market"] and "ALL" not in filters["market"]:
-                    params["market"] = ",".join(filters["market"])
-                
-                # Ajouter les filtres d'attributs si définis
-                if filters["attributes"]:
-                    params["attribute"] = ",".join(filters["attributes"])
-                if filters["attributes_positive"]:
-                    params["attribute-positive"] = ",".join(filters["attributes_positive"])
-                if filters["attributes_negative"]:
-                    params["attribute-negative"] = ",".join(filters["attributes_negative"])
-                
-                # Récupération des métriques
-                metrics = fetch("/metrics", params)
-                if metrics and isinstance(metrics, dict):
-                    nb_reviews = metrics.get("nbDocs", 0)
-                else:
-                    nb_reviews = "Erreur API"
-                    
-            except Exception as e:
-                st.warning(f"Erreur métrique pour {brand} - {product}: {str(e)}")
-                nb_reviews = "Erreur"
-            
-            # Mise à jour du cache
-            updated_product_info = product_info.copy()
-            updated_product_info["Nombre d'avis"] = nb_reviews
-            updated_cache.append(updated_product_info)
+        def show_progress(done, total):
+            progress_bar.progress(done / total, text=f"📊 {done}/{total} compteurs mensuels chargés")
+        
+        updated_cache = [product_info.copy() for product_info in st.session_state.brand_products_cache]
+        refreshed, errors_count = refresh_product_counts(updated_cache, filters, show_progress)
         
-        st.session_state.brand_products_cache = updated_cache
+        set_session_list("brand_products_cache", updated_cache)
         st.session_state.brand_reviews_counts_loaded = True
-        st.success("✅ Compteurs d'avis chargés avec succès!")
+        st.success(f"✅ Compteurs d'avis chargés avec succès! ({refreshed} recalculés, {len(updated_cache) - refreshed} à jour)")
         st.rerun()
 
 
@@ -762,6 +1194,8 @@ def display_product_selection():
                 st.session_state.product_list_loaded = False
                 st.session_state.reviews_counts_loaded = False
                 st.session_state.product_data_cache = []
+                st.session_state.product_search_index = None
+                st.session_state.product_catalog_version += 1
                 st.rerun()
     
     # ÉTAPE 2: Chargement des compteurs (optionnel)
@@ -782,7 +1216,7 @@ def display_product_selection():
     if st.session_state.product_list_loaded and st.session_state.product_data_cache:
         st.markdown("### 🎯 Étape 3: Sélection des produits")
         display_product_table()
-        return st.session_state.selected_product_ids
+        return get_selected_product_names()
     
     return []
 
@@ -804,21 +1238,14 @@ def load_product_list(filters):
             status_text.text(f"Chargement marque {i+1}/{len(filters['brand'])}: {brand}")
             
             try:
-                products = fetch_products_by_brand(
-                    brand, 
-                    filters["category"], 
-                    filters["subcategory"], 
-                    filters["start_date"], 
-                    filters["end_date"]
-                )
-                
-                if products and products.get("products"):
-                    for product in products["products"]:
-                        product_data.append({
-                            "Marque": brand, 
-                            "Produit": product,
-                            "Nombre d'avis": "Non chargé"
-                        })
+                for product in fetch_products_by_brand(brand, filters):
+                    known_count = get_fresh_count(filters, brand, product)
+                    product_data.append({
+                        "ID": len(product_data),  # Identifiant stable de la ligne (index de recherche, vue)
+                        "Marque": brand, 
+                        "Produit": product,
+                        "Nombre d'avis": known_count if known_count is not None else "Non chargé"
+                    })
             except Exception as e:
                 st.warning(f"Erreur pour la marque {brand}: {str(e)}")
         
@@ -826,7 +1253,9 @@ def load_product_list(filters):
         status_text.empty()
     
     if product_data:
-        st.session_state.product_data_cache = product_data
+        set_session_list("product_data_cache", product_data)
+        st.session_state.product_catalog_version += 1
+        get_product_search_index()  # Index construit au chargement plutôt qu'à la première recherche
         st.session_state.product_list_loaded = True
         st.session_state.reviews_counts_loaded = False
         st.success(f"✅ {len(product_data)} produits chargés")
@@ -834,8 +1263,140 @@ def load_product_list(filters):
     else:
         st.error("❌ Aucun produit trouvé")
 
+def get_product_count_spec(filters, brand, product):
+    """QuerySpec du compteur d'avis d'un produit pour les filtres donnés"""
+    params = params_from_filters(filters)
+    params["brand"] = brand
+    params["product"] = product
+    return QuerySpec.from_params("/metrics", params)
+
+def is_count_fresh(entry, spec, now):
+    """Un compteur est à jour s'il a été calculé pour la même requête et n'a pas expiré"""
+    if entry is None or entry["spec"] != spec or not isinstance(entry["value"], int):
+        return False
+    ttl = spec.cache_ttl()
+    return ttl is None or now - entry["computed_at"] < ttl  # Période close : le compteur ne bouge plus
+
+def get_fresh_count(filters, brand, product):
+    """Retourne le compteur connu et à jour d'un produit, ou None"""
+    entry = st.session_state.product_count_state.get((brand, product))
+    spec = get_product_count_spec(filters, brand, product)
+    return entry["value"] if is_count_fresh(entry, spec, time.time()) else None
+
+def refresh_product_counts(rows, filters, on_progress=None):
+    """Met à jour le "Nombre d'avis" des lignes en ne recalculant que les compteurs périmés,
+    calculés pour d'autres filtres ou absents. Retourne (nb recalculés, nb erreurs)"""
+    count_state = st.session_state.product_count_state
+    now = time.time()
+    pending = []
+    for row in rows:
+        key = (row["Marque"], row["Produit"])
+        spec = get_product_count_spec(filters, *key)
+        entry = count_state.get(key)
+        if is_count_fresh(entry, spec, now):
+            row["Nombre d'avis"] = entry["value"]
+            get_registry().record_cache("product_counts", "/metrics", "hit")
+        else:
+            pending.append((row, key, spec))
+            get_registry().record_cache("product_counts", "/metrics", "miss")
+    
+    # Termes (mois) de tous les compteurs à recalculer appelés ensemble, en parallèle
+    counts = fetch_counts_concurrently([spec for _, _, spec in pending], on_progress=on_progress)
+    errors_count = 0
+    for row, key, spec in pending:
+        nb_reviews = counts[spec]
+        if nb_reviews is None:
+            nb_reviews = "Erreur API"
+            errors_count += 1
+        
+        row["Nombre d'avis"] = nb_reviews
+        # Un compteur servi périmé (API indisponible) garde la date de sa réponse : il sera recalculé ensuite
+        computed_at = st.session_state.get("stale_data", {}).get(spec, time.time())
+        count_state[key] = {"value": nb_reviews, "computed_at": computed_at, "spec": spec}
+    
+    return len(pending), errors_count
+
+def get_trend_series(filters, brands, products):
+    """Séries de la vue des tendances : (libellé, QuerySpec /metrics sur la période des filtres) par marque puis par produit"""
+    params = params_from_filters(filters)
+    series = [(brand, QuerySpec.from_params("/metrics", {**params, "brand": brand})) for brand in brands]
+    series += [
+        (f"{brand} — {product}", QuerySpec.from_params("/metrics", {**params, "brand": brand, "product": product}))
+        for brand, product in products
+    ]
+    return series
+
+def load_monthly_trends(series):
+    """Volume d'avis mensuel de chaque série : un compteur /metrics par (série, mois), en parallèle.
+    Les mois déjà comptés sont servis par le cache (sans expiration pour les mois clos)"""
+    cells = [(label, piece) for label, spec in series for piece in spec.month_pieces()]
+    progress_bar = st.progress(0.0)
+    counts = fetch_counts_concurrently(
+        [piece for _, piece in cells],
+        on_progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} compteurs mensuels")
+    )
+    progress_bar.empty()
+    trend = pd.DataFrame([
+        {"series": label, "month": piece.start_date.replace(day=1), "reviews": counts[piece]}
+        for label, piece in cells
+    ])
+    trend["month"] = pd.to_datetime(trend["month"])
+    return trend
+
+def display_trend_dashboard():
+    """Tendances mensuelles du volume d'avis par marque (et par produit) sur la période des filtres"""
+    filters = st.session_state.filters
+    st.markdown("---")
+    st.header("📈 Tendances mensuelles")
+    if not filters.get("brand"):
+        st.info("Sélectionnez des marques dans la sidebar pour afficher leurs tendances")
+        return
+    
+    brands = st.multiselect("Marques", filters["brand"], default=filters["brand"], key="trend_brands")
+    products = []
+    if brands and st.checkbox("🔎 Détailler par produit", key="trend_by_product"):
+        product_brand = st.selectbox("Marque des produits", brands, key="trend_product_brand")
+        try:
+            product_options = fetch_products_by_brand(product_brand, filters)
+        except ApiError as e:
+            st.warning(f"Erreur pour la marque {product_brand}: {str(e)}")
+            product_options = []
+        selected = st.multiselect(f"Produits ({MAX_TREND_PRODUCTS} au plus)", product_options,
+                                  max_selections=MAX_TREND_PRODUCTS, key="trend_products")
+        products = [(product_brand, product) for product in selected]
+    
+    series = get_trend_series(filters, brands, products)
+    trend_key = tuple(spec for _, spec in series)
+    if st.button("📈 Charger les tendances", key="load_trends", disabled=not series):
+        start = time.perf_counter()
+        trend = load_monthly_trends(series)
+        st.session_state.trend_data = {"key": trend_key, "df": trend, "elapsed": time.perf_counter() - start}
+    
+    trend_data = st.session_state.get("trend_data")
+    if not trend_data or trend_data["key"] != trend_key:
+        return
+    trend = trend_data["df"]
+    st.caption(f"{len(trend)} compteurs mensuels chargés en {trend_data['elapsed']:.1f} s")
+    errors_count = int(trend["reviews"].isna().sum())
+    if errors_count:
+        st.warning(f"⚠️ {errors_count} compteur(s) mensuel(s) en erreur, absents du graphique")
+    trend = trend.dropna(subset=["reviews"])
+    
+    alt = _altair()
+    trend_chart = alt.Chart(trend).mark_line(point=True).encode(
+        x=alt.X("yearmonth(month):T", title="Mois"),
+        y=alt.Y("reviews:Q", title="Reviews"),
+        color=alt.Color("series:N", title="Série"),
+        tooltip=[alt.Tooltip("series:N", title="Série"), alt.Tooltip("yearmonth(month):T", title="Mois"), alt.Tooltip("reviews:Q", title="Reviews")]
+    )
+    st.altair_chart(trend_chart, use_container_width=True)
+    with st.expander("📋 Volumes mensuels", expanded=False):
+        table = trend.pivot_table(index="month", columns="series", values="reviews", aggfunc="sum")
+        table.index = table.index.strftime("%Y-%m")
+        st.dataframe(table, use_container_width=True)
+
 def load_reviews_counts(filters):
-    """Charge les compteurs d'avis pour les produits déjà en cache"""
+    """Charge les compteurs d'avis pour les produits déjà en cache (seulement ceux à recalculer)"""
     if not st.session_state.product_data_cache:
         st.error("❌ Liste des produits non chargée")
         return
@@ -843,186 +1404,198 @@ def load_reviews_counts(filters):
     with st.spinner("Chargement des compteurs d'avis..."):
         progress_bar = st.progress(0)
         status_text = st.empty()
-        errors_count = 0
         
-        for i, row in enumerate(st.session_state.product_data_cache):
-            progress = (i + 1) / len(st.session_state.product_data_cache)
-            progress_bar.progress(progress)
-            
-            product_name = row["Produit"]
-            brand_name = row["Marque"]
-            status_text.text(f"Chargement {i+1}/{len(st.session_state.product_data_cache)}: {brand_name} - {product_name[:30]}...")
-            
-            try:
-                # Construction des paramètres pour les métriques
-                product_params = {
-                    "product": product_name,
-                    "brand": brand_name,
-                    "start-date": filters["start_date"],
-                    "end-date": filters["end_date"]
-                }
-                
-                # Ajouter les autres filtres si définis
-                if filters["category"] != "ALL":
-                    product_params["category"] = filters["category"]
-                if filters["subcategory"] != "ALL":
-                    product_params["subcategory"] = filters["subcategory"]
-                if filters["country"] and "ALL" not in filters["country"]:
-                    product_params["country"] = ",".join(filters["country"])
-                if filters["source"] and "ALL" not in filters["source"]:
-                    product_params["source"] = ",".join(filters["source"])
-                if filters["market"] and "ALL" not in filters["market"]:
-                    product_params["market"] = ",".join(filters["market"])
-                if filters["attributes"]:
-                    product_params["attribute"] = ",".join(filters["attributes"])
-                if filters["attributes_positive"]:
-                    product_params["attribute-positive"] = ",".join(filters["attributes_positive"])
-                if filters["attributes_negative"]:
-                    product_params["attribute-negative"] = ",".join(filters["attributes_negative"])
-                
-                # Appel API pour les métriques
-                metrics = fetch("/metrics", product_params)
-                
-                if metrics and isinstance(metrics, dict):
-                    nb_reviews = metrics.get("nbDocs", 0)
-                    st.session_state.product_data_cache[i]["Nombre d'avis"] = nb_reviews
-                else:
-                    st.session_state.product_data_cache[i]["Nombre d'avis"] = "Erreur API"
-                    errors_count += 1
-                    
-            except Exception as e:
-                st.session_state.product_data_cache[i]["Nombre d'avis"] = "Erreur"
-                errors_count += 1
+        def show_progress(done, total):
+            progress_bar.progress(done / total)
+            status_text.text(f"Chargement {done}/{total} compteurs mensuels...")
+        
+        refreshed, errors_count = refresh_product_counts(st.session_state.product_data_cache, filters, show_progress)
         
         progress_bar.empty()
         status_text.empty()
         
+        display_hedging_gain("/metrics")
         if errors_count > 0:
             st.warning(f"⚠️ {errors_count} erreurs lors du chargement des compteurs")
+        elif refreshed == 0:
+            st.success(f"✅ Compteurs déjà à jour pour {len(st.session_state.product_data_cache)} produits")
         else:
-            st.success(f"✅ Compteurs chargés pour {len(st.session_state.product_data_cache)} produits")
+            st.success(f"✅ {refreshed} compteurs recalculés ({len(st.session_state.product_data_cache) - refreshed} déjà à jour)")
         
+        st.session_state.product_catalog_version += 1
         st.session_state.reviews_counts_loaded = True
 
+def display_hedging_gain(endpoint):
+    """Latence de queue gagnée par les requêtes de couverture sur un endpoint (si le mode est actif)"""
+    hedging = get_hedging_policy()
+    if not hedging.enabled:
+        return
+    row = next((row for row in hedging.summary() if row["endpoint"] == endpoint), None)
+    if row is None or not row["primary_p99_ms"]:
+        return
+    gain = 1 - row["observed_p99_ms"] / row["primary_p99_ms"]
+    st.caption(f"⚡ Requêtes de couverture {endpoint} : p99 {row['primary_p99_ms']:.0f} ms → {row['observed_p99_ms']:.0f} ms "
+               f"({gain:.0%} de latence de queue évitée), {row['hedged']} doublons pour {row['calls']} appels")
+
+PRODUCT_TABLE_PAGE_SIZE = 100
+
+def get_product_frame():
+    """Retourne le catalogue produits sous forme de DataFrame typé, indexé par identifiant produit
+    (reconstruit seulement si le cache change)"""
+    version = st.session_state.product_catalog_version
+    cached = st.session_state.get("product_frame_cache")
+    if cached is None or cached[0] != version:
+        rows = st.session_state.product_data_cache
+        df = pd.DataFrame(rows, columns=["Marque", "Produit", "Nombre d'avis"], index=[row["ID"] for row in rows])
+        # Colonne numérique typée : les compteurs non chargés ou en erreur deviennent <NA>
+        df["Nombre d'avis"] = pd.to_numeric(df["Nombre d'avis"], errors="coerce").astype("Int64")
+        cached = (version, df)
+        st.session_state.product_frame_cache = cached
+    return cached[1]
+
+def get_product_search_index():
+    """Retourne l'index de recherche du catalogue produits (clé : identifiant produit), reconstruit à chaque
+    changement du catalogue"""
+    version = st.session_state.product_catalog_version
+    cached = st.session_state.get("product_search_index")
+    if cached is None or cached[0] != version:
+        rows = st.session_state.product_data_cache
+        cached = (version, ProductSearchIndex((row["ID"], (row["Marque"], row["Produit"])) for row in rows))
+        st.session_state.product_search_index = cached
+    return cached[1]
+
+def get_product_view(search_text, sort_column, sort_ascending):
+    """Retourne la vue filtrée et triée du catalogue, mise en cache par (catalogue, recherche, tri)"""
+    view_key = (st.session_state.product_catalog_version, search_text, sort_column, sort_ascending)
+    cached = st.session_state.get("product_view_cache")
+    if cached is None or cached[0] != view_key:
+        df = get_product_frame()
+        if search_text:
+            # Correspondance par identifiant produit : indépendante de l'ordre des lignes du catalogue
+            positions = df.index.get_indexer(get_product_search_index().search(search_text))
+            df = df.iloc[np.sort(positions[positions >= 0])]
+        if sort_column in df.columns:
+            df = df.sort_values(by=sort_column, ascending=sort_ascending, na_position="last", kind="stable")
+        cached = (view_key, df)
+        st.session_state.product_view_cache = cached
+        st.session_state.product_table_page = 1
+    return cached[1]
+
+def get_selected_product_names():
+    """Liste triée et dédupliquée des noms de produits sélectionnés"""
+    return sorted({product for _, product in st.session_state.selected_products})
+
+def apply_product_editor_changes(editor_key, page_pairs):
+    """Répercute les cases cochées dans l'éditeur sur l'ensemble des produits sélectionnés"""
+    edited_rows = st.session_state[editor_key].get("edited_rows", {})
+    selected = st.session_state.selected_products
+    for row_index, changes in edited_rows.items():
+        if "Sélect." not in changes:
+            continue
+        pair = page_pairs[int(row_index)]
+        if changes["Sélect."]:
+            selected.add(pair)
+        else:
+            selected.discard(pair)
+
 def display_product_table():
     """Affiche le tableau des produits avec options de tri et sélection"""
-    product_data = st.session_state.product_data_cache
-    
     st.markdown("---")
     st.subheader("🎯 Sélection des produits")
     
     # Recherche et filtrage
     search_text = st.text_input("🔍 Filtrer les produits", key="product_search_filter")
     
-    # Créer un DataFrame avec les données
-    df_products = pd.DataFrame(product_data)
-    
-    # Filtrer selon la recherche
-    if search_text:
-        mask = df_products["Produit"].str.contains(search_text, case=False, na=False) | df_products["Marque"].str.contains(search_text, case=False, na=False)
-        filtered_df = df_products[mask]
-    else:
-        filtered_df = df_products
-    
     # Boutons de tri
     col1, col2, col3 = st.columns([2, 2, 2])
     with col1:
         if st.button("Trier par marque", key="sort_brand"):
-            st.session_state.sort_column = "Marque"
             st.session_state.sort_ascending = not st.session_state.sort_ascending if st.session_state.sort_column == "Marque" else True
+            st.session_state.sort_column = "Marque"
     with col2:
         if st.button("Trier par produit", key="sort_product"):
-            st.session_state.sort_column = "Produit"
             st.session_state.sort_ascending = not st.session_state.sort_ascending if st.session_state.sort_column == "Produit" else True
+            st.session_state.sort_column = "Produit"
     with col3:
         if st.button("Trier par nb d'avis", key="sort_reviews"):
-            st.session_state.sort_column = "Nombre d'avis"
             st.session_state.sort_ascending = not st.session_state.sort_ascending if st.session_state.sort_column == "Nombre d'avis" else False
+            st.session_state.sort_column = "Nombre d'avis"
     
-    # Appliquer le tri
-    if st.session_state.sort_column in filtered_df.columns:
-        if st.session_state.sort_column == "Nombre d'avis":
-            # Tri numérique pour les avis
-            def sort_reviews(x):
-                if isinstance(x, (int, float)):
-                    return x
-                elif str(x).isdigit():
-                    return int(x)
-                else:
-                    return -1  # Mettre les erreurs en dernier
-            
-            filtered_df = filtered_df.iloc[filtered_df["Nombre d'avis"].map(sort_reviews).argsort()]
-            if not st.session_state.sort_ascending:
-                filtered_df = filtered_df.iloc[::-1]
-        else:
-            filtered_df = filtered_df.sort_values(by=st.session_state.sort_column, ascending=st.session_state.sort_ascending)
+    filtered_df = get_product_view(search_text, st.session_state.sort_column, st.session_state.sort_ascending)
     
-    # Afficher le tableau avec les cases à cocher
     st.write(f"Nombre de produits: {len(filtered_df)} | Tri actuel: {st.session_state.sort_column} ({'croissant' if st.session_state.sort_ascending else 'décroissant'})")
     
     # Interface de sélection groupée
-    col_sel_all, col_apply_sel, col_deselect_all = st.columns([1, 2, 2])
+    col_sel_all, col_desel_visible, col_deselect_all = st.columns([2, 2, 2])
     with col_sel_all:
-        select_all = st.checkbox("✅ Tout sélectionner visible", key="select_all_products")
-    
-    with col_apply_sel:
-        if st.button("🎯 Appliquer la sélection", key="apply_selection"):
-            visible_product_ids = list(filtered_df["Produit"].values)
-            if select_all:
-                for pid in visible_product_ids:
-                    if pid not in st.session_state.selected_product_ids:
-                        st.session_state.selected_product_ids.append(pid)
-            else:
-                st.session_state.selected_product_ids = [
-                    pid for pid in st.session_state.selected_product_ids if pid not in visible_product_ids
-                ]
+        if st.button("✅ Sélectionner tous les visibles", key="select_all_products"):
+            st.session_state.selected_products.update(zip(filtered_df["Marque"], filtered_df["Produit"]))
+            st.session_state.product_selection_rev += 1
+    
+    with col_desel_visible:
+        if st.button("➖ Désélectionner les visibles", key="deselect_visible_products"):
+            st.session_state.selected_products.difference_update(zip(filtered_df["Marque"], filtered_df["Produit"]))
+            st.session_state.product_selection_rev += 1
     
     with col_deselect_all:
         if st.button("❌ Tout désélectionner", key="deselect_all_products"):
-            st.session_state.selected_product_ids = []
-
-    # En-têtes du tableau
-    header_col1, header_col2, header_col3, header_col4 = st.columns([0.5, 2, 2, 1])
-    with header_col1:
-        st.write("**Sélect.**")
-    with header_col2:
-        st.write("**Marque**")
-    with header_col3:
-        st.write("**Produit**")
-    with header_col4:
-        st.write("**Nombre d'avis**")
-
-    # Affichage ligne par ligne avec checkbox
-    for index, row in filtered_df.iterrows():
-        product_id = row["Produit"]
-        
-        col1, col2, col3, col4 = st.columns([0.5, 2, 2, 1])
-        with col1:
-            is_selected = st.checkbox(
-                "", 
-                value=product_id in st.session_state.selected_product_ids,
-                key=f"product_check_{index}_{hash(product_id)}"
-            )
-        with col2:
-            st.write(row["Marque"])
-        with col3:
-            st.write(row["Produit"])
-        with col4:
-            reviews_count = row["Nombre d'avis"]
-            if isinstance(reviews_count, (int, float)) and reviews_count >= 0:
-                st.write(f"**{reviews_count:,}**")
-            else:
-                st.write(f"{reviews_count}")
+            st.session_state.selected_products = set()
+            st.session_state.product_selection_rev += 1
+
+    # Pagination : seule la page courante est envoyée à l'éditeur
+    total_pages = max(1, (len(filtered_df) + PRODUCT_TABLE_PAGE_SIZE - 1) // PRODUCT_TABLE_PAGE_SIZE)
+    if st.session_state.product_table_page > total_pages:
+        st.session_state.product_table_page = total_pages
+    current_page = st.session_state.product_table_page
+    
+    start_idx = (current_page - 1) * PRODUCT_TABLE_PAGE_SIZE
+    page_df = filtered_df.iloc[start_idx:start_idx + PRODUCT_TABLE_PAGE_SIZE]
+    page_pairs = list(zip(page_df["Marque"], page_df["Produit"]))
+    selected = st.session_state.selected_products
+    
+    editor_df = pd.DataFrame({
+        "Sélect.": [pair in selected for pair in page_pairs],
+        "Marque": page_df["Marque"].to_numpy(),
+        "Produit": page_df["Produit"].to_numpy(),
+        "Nombre d'avis": page_df["Nombre d'avis"].array
+    })
+    
+    # La clé change avec la page, la vue et les sélections groupées pour repartir d'un état d'édition vierge
+    view_key = st.session_state.product_view_cache[0]
+    editor_key = f"product_editor_{hash(view_key)}_{current_page}_{st.session_state.product_selection_rev}"
+    st.data_editor(
+        editor_df,
+        key=editor_key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["Marque", "Produit", "Nombre d'avis"],
+        column_config={
+            "Sélect.": st.column_config.CheckboxColumn("Sélect.", width="small"),
+            "Nombre d'avis": st.column_config.NumberColumn("Nombre d'avis", format="%d")
+        },
+        on_change=apply_product_editor_changes,
+        args=(editor_key, page_pairs)
+    )
     
-        # Mise à jour à la volée
-        if is_selected and product_id not in st.session_state.selected_product_ids:
-            st.session_state.selected_product_ids.append(product_id)
-        elif not is_selected and product_id in st.session_state.selected_product_ids:
-            st.session_state.selected_product_ids.remove(product_id)
+    def prev_product_page():
+        if st.session_state.product_table_page > 1:
+            st.session_state.product_table_page -= 1
+    
+    def next_product_page():
+        if st.session_state.product_table_page < total_pages:
+            st.session_state.product_table_page += 1
+    
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("⬅️ Produits précédents", on_click=prev_product_page, disabled=current_page <= 1, key="products_prev_page")
+    with col_info:
+        st.write(f"Page {current_page} / {total_pages}")
+    with col_next:
+        st.button("➡️ Produits suivants", on_click=next_product_page, disabled=current_page >= total_pages, key="products_next_page")
 
     # Résumé sélection
     st.write("---")
-    selected_products = st.session_state.selected_product_ids
+    selected_products = get_selected_product_names()
     if selected_products:
         st.write(f"**{len(selected_products)} produits sélectionnés** : {', '.join(selected_products[:5])}{' ...' if len(selected_products) > 5 else ''}")
     else:
@@ -1031,30 +1604,8 @@ def display_product_table():
 def display_reviews_export_interface(filters, selected_products):
     """Affiche l'interface d'export des reviews"""
     
-    # Construction des paramètres d'export
-    params = {
-        "start-date": filters["start_date"],
-        "end-date": filters["end_date"]
-    }
-    
-    if filters["category"] != "ALL":
-        params["category"] = filters["category"]
-    if filters["subcategory"] != "ALL":
-        params["subcategory"] = filters["subcategory"]
-    if filters["brand"]:
-        params["brand"] = ",".join(filters["brand"])
-    if filters["country"] and "ALL" not in filters["country"]:
-        params["country"] = ",".join(filters["country"])
-    if filters["source"] and "ALL" not in filters["source"]:
-        params["source"] = ",".join(filters["source"])
-    if filters["market"] and "ALL" not in filters["market"]:
-        params["market"] = ",".join(filters["market"])
-    if filters["attributes"]:
-        params["attribute"] = ",".join(filters["attributes"])
-    if filters["attributes_positive"]:
-        params["attribute-positive"] = ",".join(filters["attributes_positive"])
-    if filters["attributes_negative"]:
-        params["attribute-negative"] = ",".join(filters["attributes_negative"])
+    # Construction des paramètres d'export (mêmes clés que les caches et le découpage des requêtes)
+    params = params_from_filters(filters)
     if selected_products:
         params["product"] = ",".join(selected_products)
     
@@ -1071,7 +1622,7 @@ def display_reviews_export_interface(filters, selected_products):
     st.markdown("## ⚙️ Paramètres d'export des reviews")
 
     # Configuration du chemin du log
-    log_path = Path("review_exports_log.csv")
+    log_path = get_export_log_path()
     
     # Journal des exports - SANS BLOQUER LA SUITE
     with st.expander("📁 Consulter le journal des exports précédents", expanded=False):
@@ -1105,17 +1656,9 @@ def display_reviews_export_interface(filters, selected_products):
                 random_seed = None
     
         st.markdown("### 📊 Quotas API")
-        quotas = fetch("/quotas")
-        if quotas:
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Volume utilisé", quotas.get('used volume', 'N/A'))
-            with col2:
-                st.metric("Volume restant", quotas.get('remaining volume', 'N/A'))
-            with col3:
-                st.metric("Quota total", quotas.get('quota', 'N/A'))
-            with col4:
-                st.metric("Valable jusqu'au", quotas.get('end date', 'N/A'))
+        cost_center = select_export_cost_center("export_cost_center_select")
+        display_quota_metrics(cost_center)
+        display_quota_headroom_warning(cost_center)
     
         st.markdown("### 🔍 Options d'export")
             
@@ -1146,7 +1689,7 @@ def display_reviews_export_interface(filters, selected_products):
             # Réinitialiser la session
             st.session_state.cursor_mark = "*"
             st.session_state.current_page = 1
-            st.session_state.all_docs = []
+            set_session_list("all_docs", [], items_mutable=False)
             st.session_state.export_params = params.copy()
                 
             params_with_rows = params.copy()
@@ -1168,7 +1711,7 @@ def display_reviews_export_interface(filters, selected_products):
                 st.session_state.export_in_progress = False
             else:
                 try:
-                    execute_export_process(params_with_rows, total_api_results, preview_limit)
+                    execute_export_process(params_with_rows, total_api_results, preview_limit, cost_center)
                 finally:
                     st.session_state.export_in_progress = False
 
@@ -1393,17 +1936,8 @@ def display_debug_content(log_path):
                 random_seed = None
     
         st.markdown("### 📊 Quotas API")
-        quotas = fetch("/quotas")
-        if quotas:
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Volume utilisé", quotas.get('used volume', 'N/A'))
-            with col2:
-                st.metric("Volume restant", quotas.get('remaining volume', 'N/A'))
-            with col3:
-                st.metric("Quota total", quotas.get('quota', 'N/A'))
-            with col4:
-                st.metric("Valable jusqu'au", quotas.get('end date', 'N/A'))
+        display_quota_metrics()
+        display_quota_headroom_warning()
     
         # Vérification d'export déjà réalisé
         potential_duplicates = []
@@ -1465,7 +1999,7 @@ def display_debug_content(log_path):
             # 🧹 Réinitialiser complètement la session
             st.session_state.cursor_mark = "*"
             st.session_state.current_page = 1
-            st.session_state.all_docs = []  # ✅ Vider explicitement
+            set_session_list("all_docs", [], items_mutable=False)  # ✅ Vider explicitement
             st.session_state.export_params = params.copy()
                 
             params_with_rows = params.copy()
@@ -1492,8 +2026,8 @@ def display_debug_content(log_path):
                     st.session_state.export_in_progress = False  # 🔓 Toujours libérer le verrou
 
 
-def execute_export_process(params_with_rows, total_api_results, preview_limit):
-    """Exécute le processus d'export"""
+def execute_export_process(params_with_rows, total_api_results, preview_limit, cost_center=None):
+    """Exécute le processus d'export (pages récupérées avec les tokens du centre de coûts `cost_center`)"""
     
     # 🔒 Double vérification du verrou (sécurité)
     if st.session_state.get('export_in_progress', False) == False:
@@ -1502,13 +2036,13 @@ def execute_export_process(params_with_rows, total_api_results, preview_limit):
     
     # 🧹 S'assurer que all_docs est vide (sécurité supplémentaire)
     if 'all_docs' not in st.session_state:
-        st.session_state.all_docs = []
+        set_session_list("all_docs", [], items_mutable=False)
     
     # Debug : vérifier l'état initial
     initial_docs_count = len(st.session_state.all_docs)
     if initial_docs_count > 0:
         st.warning(f"⚠️ ATTENTION: all_docs contenait déjà {initial_docs_count} éléments - réinitialisation")
-        st.session_state.all_docs = []
+        set_session_list("all_docs", [], items_mutable=False)
     
     # Configuration selon le mode
     if st.session_state.is_preview_mode:
@@ -1523,28 +2057,34 @@ def execute_export_process(params_with_rows, total_api_results, preview_limit):
     status_text = st.empty()
     progress_bar = None if st.session_state.is_preview_mode else st.progress(0)
     
-    cursor_mark = "*"
     page_count = 0
+    # Export complet déjà récupéré par une session précédente : servi depuis l'entrepôt local
+    warehouse_docs = None if st.session_state.is_preview_mode else load_from_warehouse(params_with_rows, total_api_results)
+    writer = None if st.session_state.is_preview_mode or warehouse_docs is not None else open_warehouse_writer(params_with_rows)
+    
+    # Aucun appel API pour un export servi par l'entrepôt : pas de mesure de débit ni de relevé de quota
+    telemetry = None if st.session_state.is_preview_mode or warehouse_docs is not None else ExportTelemetry(
+        "STANDARD", params_with_rows, get_quota_used_before_export(cost_center))
+    fetch_page = partial(fetch_reviews_page, cost_center=cost_center)
+    fetch_page = telemetry.timed_fetch(fetch_page) if telemetry else fetch_page
     
     # ✅ UTILISER DIRECTEMENT st.session_state.all_docs au lieu d'une variable locale
     max_iterations = min(100, expected_total_pages + 5)
+    if warehouse_docs is not None:
+        set_session_list("all_docs", warehouse_docs, items_mutable=False)
+        progress_bar.progress(1.0)
+        max_iterations = 0
     
     try:
-        while page_count < max_iterations:
-            page_count += 1
+        for page_count, docs, result in paginate_export_reviews(fetch_page, params_with_rows, max_iterations):
             status_text.text(f"Chargement de la page {page_count}/{expected_total_pages if not st.session_state.is_preview_mode else 1}...")
             
-            current_params = params_with_rows.copy()
-            current_params["cursorMark"] = cursor_mark
-            
-            result = fetch("/reviews", current_params)
-            
-            if not result or not result.get("docs") or len(result.get("docs", [])) == 0:
+            if not docs:
                 break
                 
             # ✅ CORRECTION PRINCIPALE : Ajouter directement à session_state
-            docs = result.get("docs", [])
             st.session_state.all_docs.extend(docs)  # ✅ Plus de variable locale !
+            add_warehouse_page(writer, docs)
             
             # Debug : afficher le nombre total après chaque page
             st.write(f"🔍 Page {page_count}: +{len(docs)} docs, total: {len(st.session_state.all_docs)}")
@@ -1556,22 +2096,16 @@ def execute_export_process(params_with_rows, total_api_results, preview_limit):
             if st.session_state.is_preview_mode:
                 break
                 
-            next_cursor = result.get("nextCursorMark")
-            if not next_cursor or next_cursor == cursor_mark:
-                break
-                
-            cursor_mark = next_cursor
-            
-            if st.session_state.is_preview_mode and len(st.session_state.all_docs) >= preview_limit:
-                break
-                
     except Exception as e:
         st.error(f"Erreur lors de la récupération des données: {str(e)}")
         return
     
+    complete_warehouse_run(writer, total_api_results)
+    
     # Log pour export complet
     if not st.session_state.is_preview_mode and st.session_state.all_docs:
-        log_standard_export(params_with_rows, len(st.session_state.all_docs))
+        log_standard_export(params_with_rows, len(st.session_state.all_docs), cost_center)
+        defer_export_telemetry(telemetry, len(st.session_state.all_docs), cost_center)
     
     mode_text = "aperçu" if st.session_state.is_preview_mode else "export complet"
     final_count = len(st.session_state.all_docs)
@@ -1581,10 +2115,10 @@ def execute_export_process(params_with_rows, total_api_results, preview_limit):
     else:
         status_text.text(f"⚠️ Aucune review récupérée. Vérifiez vos filtres.")
 
-def log_standard_export(params, nb_reviews):
+def log_standard_export(params, nb_reviews, cost_center=None):
     """Enregistre l'export standard dans le log"""
     try:
-        log_path = Path("review_exports_log.csv")
+        log_path = get_export_log_path()
         export_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         product_names = params.get("product", "").split(",") if params.get("product") else []
@@ -1613,7 +2147,8 @@ def log_standard_export(params, nb_reviews):
                 "random_seed": params.get("random", None),
                 "nb_reviews": nb_reviews,
                 "export_timestamp": export_date,
-                "export_type": "STANDARD"
+                "export_type": "STANDARD",
+                "cost_center": cost_center
             })
         
         if log_entries:
@@ -1625,7 +2160,7 @@ def log_standard_export(params, nb_reviews):
                 log_df = new_log_df
             log_df.to_csv(log_path, index=False)
             
-            st.info("📝 Log d'export mis à jour dans 'review_exports_log.csv'")
+            st.info(f"📝 Log d'export mis à jour dans '{log_path}'")
     except Exception as e:
         st.warning(f"Erreur lors de la mise à jour du journal d'export: {str(e)}")
 
@@ -1670,6 +2205,8 @@ def display_bulk_export_interface():
             else:
                 bulk_random_seed = None
         
+        bulk_cost_center = select_export_cost_center("bulk_cost_center_select")
+        
         # Mode d'export
         bulk_mode = st.radio(
             "Mode d'export en masse",
@@ -1682,30 +2219,8 @@ def display_bulk_export_interface():
             st.markdown("### 📊 Estimation du volume")
             
             with st.spinner("Estimation du volume total..."):
-                # Construire les paramètres pour l'estimation groupée (comme l'API directe)
-                estimation_params = {
-                    "brand": ",".join(filters["brand"]),  # Toutes les marques en une fois
-                    "start-date": filters["start_date"],
-                    "end-date": filters["end_date"]
-                }
-                
-                # Ajouter les autres filtres
-                if filters["category"] != "ALL":
-                    estimation_params["category"] = filters["category"]
-                if filters["subcategory"] != "ALL":
-                    estimation_params["subcategory"] = filters["subcategory"]
-                if filters["country"] and "ALL" not in filters["country"]:
-                    estimation_params["country"] = ",".join(filters["country"])
-                if filters["source"] and "ALL" not in filters["source"]:
-                    estimation_params["source"] = ",".join(filters["source"])
-                if filters["market"] and "ALL" not in filters["market"]:
-                    estimation_params["market"] = ",".join(filters["market"])
-                if filters["attributes"]:
-                    estimation_params["attribute"] = ",".join(filters["attributes"])
-                if filters["attributes_positive"]:
-                    estimation_params["attribute-positive"] = ",".join(filters["attributes_positive"])
-                if filters["attributes_negative"]:
-                    estimation_params["attribute-negative"] = ",".join(filters["attributes_negative"])
+                # Paramètres de l'estimation groupée : toutes les marques en une fois
+                estimation_params = params_from_filters(filters)
                 
                 # Appel API groupé pour le total
                 metrics = fetch("/metrics", estimation_params)
@@ -1718,15 +2233,16 @@ def display_bulk_export_interface():
                 if st.checkbox("📋 Voir le détail par marque", key="show_brand_details"):
                     with st.spinner("Détail par marque..."):
                         st.markdown("#### Détail par marque :")
-                        brand_details = []
-                        
-                        for brand in filters["brand"]:
-                            brand_params = estimation_params.copy()
-                            brand_params["brand"] = brand  # Une seule marque
-                            
-                            brand_metrics = fetch("/metrics", brand_params)
-                            brand_count = brand_metrics.get("nbDocs", 0) if brand_metrics else 0
-                            brand_details.append({"Marque": brand, "Reviews": brand_count})
+                        # Une requête par marque, appelées en parallèle
+                        brand_specs = {
+                            brand: QuerySpec.from_params("/metrics", {**estimation_params, "brand": brand})
+                            for brand in filters["brand"]
+                        }
+                        brand_counts = fetch_counts_concurrently(brand_specs.values(), cost_center=bulk_cost_center)
+                        brand_details = [
+                            {"Marque": brand, "Reviews": brand_counts[spec] or 0}
+                            for brand, spec in brand_specs.items()
+                        ]
                         
                         # Affichage en tableau
                         df_details = pd.DataFrame(brand_details)
@@ -1737,6 +2253,9 @@ def display_bulk_export_interface():
                         if sum_individual != total_estimated:
                             st.warning(f"⚠️ Différence détectée : Total groupé ({total_estimated:,}) ≠ Somme individuelle ({sum_individual:,})")
                             st.info("💡 Cela peut être normal si des reviews mentionnent plusieurs marques")
+                
+                if st.checkbox("🧮 Matrice des volumes par pays / source", key="show_count_matrix"):
+                    display_count_matrix(filters, estimation_params, bulk_cost_center)
             
             if bulk_mode == "Aperçu rapide (100 reviews max)":
                 actual_export = min(100, total_estimated)
@@ -1750,30 +2269,8 @@ def display_bulk_export_interface():
                 st.error("❌ Aucune marque sélectionnée pour l'export en masse")
                 return
             
-            # Construire les paramètres pour l'export en masse
-            bulk_params = {
-                "start-date": filters["start_date"],
-                "end-date": filters["end_date"],
-                "brand": ",".join(filters["brand"])  # Toutes les marques en une fois
-            }
-            
-            # Ajouter les autres filtres
-            if filters["category"] != "ALL":
-                bulk_params["category"] = filters["category"]
-            if filters["subcategory"] != "ALL":
-                bulk_params["subcategory"] = filters["subcategory"]
-            if filters["country"] and "ALL" not in filters["country"]:
-                bulk_params["country"] = ",".join(filters["country"])
-            if filters["source"] and "ALL" not in filters["source"]:
-                bulk_params["source"] = ",".join(filters["source"])
-            if filters["market"] and "ALL" not in filters["market"]:
-                bulk_params["market"] = ",".join(filters["market"])
-            if filters["attributes"]:
-                bulk_params["attribute"] = ",".join(filters["attributes"])
-            if filters["attributes_positive"]:
-                bulk_params["attribute-positive"] = ",".join(filters["attributes_positive"])
-            if filters["attributes_negative"]:
-                bulk_params["attribute-negative"] = ",".join(filters["attributes_negative"])
+            # Paramètres de l'export en masse : toutes les marques en une fois
+            bulk_params = params_from_filters(filters)
             
             # Paramètres de pagination
             is_bulk_preview = bulk_mode == "Aperçu rapide (100 reviews max)"
@@ -1791,10 +2288,76 @@ def display_bulk_export_interface():
             st.session_state.is_preview_mode = is_bulk_preview
             
             # Lancer l'export
-            execute_bulk_export(bulk_params, is_bulk_preview)
+            execute_bulk_export(bulk_params, is_bulk_preview, bulk_cost_center)
+
+def get_count_matrix_values(filters, dimension):
+    """Valeurs d'une dimension de la matrice : celles des filtres, sinon toutes celles de l'API"""
+    param, endpoint, response_key = COUNT_MATRIX_DIMENSIONS[dimension]
+    selected = filters.get(param)
+    if selected and "ALL" not in selected:
+        return list(selected)
+    return fetch(endpoint, {} if endpoint == "/sources" else None).get(response_key, [])
+
+def display_count_matrix(filters, estimation_params, cost_center=None):
+    """Matrice des volumes d'avis marque × pays (ou source) : un compteur /metrics par cellule, calculés
+    en parallèle et mis en cache individuellement, affichés en carte de chaleur"""
+    dimension = st.radio("Dimension", list(COUNT_MATRIX_DIMENSIONS), horizontal=True, key="count_matrix_dimension")
+    param = COUNT_MATRIX_DIMENSIONS[dimension][0]
+    values = get_count_matrix_values(filters, dimension)
+    cells = {
+        (brand, value): QuerySpec.from_params("/metrics", {**estimation_params, "brand": brand, param: value})
+        for brand in filters["brand"] for value in values
+    }
+    if not cells:
+        st.info(f"Aucune valeur disponible pour la dimension « {dimension} »")
+        return
+    if len(cells) > MAX_COUNT_MATRIX_CELLS:
+        st.warning(f"⚠️ {len(cells):,} cellules : restreignez les marques ou les valeurs « {dimension} » dans la sidebar ({MAX_COUNT_MATRIX_CELLS:,} au plus)")
+        return
+    
+    matrix_key = tuple(cells.values())
+    st.caption(f"{len(filters['brand'])} marque(s) × {len(values)} valeur(s) : {len(cells)} cellules, un appel /metrics par cellule absente du cache")
+    if st.button("🧮 Calculer la matrice", key="compute_count_matrix"):
+        start = time.perf_counter()
+        progress_bar = st.progress(0.0)
+        counts = fetch_counts_concurrently(
+            cells.values(), cost_center=cost_center, by_month=False,
+            on_progress=lambda done, total: progress_bar.progress(done / total, text=f"{done}/{total} cellules")
+        )
+        progress_bar.empty()
+        matrix = pd.DataFrame([
+            {"brand": brand, "value": value, "reviews": counts[spec]}
+            for (brand, value), spec in cells.items()
+        ])
+        st.session_state.count_matrix = {"key": matrix_key, "df": matrix, "elapsed": time.perf_counter() - start}
+    
+    count_matrix = st.session_state.get("count_matrix")
+    if not count_matrix or count_matrix["key"] != matrix_key:
+        return
+    matrix = count_matrix["df"]
+    st.caption(f"Matrice calculée en {count_matrix['elapsed']:.1f} s")
+    errors_count = int(matrix["reviews"].isna().sum())
+    if errors_count:
+        st.warning(f"⚠️ {errors_count} cellule(s) en erreur, laissées vides")
+    
+    alt = _altair()
+    base = alt.Chart(matrix.dropna(subset=["reviews"])).encode(
+        x=alt.X("value:N", title=dimension),
+        y=alt.Y("brand:N", title="Marque")
+    )
+    heatmap = base.mark_rect().encode(
+        color=alt.Color("reviews:Q", title="Reviews", scale=alt.Scale(scheme="blues")),
+        tooltip=[alt.Tooltip("brand:N", title="Marque"), alt.Tooltip("value:N", title=dimension), alt.Tooltip("reviews:Q", title="Reviews", format=",")]
+    )
+    labels = base.mark_text(fontSize=10).encode(text=alt.Text("reviews:Q", format=","))
+    st.altair_chart(heatmap + labels if len(matrix) <= 400 else heatmap, use_container_width=True)
+    
+    table = matrix.pivot_table(index="brand", columns="value", values="reviews", aggfunc="sum")
+    table["Total"] = table.sum(axis=1)
+    st.dataframe(table, use_container_width=True)
 
-def execute_bulk_export(params, is_preview):
-    """Exécute l'export en masse"""
+def execute_bulk_export(params, is_preview, cost_center=None):
+    """Exécute l'export en masse (pages récupérées avec les tokens du centre de coûts `cost_center`)"""
     st.markdown("### 🔄 Export en cours...")
     
     # Obtenir les métriques totales
@@ -1819,43 +2382,46 @@ def execute_bulk_export(params, is_preview):
     status_text = st.empty()
     progress_bar = None if is_preview else st.progress(0)
     
-    cursor_mark = "*"
     page_count = 0
     all_docs = []
+    # Export complet déjà récupéré par une session précédente : servi depuis l'entrepôt local
+    warehouse_docs = None if is_preview else load_from_warehouse(params, total_api_results)
+    writer = None if is_preview or warehouse_docs is not None else open_warehouse_writer(params)
+    
+    # Aucun appel API pour un export servi par l'entrepôt : pas de mesure de débit ni de relevé de quota
+    telemetry = None if is_preview or warehouse_docs is not None else ExportTelemetry(
+        "BULK_BY_BRAND", params, get_quota_used_before_export(cost_center))
+    fetch_page = partial(fetch_reviews_page, cost_center=cost_center)
+    fetch_page = telemetry.timed_fetch(fetch_page) if telemetry else fetch_page
     
     # ✅ CORRECTION 1: Augmenter la limite de sécurité
     max_iterations = 1000 if not is_preview else 1  # Limite plus élevée pour les gros exports
+    if warehouse_docs is not None:
+        all_docs = warehouse_docs
+        progress_bar.progress(1.0)
+        max_iterations = 0
     
     # Boucle de récupération
     try:
-        while page_count < max_iterations:
-            page_count += 1
-            
-            # ✅ CORRECTION 2: Affichage plus détaillé du progrès
-            current_count = len(all_docs)
-            status_text.text(f"📥 Page {page_count} | Récupéré: {current_count:,}/{total_api_results:,} reviews...")
-            
-            # Paramètres avec cursor
-            current_params = params.copy()
-            current_params["cursorMark"] = cursor_mark
-            
-            # ✅ CORRECTION 3: Debug de la requête
-            if page_count <= 3:  # Log des premières pages pour debug
-                st.write(f"🔍 Debug page {page_count}: cursor={cursor_mark[:20]}...")
-            
-            # Appel API
-            result = fetch("/reviews", current_params)
-            
+        for page_count, docs, result in paginate_export_reviews(fetch_page, params, max_iterations):
             if not result:
                 st.error(f"❌ Erreur API à la page {page_count}")
                 break
                 
-            if not result.get("docs"):
+            if not docs:
                 st.warning(f"⚠️ Pas de données à la page {page_count}")
                 break
             
-            docs = result.get("docs", [])
             all_docs.extend(docs)
+            add_warehouse_page(writer, docs)
+            
+            # ✅ CORRECTION 2: Affichage plus détaillé du progrès
+            status_text.text(f"📥 Page {page_count} | Récupéré: {len(all_docs):,}/{total_api_results:,} reviews...")
+            
+            # ✅ CORRECTION 3: Debug du cursor des premières pages
+            if page_count <= 3:
+                next_cursor = result.get("nextCursorMark")
+                st.write(f"🔍 Debug page {page_count}: cursor suivant={next_cursor[:20] if next_cursor else 'None'}...")
             
             # ✅ CORRECTION 4: Vérification de progression réelle
             st.write(f"📊 Page {page_count}: +{len(docs)} reviews (Total: {len(all_docs)})")
@@ -1869,45 +2435,25 @@ def execute_bulk_export(params, is_preview):
             if is_preview:
                 break
             
-            # ✅ CORRECTION 5: Gestion améliorée du cursor
-            next_cursor = result.get("nextCursorMark")
-            
-            # Debug du cursor
-            if page_count <= 3:
-                st.write(f"🔍 Cursor actuel: {cursor_mark[:20]}...")
-                st.write(f"🔍 Cursor suivant: {next_cursor[:20] if next_cursor else 'None'}...")
-            
-            # Conditions d'arrêt
-            if not next_cursor:
-                st.info(f"🏁 Fin de pagination: pas de cursor suivant")
-                break
-                
-            if next_cursor == cursor_mark:
-                st.info(f"🏁 Fin de pagination: cursor identique")
-                break
-            
             # ✅ CORRECTION 6: Vérification si on a tout récupéré
             if len(all_docs) >= total_api_results:
                 st.info(f"🏁 Toutes les reviews récupérées ({len(all_docs)})")
                 break
-            
-            cursor_mark = next_cursor
-            
-            # Limite aperçu
-            if is_preview and len(all_docs) >= 100:
-                break
-                
-            # ✅ CORRECTION 7: Pause entre requêtes pour éviter les limites
-            if page_count % 10 == 0:  # Pause toutes les 10 pages
-                time.sleep(0.1)
+        else:
+            # ✅ CORRECTION 5: Fin de pagination (curseur absent ou identique, ou limite de pages) ;
+            # rien à signaler pour un export servi par l'entrepôt local, aucune page n'a été demandée
+            if page_count:
+                st.info(f"🏁 Fin de pagination après {page_count} pages")
                 
     except Exception as e:
         st.error(f"❌ Erreur lors de l'export : {str(e)}")
         st.write(f"🔍 Debug: Page {page_count}, Reviews récupérées: {len(all_docs)}")
         return
     
+    complete_warehouse_run(writer, total_api_results)
+    
     # Stocker les résultats
-    st.session_state.all_docs = all_docs
+    set_session_list("all_docs", all_docs, items_mutable=False)
     st.session_state.current_page = 1
     
     # Messages finaux
@@ -1924,7 +2470,8 @@ def execute_bulk_export(params, is_preview):
         
         # Log pour export complet
         if not is_preview:
-            log_bulk_export(params, len(all_docs))
+            log_bulk_export(params, len(all_docs), cost_center)
+            defer_export_telemetry(telemetry, len(all_docs), cost_center)
             
     else:
         status_text.text(f"⚠️ Aucune review récupérée.")
@@ -1966,10 +2513,10 @@ def diagnostic_pagination(params):
         
         st.write("---")
 
-def log_bulk_export(params, nb_reviews):
+def log_bulk_export(params, nb_reviews, cost_center=None):
     """Enregistre l'export en masse dans le log"""
     try:
-        log_path = Path("review_exports_log.csv")
+        log_path = get_export_log_path()
         export_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         log_entry = {
@@ -1982,7 +2529,8 @@ def log_bulk_export(params, nb_reviews):
             "random_seed": params.get("random", None),
             "nb_reviews": nb_reviews,
             "export_timestamp": export_date,
-            "export_type": "BULK_BY_BRAND"
+            "export_type": "BULK_BY_BRAND",
+            "cost_center": cost_center
         }
         
         new_log_df = pd.DataFrame([log_entry])
@@ -1999,6 +2547,190 @@ def log_bulk_export(params, nb_reviews):
     except Exception as e:
         st.warning(f"⚠️ Erreur lors de l'enregistrement du log : {str(e)}")
 
+def get_export_log_path():
+    """Journal des exports, dans le dossier des données locales"""
+    return data_path(EXPORT_LOG_FILE_NAME)
+
+@st.cache_resource
+def get_review_warehouse():
+    """Entrepôt local des reviews partagé par toutes les sessions (PF_WAREHOUSE_PATH, sinon dossier de données)"""
+    return ReviewWarehouse(os.environ.get("PF_WAREHOUSE_PATH"))
+
+def load_from_warehouse(params, expected_total):
+    """Reviews d'un export complet identique déjà enregistré, si son volume correspond toujours à /metrics"""
+    if st.session_state.get("bypass_warehouse"):
+        return None
+    try:
+        warehouse = get_review_warehouse()
+        coverage = warehouse.get_coverage(params)
+        if coverage is None or coverage["total"] != expected_total:
+            return None
+        docs = warehouse.load_docs(params)
+    except sqlite3.Error as e:
+        st.warning(f"⚠️ Entrepôt local indisponible : {str(e)}")
+        return None
+    completed_at = datetime.datetime.fromtimestamp(coverage["completed_at"]).strftime("%d/%m/%Y %H:%M")
+    st.success(f"📦 {len(docs):,} reviews servies depuis l'entrepôt local (récupérées le {completed_at}), sans appel à /reviews")
+    return docs
+
+def open_warehouse_writer(params):
+    """Prépare l'enregistrement des pages d'un export complet dans l'entrepôt local"""
+    try:
+        return get_review_warehouse().writer(params)
+    except sqlite3.Error as e:
+        st.warning(f"⚠️ Entrepôt local indisponible : {str(e)}")
+        return None
+
+def add_warehouse_page(writer, docs):
+    """Ajoute une page à l'entrepôt local ; une erreur d'écriture n'interrompt pas l'export"""
+    if writer is None:
+        return
+    try:
+        writer.add_page(docs)
+    except sqlite3.Error as e:
+        st.warning(f"⚠️ Écriture dans l'entrepôt local impossible : {str(e)}")
+
+def complete_warehouse_run(writer, expected_total):
+    """Valide la couverture du contexte si toutes les reviews attendues ont été récupérées"""
+    if writer is None:
+        return
+    try:
+        if writer.position == expected_total:
+            writer.complete()
+        else:
+            writer.abort()
+    except sqlite3.Error as e:
+        st.warning(f"⚠️ Écriture dans l'entrepôt local impossible : {str(e)}")
+
+@st.cache_resource
+def get_quota_snapshots():
+    """Derniers relevés du quota consommé par centre de coûts, partagés par les sessions : {centre: (volume, instant)}"""
+    return {}, threading.Lock()
+
+def read_quota_used(cost_center=None):
+    """Relève le quota consommé d'un centre de coûts (une lecture de /quotas par token du centre) et le mémorise"""
+    used = fetch_quota_used(cost_center)
+    snapshots, lock = get_quota_snapshots()
+    with lock:
+        if used is None:
+            snapshots.pop(cost_center, None)
+        else:
+            snapshots[cost_center] = (used, time.monotonic())
+    return used
+
+def get_quota_used_before_export(cost_center=None):
+    """Relevé de départ d'un export : le dernier relevé du centre de coûts s'il est récent (en général celui de
+    la fin de l'export précédent), sinon une nouvelle lecture ; un export ne relit donc /quotas qu'une fois"""
+    snapshots, lock = get_quota_snapshots()
+    with lock:
+        snapshot = snapshots.get(cost_center)
+    if snapshot is not None and time.monotonic() - snapshot[1] < QUOTA_SNAPSHOT_MAX_AGE:
+        return snapshot[0]
+    return read_quota_used(cost_center)
+
+def fetch_quota_used(cost_center=None):
+    """Volume de quota consommé par les tokens du pool (d'un centre de coûts), lu sans cache (None si indisponible)"""
+    used = 0
+    for token in get_token_pool().candidates(cost_center):
+        try:
+            quotas = get_result("/quotas", {}, BASE_URL, token.token)
+        except Exception:
+            return None
+        volume = parse_quota_volume(quotas.get("used volume")) if isinstance(quotas, dict) else None
+        if volume is None:
+            return None
+        used += volume
+    return used
+
+def defer_export_telemetry(telemetry, nb_reviews, cost_center=None):
+    """Garde les mesures de l'export jusqu'à la normalisation et au format à plat des résultats
+    (display_reviews_results), qui sont mesurés comme étapes de l'export avant l'enregistrement"""
+    if telemetry is None:
+        return
+    previous = st.session_state.pop("pending_export_telemetry", None)
+    if previous is not None:
+        log_export_telemetry(*previous)
+    st.session_state.pending_export_telemetry = (telemetry, nb_reviews, cost_center)
+
+def export_stage(telemetry, name):
+    """Mesure une étape de traitement de l'export en attente d'enregistrement (sans effet sinon)"""
+    return telemetry.stage(name) if telemetry is not None else nullcontext()
+
+def log_export_telemetry(telemetry, nb_reviews, cost_center=None):
+    """Enregistre les mesures de performance d'un export à côté du journal des exports"""
+    if telemetry is None:
+        return
+    try:
+        row = telemetry.finish(nb_reviews, read_quota_used(cost_center))
+        save_export_telemetry(row)
+        quota_text = ""
+        if row["quota_used_before"] is not None and row["quota_used_after"] is not None:
+            # Différence des volumes /quotas : inclut les exports concurrents sur les mêmes tokens
+            quota_text = f", ~{row['quota_used_after'] - row['quota_used_before']:,} d'après /quotas (approximatif)"
+        st.caption(f"⏱️ {row['pages']} pages en {row['wall_s']:.1f} s ({row['reviews_per_s'] or 0:,.0f} reviews/s, "
+                   f"{row['bytes'] / 1e6:.1f} Mo reçus, {row['api_requests']:,} appels API, "
+                   f"{row['quota_consumed']:,} reviews de quota consommé{quota_text}) · "
+                   f"récupération {row['fetch_s']:.1f} s dont décodage {row['decode_s']:.1f} s, "
+                   f"normalisation {row['normalize_s']:.1f} s, format à plat {row['flatten_s']:.1f} s")
+    except Exception as e:
+        st.warning(f"⚠️ Erreur lors de l'enregistrement de la télémétrie : {str(e)}")
+
+def display_export_telemetry_trends():
+    """Tendances de performance des exports : débit par marque et selon la taille de la période"""
+    with st.expander("📈 Performance des exports", expanded=False):
+        try:
+            df = load_export_telemetry()
+        except Exception as e:
+            st.error(f"Erreur lors de la lecture de la télémétrie: {e}")
+            return
+        if df.empty:
+            st.info("📁 Aucune télémétrie d'export enregistrée pour le moment.")
+            return
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Exports mesurés", len(df))
+        with col2:
+            st.metric("Débit médian (reviews/s)", f"{df['reviews_per_s'].median():,.0f}")
+        with col3:
+            st.metric("Quota consommé", f"{df['quota_consumed'].sum():,.0f}",
+                      help="Reviews renvoyées par les pages des exports (l'API décompte le quota par review renvoyée)")
+        
+        alt = _altair()
+        
+        tooltip = ["export_timestamp", "brand", "nb_reviews", "date_range_days", "reviews_per_s", "pages", "wall_s"]
+        throughput_chart = alt.Chart(df).mark_line(point=True).encode(
+            x=alt.X("export_timestamp:T", title="Date de l'export"),
+            y=alt.Y("reviews_per_s:Q", title="Reviews / s"),
+            color=alt.Color("brand:N", title="Marque"),
+            tooltip=tooltip
+        ).properties(title="Débit par marque dans le temps")
+        st.altair_chart(throughput_chart, use_container_width=True)
+        
+        range_chart = alt.Chart(df).mark_circle().encode(
+            x=alt.X("date_range_days:Q", title="Période exportée (jours)"),
+            y=alt.Y("reviews_per_s:Q", title="Reviews / s"),
+            size=alt.Size("nb_reviews:Q", title="Reviews"),
+            color=alt.Color("brand:N", title="Marque"),
+            tooltip=tooltip
+        ).properties(title="Débit selon la taille de la période")
+        st.altair_chart(range_chart, use_container_width=True)
+        
+        summary = df.groupby("brand").agg(
+            exports=("nb_reviews", "size"),
+            reviews=("nb_reviews", "sum"),
+            debit_median=("reviews_per_s", "median"),
+            secondes_par_page=("fetch_s", "sum"),
+            pages=("pages", "sum"),
+            quota=("quota_consumed", "sum")
+        )
+        summary["secondes_par_page"] = (summary["secondes_par_page"] / summary["pages"]).round(3)
+        st.dataframe(summary.rename(columns={
+            "exports": "Exports", "reviews": "Reviews", "debit_median": "Débit médian (reviews/s)",
+            "secondes_par_page": "Fetch moyen par page (s)", "pages": "Pages", "quota": "Quota consommé"
+        }), use_container_width=True)
+        st.dataframe(df.sort_values("export_timestamp", ascending=False).head(50), hide_index=True, use_container_width=True)
+
 def display_export_interface():
     """Affiche l'interface d'export selon la stratégie choisie"""
     if not st.session_state.get("export_strategy"):
@@ -2007,6 +2739,9 @@ def display_export_interface():
     
     strategy = st.session_state.export_strategy
     
+    st.checkbox("♻️ Forcer la récupération depuis l'API (ignorer l'entrepôt local)", key="bypass_warehouse",
+                help="Par défaut, un export complet identique à un export déjà réalisé est servi depuis l'entrepôt local")
+    
     if "🚀 Export en masse" in strategy:
         # Export en masse direct
         st.markdown("---")
@@ -2025,6 +2760,8 @@ def display_export_interface():
         if st.session_state.get("product_list_loaded"):
             st.markdown("---")
             display_reviews_export_interface(st.session_state.filters, selected_products)
+    
+    display_export_telemetry_trends()
 
 def display_reviews_results():
     """Affiche les résultats des reviews récupérées"""
@@ -2059,8 +2796,7 @@ def display_reviews_results():
         - **Page actuelle** : `{current_page}` / `{total_pages}`
         """)
         
-        df = pd.json_normalize(page_docs)
-        df = df.applymap(lambda x: str(x) if isinstance(x, (dict, list)) else x)
+        df = normalize_reviews(page_docs)
         st.dataframe(df)
         
         # Pagination avec gestion d'état par callbacks pour éviter les experimental_rerun
@@ -2095,10 +2831,8 @@ def display_reviews_results():
         
         # Export de la page actuelle
         all_csv = df.to_csv(index=False)
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-        excel_data = excel_buffer.getvalue()
+        # Fichiers Excel générés au clic seulement (openpyxl et l'encodage ne ralentissent plus chaque rerun)
+        excel_data = partial(dataframe_to_excel_bytes, df)
         
         st.success(f"**Téléchargement prêt !** {len(page_docs)} résultats affichés.")
         col1, col2, col3 = st.columns(3)
@@ -2127,14 +2861,13 @@ def display_reviews_results():
         # Afficher le nom du fichier pour transparence
         st.markdown(f"**Nom de fichier généré :** `{full_csv_filename}`")
         
-        full_df = pd.json_normalize(st.session_state.all_docs)
-        full_df = full_df.applymap(lambda x: str(x) if isinstance(x, (dict, list)) else x)
+        # Export complet qui vient de se terminer : normalisation et format à plat mesurés comme étapes de l'export
+        pending_telemetry = st.session_state.get("pending_export_telemetry")
+        telemetry = pending_telemetry[0] if pending_telemetry else None
+        with export_stage(telemetry, "normalize"):
+            full_df = normalize_reviews(st.session_state.all_docs)
         all_csv_full = full_df.to_csv(index=False, encoding="utf-8-sig")
-        
-        excel_buffer_full = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer_full, engine='openpyxl') as writer:
-            full_df.to_excel(writer, index=False)
-        excel_data_full = excel_buffer_full.getvalue()
+        excel_data_full = partial(dataframe_to_excel_bytes, full_df)
         
         colf1, colf2, colf3 = st.columns(3)
         with colf1:
@@ -2143,12 +2876,137 @@ def display_reviews_results():
             st.download_button("📄 Télécharger les reviews en Excel", excel_data_full, file_name=full_excel_filename, mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
         with colf3:
             try:
-                df_flat_full = postprocess_reviews(full_df.copy())
+                with export_stage(telemetry, "flatten"):
+                    df_flat_full = postprocess_reviews(full_df.copy())
                 flat_csv_full = df_flat_full.to_csv(index=False, sep=';', encoding='utf-8-sig')
                 flat_full_filename = generate_export_filename(export_params, mode="preview" if st.session_state.is_preview_mode else "complete", extension="plat.csv")
                 st.download_button("📃 Télécharger le format à plat", flat_csv_full, file_name=flat_full_filename, mime="text/csv")
             except Exception as e:
                 st.warning(f"Erreur format plat : {e}")
+        
+        if pending_telemetry:
+            del st.session_state.pending_export_telemetry
+            log_export_telemetry(*pending_telemetry)
+        
+        display_results_charts()
+        display_sql_analytics()
+
+def get_analytics_engine():
+    """Moteur d'analyse SQL des reviews de la session, reconstruit seulement quand les résultats changent"""
+    docs = st.session_state.all_docs
+    key = (id(docs), len(docs))
+    cached = st.session_state.get("analytics_engine_cache")
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+    if cached:
+        cached[1].close()
+    start = time.perf_counter()
+    engine = AnalyticsEngine(build_review_tables(docs))
+    build_ms = (time.perf_counter() - start) * 1000
+    st.session_state.analytics_engine_cache = (key, engine, build_ms)
+    return engine, build_ms
+
+def get_results_chart_data():
+    """Agrégats des graphiques (mois, notes, polarité), calculés côté serveur une fois par jeu de résultats"""
+    docs = st.session_state.all_docs
+    key = (id(docs), len(docs))
+    cached = st.session_state.get("results_chart_cache")
+    if cached and cached[0] == key:
+        return cached[1]
+    engine, _ = get_analytics_engine()
+    chart_data = {name: engine.query(sql)[0] for name, sql in CHART_QUERIES.items()}
+    st.session_state.results_chart_cache = (key, chart_data)
+    return chart_data
+
+def display_results_charts():
+    """Graphiques des résultats à partir d'agrégats : la taille des données envoyées ne dépend pas du nombre de reviews"""
+    st.markdown("---")
+    st.subheader("📊 Graphiques des résultats")
+    if not st.toggle("Afficher les graphiques", value=True, key="results_charts_enabled"):
+        return
+    
+    alt = _altair()
+    
+    try:
+        chart_data = get_results_chart_data()
+    except Exception as e:
+        st.error(f"❌ Graphiques indisponibles : {str(e)}")
+        return
+    
+    volume = chart_data["volume_by_month"]
+    if not volume.empty:
+        volume_chart = alt.Chart(volume).mark_bar().encode(
+            x=alt.X("yearmonth(month):T", title="Mois"),
+            y=alt.Y("sum(reviews):Q", title="Reviews"),
+            color=alt.Color("brand:N", title="Marque"),
+            tooltip=[alt.Tooltip("yearmonth(month):T", title="Mois"), alt.Tooltip("brand:N", title="Marque"), alt.Tooltip("reviews:Q", title="Reviews")]
+        ).properties(title="Volume de reviews par mois", height=280)
+        st.altair_chart(volume_chart, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        ratings = chart_data["rating_distribution"]
+        if not ratings.empty:
+            rating_chart = alt.Chart(ratings).mark_bar().encode(
+                x=alt.X("rating:O", title="Note"),
+                y=alt.Y("sum(reviews):Q", title="Reviews"),
+                color=alt.Color("brand:N", title="Marque"),
+                tooltip=[alt.Tooltip("brand:N", title="Marque"), alt.Tooltip("rating:O", title="Note"), alt.Tooltip("reviews:Q", title="Reviews")]
+            ).properties(title="Distribution des notes", height=280)
+            st.altair_chart(rating_chart, use_container_width=True)
+    with col2:
+        polarity = chart_data["polarity_by_brand"]
+        if polarity.empty:
+            st.info("Aucun attribut prédéfini n'est cité dans ces reviews : pas de graphique de polarité")
+            return
+        brands = sorted(polarity["brand"].dropna().unique())
+        if len(brands) > 1:
+            selected_brand = st.selectbox("Marque", brands, key="polarity_chart_brand")
+            polarity = polarity[polarity["brand"] == selected_brand]
+        if not polarity.empty:
+            polarity_chart = alt.Chart(polarity).mark_bar().encode(
+                x=alt.X("sum(reviews):Q", stack="normalize", title="Part des mentions"),
+                y=alt.Y("attribute:N", title="Attribut"),
+                color=alt.Color("polarity:N", title="Polarité", scale=alt.Scale(
+                    domain=["positive", "neutre", "negative"], range=["#2ca02c", "#bdbdbd", "#d62728"])),
+                tooltip=[alt.Tooltip("brand:N", title="Marque"), alt.Tooltip("attribute:N", title="Attribut"),
+                         alt.Tooltip("polarity:N", title="Polarité"), alt.Tooltip("reviews:Q", title="Mentions")]
+            ).properties(title="Polarité des attributs", height=280)
+            st.altair_chart(polarity_chart, use_container_width=True)
+
+def display_sql_analytics():
+    """Pane d'analyse SQL sur les reviews récupérées (requêtes prêtes à l'emploi ou libres, sans appel API)"""
+    st.markdown("---")
+    st.subheader("🧮 Analyse SQL des résultats")
+    if not st.toggle("Activer l'analyse SQL (aucun appel API)", key="sql_analytics_enabled"):
+        st.caption("Agrégations par marque, mois, attribut ou Sampling directement sur les reviews récupérées.")
+        return
+    
+    engine, build_ms = get_analytics_engine()
+    st.caption(f"Moteur {engine.backend} : tables `reviews` ({engine.row_counts['reviews']:,} lignes) et "
+               f"`review_attributes` ({engine.row_counts['review_attributes']:,} lignes), préparées en {build_ms:.0f} ms")
+    if engine.backend != "duckdb":
+        st.warning("⚠️ DuckDB n'est pas installé : analyse en mode dégradé sur SQLite (stockage en lignes, plus lent "
+                   "sur de gros exports). Installez les dépendances de l'application (`pip install -r requirements.txt`).")
+    
+    query_name = st.selectbox("Requête prête à l'emploi", list(PREBUILT_QUERIES) + ["Requête libre"], key="sql_prebuilt_query")
+    default_sql = PREBUILT_QUERIES.get(query_name, "SELECT *\nFROM reviews\nLIMIT 100").strip()
+    sql = st.text_area("Requête SQL", value=default_sql, height=180, key=f"sql_text_{query_name}")
+    
+    with st.expander("📚 Colonnes disponibles", expanded=False):
+        for table, columns in engine.describe().items():
+            st.markdown(f"**{table}** : " + ", ".join(f"`{column}`" for column in columns))
+    
+    try:
+        result_df, elapsed_ms = engine.query(sql)
+    except Exception as e:
+        st.error(f"❌ Erreur SQL : {str(e)}")
+        return
+    
+    st.caption(f"{len(result_df):,} lignes en {elapsed_ms:.1f} ms")
+    st.dataframe(result_df, hide_index=True, use_container_width=True)
+    st.download_button("📂 Télécharger le résultat en CSV", result_df.to_csv(index=False, encoding="utf-8-sig"),
+                       file_name="analyse_sql.csv", mime="text/csv")
 
 def display_export_configuration():
     """Affiche la configuration d'export réutilisable"""
@@ -2157,7 +3015,7 @@ def display_export_configuration():
         st.markdown("### 📋 Configuration réutilisable")
         st.markdown("Vous pouvez copier ce bloc et le coller dans la barre de configuration pour relancer cet export plus tard.")
         
-        export_token = st.secrets["api"]["token"] if "api" in st.secrets else "YOUR_TOKEN"
+        export_token = get_token_pool().choose(st.session_state.get("export_cost_center")).token if "api" in st.secrets else "YOUR_TOKEN"
         export_preset = {
             "start-date": str(st.session_state.filters["start_date"]),
             "end-date": str(st.session_state.filters["end_date"]),
@@ -2186,11 +3044,22 @@ def display_export_configuration():
 def main():
     """Fonction principale de l'application"""
     st.title("🔍 Explorateur API Ratings & Reviews")
+    # Bandeau du mode dégradé, rempli en fin de rerun selon les données périmées servies
+    degraded_banner = st.empty()
+    st.session_state.stale_data = {}
+    
+    ensure_metrics_exporter()
+    
+    # Préchargement parallèle des appels de la sidebar et des quotas (en arrière-plan)
+    start_reference_warmup()
     
     # Affichage des quotas en header
     with st.expander("📊 Quotas API", expanded=False):
         display_quotas()
     
+    if is_debug_mode():
+        display_metrics_panel()
+    
     # Sidebar avec filtres
     display_sidebar_filters()
     
@@ -2202,6 +3071,9 @@ def main():
         # Affichage des produits par marque (optionnel)
         display_products_by_brand()
         
+        # Tendances mensuelles par marque / produit
+        display_trend_dashboard()
+        
         # Interface d'export selon la stratégie
         display_export_interface()
         
@@ -2227,6 +3099,19 @@ def main():
         
         💡 **Astuce** : Vous pouvez charger une configuration existante en collant un JSON dans la zone de configuration.
         """)
+    
+    display_degraded_mode_banner(degraded_banner)
 
 if __name__ == "__main__":
-    main()
+    try:
+        # Valeurs de la session épinglées en mémoire pendant le rerun (modifiées en place par le script)
+        with get_memory_governor().script_run(get_session_id()):
+            if is_profiling_enabled():
+                profile_functions(globals())
+                run_profiled(main, session_id=get_session_id(), capture=st.session_state.pop("profile_capture_armed", None))
+                display_profiling_panel()
+            else:
+                main()
+    finally:
+        # Déchargement sur disque des résultats au-delà des seuils, y compris après st.rerun() / st.stop()
+        get_memory_governor().enforce()
@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pf_api_explorer.instrumentation import get_registry
+
+
+class CatalogEntry:
+    """Liste de produits d'une marque pour un contexte de filtres, avec sa date de chargement"""
+
+    __slots__ = ("products", "loaded_at", "last_error")
+
+    def __init__(self, products, loaded_at):
+        self.products = products
+        self.loaded_at = loaded_at
+        self.last_error = None
+
+
+class CatalogStore:
+    """Catalogue produits partagé entre sessions, indexé par (marque, contexte de filtres).
+
+    - une entrée plus récente que `ttl` est servie telle quelle ;
+    - entre `ttl` et `ttl + stale_ttl`, elle est servie immédiatement (périmée) et
+      rechargée en arrière-plan (stale-while-revalidate) ;
+    - au-delà, ou si elle est absente, elle est chargée de façon synchrone.
+
+    Les chargements concurrents d'une même clé sont fusionnés : une marque n'est
+    donc demandée à l'API qu'une fois par TTL, toutes sessions confondues. `ttl` peut
+    être une fonction du contexte (None : pas d'expiration).
+    """
+
+    def __init__(self, loader, ttl=3600, stale_ttl=86400, max_entries=5000, max_workers=4, clock=time.monotonic):
+        self._loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="catalog-refresh")
+
+    def get(self, brand, context):
+        """Retourne la liste des produits de `brand` pour le contexte (QuerySpec sans marque)"""
+        key = (brand, context)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry.loaded_at
+                ttl = self._ttl(context)
+                if age < ttl:
+                    get_registry().record_cache("catalog_store", context.endpoint, "hit")
+                    return entry.products
+                if age < ttl + self.stale_ttl:
+                    if key not in self._inflight:
+                        # Rechargement enregistré sous le même verrou que le test : une seule requête par clé
+                        future = Future()
+                        self._inflight[key] = future
+                        self._executor.submit(self._refresh_in_background, key, brand, context, future)
+                    get_registry().record_cache("catalog_store", context.endpoint, "stale")
+                    return entry.products
+        get_registry().record_cache("catalog_store", context.endpoint, "miss")
+        return self._load(key, brand, context)
+
+    def _ttl(self, context):
+        ttl = self.ttl(context) if callable(self.ttl) else self.ttl
+        return math.inf if ttl is None else ttl
+
+    def peek(self, brand, context):
+        """Retourne la liste en cache (même périmée) sans appel API, ou None"""
+        with self._lock:
+            entry = self._entries.get((brand, context))
+            return entry.products if entry is not None else None
+
+    def invalidate(self, brand=None):
+        """Supprime les entrées d'une marque (ou toutes) pour forcer un rechargement"""
+        with self._lock:
+            if brand is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == brand]:
+                    del self._entries[key]
+
+    def stats(self):
+        """Retourne le nombre d'entrées fraîches, périmées et en cours de chargement"""
+        now = self._clock()
+        with self._lock:
+            fresh = sum(1 for (_, context), entry in self._entries.items() if now - entry.loaded_at < self._ttl(context))
+            return {"entries": len(self._entries), "fresh": fresh, "stale": len(self._entries) - fresh, "inflight": len(self._inflight)}
+
+    def _load(self, key, brand, context):
+        """Charge une entrée ; les appels simultanés sur la même clé attendent le premier"""
+        with self._lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+        if not is_owner:
+            return future.result()
+        return self._run_loader(key, brand, context, future)
+
+    def _run_loader(self, key, brand, context, future):
+        """Exécute le chargement d'une clé déjà enregistrée dans `_inflight` et publie son résultat"""
+        try:
+            products = list(self._loader(brand, context))
+        except BaseException as e:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.last_error = e
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = CatalogEntry(products, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(products)
+        return products
+
+    def _refresh_in_background(self, key, brand, context, future):
+        try:
+            self._run_loader(key, brand, context, future)
+        except Exception:
+            # L'entrée périmée reste servie ; l'erreur est conservée dans `last_error`
+            pass
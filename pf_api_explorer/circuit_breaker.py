@@ -0,0 +1,101 @@
+"""Disjoncteur des appels API et dernières valeurs connues servies pendant une panne.
+
+Après `failure_threshold` échecs consécutifs (erreurs serveur, délais dépassés, connexion refusée),
+le disjoncteur s'ouvre : les appels échouent immédiatement au lieu d'attendre l'API. Après
+`reset_timeout` secondes, un seul appel d'essai est autorisé ; s'il réussit, le disjoncteur se
+referme, sinon il reste ouvert pour une nouvelle période.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+LAST_GOOD_MAX_ENTRIES = 10_000
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Disjoncteur à trois états (fermé, ouvert, demi-ouvert), partagé par les threads du processus"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_count = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Indique si un appel peut partir ; en demi-ouverture, seul l'appel d'essai est autorisé"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    self.opened_count += 1
+                self.state = OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def retry_in(self):
+        """Secondes avant le prochain appel d'essai (0 si le disjoncteur est fermé)"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def snapshot(self):
+        return {"state": self.state, "failures": self.failures, "opened_count": self.opened_count, "retry_in": self.retry_in()}
+
+
+class LastGoodCache:
+    """Dernière réponse correcte de chaque requête (clé : QuerySpec), avec sa date, pour le mode dégradé"""
+
+    def __init__(self, max_entries=LAST_GOOD_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Retourne (valeur, date de la réponse) ou None"""
+        with self._lock:
+            return self._entries.get(key)
+
+
+_breaker = CircuitBreaker()
+
+
+def get_circuit_breaker():
+    """Disjoncteur des appels API du processus"""
+    return _breaker
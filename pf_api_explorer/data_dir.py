@@ -0,0 +1,26 @@
+"""Dossier des données locales de l'application : entrepôt des reviews, journal et télémétrie des exports.
+
+Par défaut, ces fichiers sont écrits hors de l'arborescence des sources, dans le dossier de données de
+l'utilisateur (`$XDG_DATA_HOME/pf_api_explorer`, sinon `~/.local/share/pf_api_explorer`). La variable
+d'environnement PF_DATA_DIR permet de choisir un autre dossier (par exemple un volume partagé).
+"""
+import os
+from pathlib import Path
+
+APP_DIR_NAME = "pf_api_explorer"
+
+
+def get_data_dir():
+    """Dossier des données locales (PF_DATA_DIR, sinon le dossier de données de l'utilisateur), créé si besoin"""
+    configured = os.environ.get("PF_DATA_DIR")
+    if configured:
+        data_dir = Path(configured).expanduser()
+    else:
+        data_dir = Path(os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share") / APP_DIR_NAME
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+def data_path(name):
+    """Chemin d'un fichier du dossier des données locales"""
+    return get_data_dir() / name
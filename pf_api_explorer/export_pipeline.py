@@ -0,0 +1,205 @@
+import ast
+import io
+import queue
+import threading
+
+import pandas as pd
+
+# Attributs produits retenus dans le format à plat (une colonne attribute_<nom> chacun)
+PREDEFINED_ATTRIBUTES = [
+    'Composition', 'Efficiency', 'Packaging', 'Price',
+    'Quality', 'Safety', 'Scent', 'Taste', 'Texture'
+]
+
+
+def paginate_reviews(fetch_page, params, max_pages, cursor_mark="*"):
+    """Parcourt /reviews par curseur et produit (numéro de page, docs, résultat brut) page par page.
+
+    `fetch_page(params)` retourne le champ `result` d'un appel /reviews ({} en cas d'erreur).
+    Le parcours s'arrête sur une page vide, un curseur absent ou inchangé, ou après `max_pages` pages ;
+    l'appelant peut aussi interrompre l'itération à tout moment."""
+    page_count = 0
+    while page_count < max_pages:
+        page_count += 1
+        current_params = params.copy()
+        current_params["cursorMark"] = cursor_mark
+        result = fetch_page(current_params)
+        docs = result.get("docs", []) if result else []
+        yield page_count, docs, result
+        if not docs:
+            return
+        next_cursor = result.get("nextCursorMark")
+        if not next_cursor or next_cursor == cursor_mark:
+            return
+        cursor_mark = next_cursor
+
+
+def paginate_reviews_concurrently(fetch_page, params_list, max_pages, executor):
+    """Parcourt en parallèle (dans `executor`) la pagination par curseur de plusieurs sous-requêtes /reviews
+    et produit (numéro de page, docs inédits, résultat brut) au fil des pages reçues.
+
+    Les reviews déjà produites par une autre sous-requête (même `id`) sont écartées, et les pages sans
+    review inédite ne sont pas produites, sauf une page en erreur (résultat vide) qui est transmise à
+    l'appelant. Si l'appelant interrompt l'itération, les sous-requêtes s'arrêtent après leur page en cours."""
+    pages = queue.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def run(params):
+        try:
+            for _, docs, result in paginate_reviews(fetch_page, params, max_pages):
+                if stop.is_set():
+                    return
+                pages.put((docs, result))
+        except Exception as e:
+            pages.put(e)
+        finally:
+            pages.put(finished)
+
+    for params in params_list:
+        executor.submit(run, params)
+    running = len(params_list)
+    seen_ids = set()
+    page_count = 0
+    try:
+        while running:
+            item = pages.get()
+            if item is finished:
+                running -= 1
+                continue
+            if isinstance(item, Exception):
+                raise item
+            docs, result = item
+            new_docs = []
+            for doc in docs:
+                doc_id = doc.get("id")
+                if doc_id is None or doc_id not in seen_ids:
+                    seen_ids.add(doc_id)
+                    new_docs.append(doc)
+            if new_docs or not result:
+                page_count += 1
+                yield page_count, new_docs, result
+    finally:
+        stop.set()
+
+
+def normalize_reviews(docs):
+    """Aplatit les reviews JSON en DataFrame ; les listes et dicts imbriqués sont convertis en texte"""
+    df = pd.json_normalize(docs)
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].map(lambda x: str(x) if isinstance(x, (dict, list)) else x)
+    return df
+
+
+def dataframe_to_excel_bytes(df):
+    """Encode un DataFrame en fichier Excel (.xlsx) en mémoire"""
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False)
+    return excel_buffer.getvalue()
+
+
+def postprocess_reviews(df):
+    """Fonction de postprocessing des reviews"""
+    if df.empty:
+        return df
+        
+    df.rename(columns={
+        'id': 'guid',
+        'category': 'categories',
+        'content trad': 'verbatim_content',
+        'product': 'product_name_SEMANTIWEB'
+    }, inplace=True)
+    
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        df['date'] = df['date'].dt.strftime('01/%m/%Y')
+
+    if 'business indicator' in df.columns:
+        df['Sampling'] = df['business indicator'].apply(lambda x: 1 if 'Sampling Rate' in str(x) else 0)
+    
+    df = df.drop(columns=['content origin'], errors='ignore')
+
+    predefined_attributes = PREDEFINED_ATTRIBUTES
+    attribute_columns = {attr: f"attribute_{attr}" for attr in predefined_attributes}
+    for col_name in attribute_columns.values():
+        df[col_name] = '0'
+
+    pos_attributes_by_row = {}
+    neg_attributes_by_row = {}
+    all_attributes_by_row = {}
+
+    for idx, row in df.iterrows():
+        pos_attrs_set = set()
+        neg_attrs_set = set()
+        all_attrs_set = set()
+        
+        if pd.notna(row.get('attributes')):
+            try:
+                all_attrs = ast.literal_eval(row['attributes'])
+                all_attrs_set = {attr for attr in all_attrs if attr in predefined_attributes}
+            except (ValueError, SyntaxError):
+                pass
+                
+        if pd.notna(row.get('attributes positive')):
+            try:
+                pos_attrs = ast.literal_eval(row['attributes positive'])
+                pos_attrs_set = {attr for attr in pos_attrs if attr in predefined_attributes}
+            except (ValueError, SyntaxError):
+                pass
+                
+        if pd.notna(row.get('attributes negative')):
+            try:
+                neg_attrs = ast.literal_eval(row['attributes negative'])
+                neg_attrs_set = {attr for attr in neg_attrs if attr in predefined_attributes}
+            except (ValueError, SyntaxError):
+                pass
+                
+        pos_attributes_by_row[idx] = pos_attrs_set
+        neg_attributes_by_row[idx] = neg_attrs_set
+        all_attributes_by_row[idx] = all_attrs_set
+
+    for idx in all_attributes_by_row:
+        all_attrs = all_attributes_by_row[idx]
+        pos_attrs = pos_attributes_by_row[idx]
+        neg_attrs = neg_attributes_by_row[idx]
+        neutral_attrs = pos_attrs.intersection(neg_attrs)
+        only_pos_attrs = pos_attrs - neutral_attrs
+        only_neg_attrs = neg_attrs - neutral_attrs
+        implicit_neutral_attrs = all_attrs - pos_attrs - neg_attrs
+        
+        for attr in neutral_attrs:
+            df.at[idx, attribute_columns[attr]] = 'neutre'
+        for attr in only_pos_attrs:
+            df.at[idx, attribute_columns[attr]] = 'positive'
+        for attr in only_neg_attrs:
+            df.at[idx, attribute_columns[attr]] = 'negative'
+        for attr in implicit_neutral_attrs:
+            df.at[idx, attribute_columns[attr]] = 'neutre'
+
+    original_columns = [col for col in df.columns if col not in ['attributes', 'attributes positive', 'attributes negative']]
+    original_columns = [col for col in original_columns if not col.startswith('attribute_')]
+
+    df['safety'] = '0'
+    for idx in all_attributes_by_row:
+        pos_attrs = pos_attributes_by_row[idx]
+        neg_attrs = neg_attributes_by_row[idx]
+        all_attrs = all_attributes_by_row[idx]
+        safety_attrs = {'Safety', 'Composition'}
+        safety_neutral = any(attr in (all_attrs - pos_attrs - neg_attrs) for attr in safety_attrs)
+        safety_positive = any(attr in pos_attrs for attr in safety_attrs)
+        safety_negative = any(attr in neg_attrs for attr in safety_attrs)
+        
+        if safety_positive and safety_negative:
+            df.at[idx, 'safety'] = 'neutre'
+        elif safety_positive:
+            df.at[idx, 'safety'] = 'positive'
+        elif safety_negative:
+            df.at[idx, 'safety'] = 'negative'
+        elif safety_neutral:
+            df.at[idx, 'safety'] = 'neutre'
+
+    final_columns = original_columns + list(attribute_columns.values()) + ['safety']
+    available_columns = [col for col in final_columns if col in df.columns]
+    return df[available_columns]
@@ -0,0 +1,148 @@
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from pf_api_explorer.data_dir import data_path
+from pf_api_explorer.instrumentation import track_calls
+from pf_api_explorer.query_spec import QuerySpec
+
+TELEMETRY_FILE_NAME = "review_exports_telemetry.csv"
+TELEMETRY_COLUMNS = [
+    "export_timestamp", "export_type", "brand", "product_count", "start_date", "end_date", "date_range_days",
+    "nb_reviews", "pages", "rows_per_page", "avg_rows_per_page", "api_requests", "bytes", "errors", "retries",
+    "wall_s", "fetch_s", "decode_s", "normalize_s", "flatten_s", "process_s", "reviews_per_s",
+    "quota_used_before", "quota_used_after", "quota_consumed"
+]
+# Étapes mesurées hors récupération : décodage JSON des réponses (compris dans « fetch »), normalisation
+# en DataFrame et format à plat des résultats
+STAGES = ["decode", "normalize", "flatten"]
+
+
+class ExportTelemetry:
+    """Mesures d'un export : pages, volumes, durées par étape, appels API et quota consommé
+
+    Le quota consommé est le nombre de reviews renvoyées par les pages de cet export (l'API décompte
+    le quota par review renvoyée) : il reste exact quand d'autres exports ou sessions utilisent les
+    mêmes tokens en parallèle. Les volumes `/quotas` lus avant et après l'export sont conservés à titre
+    indicatif ; leur différence inclut la consommation concurrente et n'est qu'une approximation.
+
+    L'étape « fetch » est la durée écoulée entre la première requête de page et la dernière réponse :
+    les sous-requêtes parallèles ne sont pas additionnées, elle ne dépasse donc jamais la durée totale.
+    « process » est le reste de la durée totale, hors normalisation et format à plat."""
+
+    def __init__(self, export_type, params, quota_used_before=None):
+        self.export_type = export_type
+        self.params = dict(params)
+        self.quota_used_before = quota_used_before
+        self.pages = 0
+        self.rows = 0
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.api_requests = 0
+        self.bytes = 0
+        self.errors = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._first_request = None
+        self._last_response = None
+
+    @property
+    def fetch_seconds(self):
+        """Durée écoulée entre la première requête de page et la dernière réponse"""
+        if self._first_request is None:
+            return 0.0
+        return self._last_response - self._first_request
+
+    def timed_fetch(self, fetch_page):
+        """Enveloppe la fonction de récupération d'une page pour mesurer l'étape « fetch » (appelable depuis
+        plusieurs threads : seules la première requête et la dernière réponse comptent)"""
+        def fetch(page_params):
+            start = time.perf_counter()
+            with track_calls() as calls:
+                result = fetch_page(page_params)
+            end = time.perf_counter()
+            with self._lock:
+                self._first_request = start if self._first_request is None else min(self._first_request, start)
+                self._last_response = end if self._last_response is None else max(self._last_response, end)
+                self.stage_seconds["decode"] += calls.decode
+                self.api_requests += calls.requests
+                self.bytes += calls.bytes
+                self.errors += calls.errors
+                self.retries += calls.retries
+                self.pages += 1
+                self.rows += len(result.get("docs", [])) if result else 0
+            return result
+        return fetch
+
+    @contextmanager
+    def stage(self, name):
+        """Mesure une étape de traitement des résultats (« normalize », « flatten »)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stage_seconds[name] += time.perf_counter() - start
+
+    def finish(self, nb_reviews, quota_used_after=None):
+        """Clôt la mesure et retourne la ligne de télémétrie de l'export"""
+        wall = time.perf_counter() - self._started
+        fetch_seconds = self.fetch_seconds
+        processing = self.stage_seconds["normalize"] + self.stage_seconds["flatten"]
+        spec = QuerySpec.from_params("/reviews", self.params)
+        start_date, end_date = spec.start_date, spec.end_date
+        products = [p for p in str(self.params.get("product", "")).split(",") if p.strip()]
+        return {
+            "export_timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "export_type": self.export_type,
+            "brand": self.params.get("brand", ""),
+            "product_count": len(products),
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None,
+            "date_range_days": (end_date - start_date).days + 1 if start_date and end_date else None,
+            "nb_reviews": nb_reviews,
+            "pages": self.pages,
+            "rows_per_page": self.params.get("rows"),
+            "avg_rows_per_page": round(self.rows / self.pages, 1) if self.pages else None,
+            "api_requests": self.api_requests,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "retries": self.retries,
+            "wall_s": round(wall, 3),
+            "fetch_s": round(fetch_seconds, 3),
+            "decode_s": round(self.stage_seconds["decode"], 3),
+            "normalize_s": round(self.stage_seconds["normalize"], 3),
+            "flatten_s": round(self.stage_seconds["flatten"], 3),
+            "process_s": round(max(wall - fetch_seconds - processing, 0.0), 3),
+            "reviews_per_s": round(nb_reviews / wall, 1) if wall > 0 else None,
+            "quota_used_before": self.quota_used_before,
+            "quota_used_after": quota_used_after,
+            "quota_consumed": self.rows
+        }
+
+
+def save_export_telemetry(row, log_path=None):
+    """Ajoute la télémétrie d'un export au fichier CSV du dossier de données (créé avec son en-tête si besoin)"""
+    log_path = Path(log_path) if log_path else data_path(TELEMETRY_FILE_NAME)
+    row_df = pd.DataFrame([row], columns=TELEMETRY_COLUMNS)
+    if log_path.exists() and pd.read_csv(log_path, nrows=0).columns.tolist() != TELEMETRY_COLUMNS:
+        # Fichier écrit par une version précédente : réécrit avec les colonnes actuelles
+        previous = pd.read_csv(log_path).reindex(columns=TELEMETRY_COLUMNS)
+        pd.concat([previous, row_df], ignore_index=True).to_csv(log_path, index=False)
+        return
+    row_df.to_csv(log_path, mode="a", header=not log_path.exists(), index=False)
+
+
+def load_export_telemetry(log_path=None):
+    """Charge l'historique de télémétrie des exports (DataFrame vide si absent)"""
+    log_path = Path(log_path) if log_path else data_path(TELEMETRY_FILE_NAME)
+    if not log_path.exists():
+        return pd.DataFrame(columns=TELEMETRY_COLUMNS)
+    df = pd.read_csv(log_path)
+    df["export_timestamp"] = pd.to_datetime(df["export_timestamp"], errors="coerce")
+    df["brand"] = df["brand"].fillna("").astype(str).replace("", "Toutes marques")
+    return df
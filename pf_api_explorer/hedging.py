@@ -0,0 +1,160 @@
+"""Requêtes de couverture (« hedged requests ») pour réduire la latence de queue des lectures idempotentes.
+
+Si un appel n'a pas répondu au bout d'un seuil adaptatif (percentile des latences récentes de
+l'endpoint), un doublon est lancé et la première réponse correcte est retenue. Le nombre de doublons
+est plafonné par un budget proportionnel au nombre d'appels. Le mode est optionnel (PF_HEDGING=1,
+ou interrupteur du panneau de métriques).
+
+Chaque tentative s'exécute dans son propre thread, démarré immédiatement : aucune file d'attente
+commune ne limite les appels du serveur ni n'allonge les latences mesurées, qui partent du démarrage
+effectif de la tentative. Les requêtes simultanées restent bornées par le contrôleur de débit de chaque token.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from pf_api_explorer.instrumentation import get_registry, percentile
+
+HEDGED_ENDPOINTS = ("/metrics", "/products")
+# Percentile des latences récentes au-delà duquel un doublon est lancé
+HEDGE_PERCENTILE = 95
+# Seuil utilisé tant que l'endpoint a moins de MIN_SAMPLES latences mesurées, et seuil minimal (secondes)
+MIN_SAMPLES = 20
+DEFAULT_DELAY = 1.0
+MIN_DELAY = 0.02
+# Budget : au plus un doublon pour 10 appels, avec une réserve de 10 doublons
+BUDGET_RATIO = 0.1
+BUDGET_BURST = 10.0
+THRESHOLD_REFRESH = 1.0
+RECENT_CALLS = 2000
+
+
+class HedgingPolicy:
+    """Décide et exécute les doublons ; mesure la latence observée et celle de l'appel initial seul"""
+
+    def __init__(self, enabled=False, endpoints=HEDGED_ENDPOINTS, hedge_percentile=HEDGE_PERCENTILE,
+                 budget_ratio=BUDGET_RATIO, budget_burst=BUDGET_BURST):
+        self.enabled = enabled
+        self.endpoints = set(endpoints)
+        self.hedge_percentile = hedge_percentile
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self._credits = budget_burst
+        self._thresholds = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def applies(self, endpoint):
+        return self.enabled and endpoint in self.endpoints
+
+    def threshold(self, endpoint):
+        """Délai avant doublon : percentile des latences récentes de l'endpoint, recalculé au plus chaque seconde"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._thresholds.get(endpoint)
+            if cached and now - cached[1] < THRESHOLD_REFRESH:
+                return cached[0]
+        registry = get_registry()
+        summary = next((row for row in registry.endpoint_summary() if row["endpoint"] == endpoint), None)
+        if summary is None or summary["requests"] < MIN_SAMPLES:
+            delay = DEFAULT_DELAY
+        else:
+            delay = max(MIN_DELAY, registry.latency_percentile(endpoint, self.hedge_percentile))
+        with self._lock:
+            self._thresholds[endpoint] = (delay, now)
+        return delay
+
+    def _take_budget(self):
+        with self._lock:
+            if self._credits >= 1:
+                self._credits -= 1
+                return True
+            return False
+
+    def _endpoint_stats(self, endpoint):
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = {"calls": 0, "hedged": 0, "hedge_wins": 0, "observed": deque(maxlen=RECENT_CALLS), "primary": deque(maxlen=RECENT_CALLS)}
+        return stats
+
+    @staticmethod
+    def _start(func):
+        """Lance `func` dans un nouveau thread ; retourne son Future, dont `started_at` est l'heure de démarrage"""
+        future = Future()
+        future.started_at = time.perf_counter()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+        threading.Thread(target=run, name="hedged-call", daemon=True).start()
+        return future
+
+    def call(self, endpoint, func):
+        """Exécute `func` (appel idempotent complet) avec un doublon éventuel ; retourne la première réponse correcte"""
+        with self._lock:
+            self._credits = min(self.budget_burst, self._credits + self.budget_ratio)
+            self._endpoint_stats(endpoint)["calls"] += 1
+        primary = self._start(func)
+        start = primary.started_at
+
+        def record_primary(future):
+            with self._lock:
+                self._endpoint_stats(endpoint)["primary"].append(time.perf_counter() - start)
+        primary.add_done_callback(record_primary)
+
+        delay = self.threshold(endpoint) - (time.perf_counter() - start)
+        done, _ = wait([primary], timeout=max(0.0, delay))
+        attempts = [primary]
+        if not done and self._take_budget():
+            attempts.append(self._start(func))
+            with self._lock:
+                self._endpoint_stats(endpoint)["hedged"] += 1
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                with self._lock:
+                    stats = self._endpoint_stats(endpoint)
+                    stats["observed"].append(time.perf_counter() - start)
+                    stats["hedge_wins"] += future is not primary
+                return future.result()
+        raise error
+
+    def summary(self):
+        """Par endpoint : appels, doublons lancés et gagnants, latences p50 / p95 / p99 (ms) avec et sans doublon"""
+        rows = []
+        with self._lock:
+            for endpoint, stats in sorted(self._stats.items()):
+                observed = sorted(stats["observed"])
+                primary = sorted(stats["primary"])
+                row = {"endpoint": endpoint, "calls": stats["calls"], "hedged": stats["hedged"], "hedge_wins": stats["hedge_wins"]}
+                for q in (50, 95, 99):
+                    for name, values in (("observed", observed), ("primary", primary)):
+                        value = percentile(values, q)
+                        row[f"{name}_p{q}_ms"] = round(value * 1000, 1) if value is not None else None
+                rows.append(row)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._thresholds.clear()
+            self._credits = self.budget_burst
+
+
+_policy = HedgingPolicy(enabled=os.environ.get("PF_HEDGING") == "1")
+
+
+def get_hedging_policy():
+    """Politique de doublons du processus"""
+    return _policy
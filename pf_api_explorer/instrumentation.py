@@ -0,0 +1,268 @@
+"""Mesures des appels API et des caches, agrégées au niveau du processus serveur.
+
+Les compteurs sont exposés au format texte Prometheus, soit via un petit serveur HTTP
+(variable d'environnement PF_METRICS_PORT), soit via un fichier lu par le textfile collector
+de node_exporter (PF_METRICS_FILE).
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes de latence (secondes), au format des buckets Prometheus
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Nombre de latences récentes conservées par endpoint pour le calcul des percentiles
+RECENT_SAMPLES = 2000
+METRICS_FILE_INTERVAL = 10
+
+_call_scope = threading.local()
+
+
+def percentile(sorted_values, q):
+    """Percentile `q` (0-100) d'une liste triée, par interpolation du rang le plus proche"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[rank]
+
+
+class EndpointStats:
+    """Compteurs d'un endpoint : requêtes, erreurs, octets et distribution des latences"""
+
+    __slots__ = ("requests", "errors", "retries", "statuses", "bytes", "latency_sum", "buckets", "recent")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses = {}
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+
+class CallTracker:
+    """Appels API effectués par le thread courant pendant un bloc `with track_calls()`"""
+
+    __slots__ = ("requests", "errors", "retries", "bytes", "latency", "decode")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency = 0.0
+        self.decode = 0.0
+
+
+@contextmanager
+def track_calls():
+    """Compte les appels API du thread courant (les appels servis par un cache ne sont pas comptés)"""
+    tracker = CallTracker()
+    previous = getattr(_call_scope, "tracker", None)
+    _call_scope.tracker = tracker
+    try:
+        yield tracker
+    finally:
+        _call_scope.tracker = previous
+
+
+class MetricsRegistry:
+    """Registre thread-safe des mesures d'appels API et de lookups de cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._caches = {}
+        self._last_file_write = 0.0
+
+    def record_request(self, endpoint, status, latency, response_bytes=0):
+        """Enregistre un appel ; `status` vaut None en cas d'échec de connexion"""
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            status_label = str(status) if status is not None else "connection_error"
+            stats.statuses[status_label] = stats.statuses.get(status_label, 0) + 1
+            if status != 200:
+                stats.errors += 1
+            stats.bytes += response_bytes
+            stats.latency_sum += latency
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            stats.recent.append(latency)
+        tracker = getattr(_call_scope, "tracker", None)
+        if tracker is not None:
+            tracker.requests += 1
+            tracker.errors += status != 200
+            tracker.bytes += response_bytes
+            tracker.latency += latency
+        self._maybe_write_file()
+
+    def record_retry(self, endpoint):
+        """Enregistre une nouvelle tentative d'appel après un échec"""
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.retries += 1
+        tracker = getattr(_call_scope, "tracker", None)
+        if tracker is not None:
+            tracker.retries += 1
+
+    def record_decode(self, seconds):
+        """Enregistre la durée de décodage JSON d'une réponse (suivie seulement par `track_calls`)"""
+        tracker = getattr(_call_scope, "tracker", None)
+        if tracker is not None:
+            tracker.decode += seconds
+
+    def record_cache(self, cache, endpoint, outcome):
+        """Enregistre un lookup de cache ; `outcome` vaut "hit", "miss" ou "stale" """
+        with self._lock:
+            counters = self._caches.setdefault((cache, endpoint), {"hit": 0, "miss": 0, "stale": 0})
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+    def endpoint_summary(self):
+        """Résumé par endpoint : requêtes, erreurs, octets et percentiles de latence (ms)"""
+        with self._lock:
+            snapshot = {name: (stats.requests, stats.errors, stats.retries, stats.bytes, sorted(stats.recent)) for name, stats in self._endpoints.items()}
+        rows = []
+        for name, (requests_count, errors, retries, response_bytes, latencies) in sorted(snapshot.items()):
+            rows.append({
+                "endpoint": name,
+                "requests": requests_count,
+                "errors": errors,
+                "retries": retries,
+                "bytes": response_bytes,
+                "p50_ms": _to_ms(percentile(latencies, 50)),
+                "p95_ms": _to_ms(percentile(latencies, 95)),
+                "p99_ms": _to_ms(percentile(latencies, 99))
+            })
+        return rows
+
+    def cache_summary(self):
+        """Résumé par cache et endpoint : hits, misses, entrées périmées servies et taux de hit"""
+        with self._lock:
+            snapshot = {key: dict(counters) for key, counters in self._caches.items()}
+        rows = []
+        for (cache, endpoint), counters in sorted(snapshot.items()):
+            total = sum(counters.values())
+            served = counters.get("hit", 0) + counters.get("stale", 0)
+            rows.append({"cache": cache, "endpoint": endpoint, **counters, "hit_ratio": served / total if total else None})
+        return rows
+
+    def latency_percentile(self, endpoint, q):
+        """Percentile `q` des latences récentes d'un endpoint (secondes), ou None"""
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            latencies = sorted(stats.recent) if stats else []
+        return percentile(latencies, q)
+
+    def render_prometheus(self):
+        """Exporte les mesures au format texte Prometheus"""
+        lines = [
+            "# HELP pf_api_requests_total Appels à l'API Ratings & Reviews par endpoint et statut.",
+            "# TYPE pf_api_requests_total counter"
+        ]
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            caches = sorted((key, dict(counters)) for key, counters in self._caches.items())
+            for name, stats in endpoints:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'pf_api_requests_total{{endpoint="{name}",status="{status}"}} {count}')
+            lines += [
+                "# HELP pf_api_retries_total Nouvelles tentatives d'appel après un échec, par endpoint.",
+                "# TYPE pf_api_retries_total counter"
+            ]
+            for name, stats in endpoints:
+                lines.append(f'pf_api_retries_total{{endpoint="{name}"}} {stats.retries}')
+            lines += [
+                "# HELP pf_api_response_bytes_total Octets reçus de l'API par endpoint.",
+                "# TYPE pf_api_response_bytes_total counter"
+            ]
+            for name, stats in endpoints:
+                lines.append(f'pf_api_response_bytes_total{{endpoint="{name}"}} {stats.bytes}')
+            lines += [
+                "# HELP pf_api_request_duration_seconds Latence des appels à l'API par endpoint.",
+                "# TYPE pf_api_request_duration_seconds histogram"
+            ]
+            for name, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'pf_api_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'pf_api_request_duration_seconds_bucket{{endpoint="{name}",le="+Inf"}} {stats.requests}')
+                lines.append(f'pf_api_request_duration_seconds_sum{{endpoint="{name}"}} {stats.latency_sum:.6f}')
+                lines.append(f'pf_api_request_duration_seconds_count{{endpoint="{name}"}} {stats.requests}')
+        lines += [
+            "# HELP pf_cache_lookups_total Lookups de cache par cache, endpoint et résultat.",
+            "# TYPE pf_cache_lookups_total counter"
+        ]
+        for (cache, endpoint), counters in caches:
+            for outcome, count in sorted(counters.items()):
+                lines.append(f'pf_cache_lookups_total{{cache="{cache}",endpoint="{endpoint}",outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def _maybe_write_file(self):
+        """Écrit le fichier Prometheus (PF_METRICS_FILE) au plus toutes les METRICS_FILE_INTERVAL secondes"""
+        path = os.environ.get("PF_METRICS_FILE")
+        if not path:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_file_write < METRICS_FILE_INTERVAL:
+                return
+            self._last_file_write = now
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(temp_path, path)  # Écriture atomique pour le collecteur
+        except OSError:
+            pass
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._caches.clear()
+
+
+def _to_ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """Registre de mesures du processus"""
+    return _registry
+
+
+def start_metrics_server(port, host="0.0.0.0", registry=None):
+    """Sert les mesures au format Prometheus sur http://host:port/metrics (thread démon)"""
+    registry = registry or _registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server
@@ -0,0 +1,298 @@
+import gzip
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import MutableSequence
+from contextlib import contextmanager
+from pathlib import Path
+
+# Nombre d'éléments échantillonnés pour estimer la taille mémoire d'une liste
+SIZE_SAMPLE = 32
+
+
+def deep_sizeof(obj, _depth=0):
+    """Taille mémoire approximative d'un objet JSON (dicts, listes, chaînes, nombres)"""
+    size = sys.getsizeof(obj)
+    if _depth > 6:
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, _depth + 1) + deep_sizeof(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_sizeof(item, _depth + 1) for item in obj)
+    return size
+
+
+def estimate_items_size(items):
+    """Estime la taille mémoire d'une liste à partir d'un échantillon régulier de ses éléments"""
+    count = len(items)
+    if count == 0:
+        return sys.getsizeof(items)
+    step = max(1, count // SIZE_SAMPLE)
+    sample = items[::step][:SIZE_SAMPLE]
+    return sys.getsizeof(items) + int(sum(deep_sizeof(item) for item in sample) / len(sample) * count)
+
+
+class SpillableList(MutableSequence):
+    """Liste dont le contenu peut être déchargé sur disque (pickle compressé) puis rechargé à l'accès.
+
+    `len()` et la taille estimée restent disponibles sans rechargement. Si `items_mutable` est faux,
+    les éléments ne sont jamais modifiés en place : un contenu rechargé et inchangé est alors déchargé
+    sans réécriture du fichier."""
+
+    def __init__(self, items=(), spill_dir=None, items_mutable=True):
+        self._items = list(items)
+        self._length = len(self._items)
+        self._size = estimate_items_size(self._items)
+        self._spill_dir = Path(spill_dir or tempfile.gettempdir())
+        self._path = None
+        self._file_valid = False
+        self._items_mutable = items_mutable
+        self._lock = threading.RLock()
+        self.last_access = time.monotonic()
+        self._finalizer = None
+
+    # --- état ---
+    @property
+    def is_spilled(self):
+        return self._items is None
+
+    @property
+    def approx_bytes(self):
+        """Taille estimée du contenu une fois en mémoire"""
+        return self._size
+
+    @property
+    def resident_bytes(self):
+        return 0 if self._items is None else self._size
+
+    # --- déchargement / rechargement ---
+    def spill(self):
+        """Écrit le contenu sur disque (si nécessaire) et libère la mémoire ; retourne les octets libérés"""
+        with self._lock:
+            if self._items is None:
+                return 0
+            if not self._file_valid or self._items_mutable:
+                if self._path is None:
+                    self._spill_dir.mkdir(parents=True, exist_ok=True)
+                    self._path = self._spill_dir / f"spill_{uuid.uuid4().hex}.pkl.gz"
+                    self._finalizer = weakref.finalize(self, _remove_file, self._path)
+                temp_path = self._path.with_suffix(".tmp")
+                with gzip.open(temp_path, "wb", compresslevel=1) as f:
+                    pickle.dump(self._items, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(temp_path, self._path)
+                self._file_valid = True
+            freed = self._size
+            self._items = None
+            return freed
+
+    def _load(self):
+        with self._lock:
+            self.last_access = time.monotonic()
+            if self._items is None:
+                with gzip.open(self._path, "rb") as f:
+                    self._items = pickle.load(f)
+            return self._items
+
+    def _modified(self):
+        self._file_valid = False
+        self._length = len(self._items)
+
+    # --- interface MutableSequence ---
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __setitem__(self, index, value):
+        with self._lock:
+            self._load()[index] = value
+            self._modified()
+
+    def __delitem__(self, index):
+        with self._lock:
+            del self._load()[index]
+            self._modified()
+            self._size = estimate_items_size(self._items)
+
+    def insert(self, index, value):
+        with self._lock:
+            self._load().insert(index, value)
+            self._modified()
+            self._size += deep_sizeof(value)
+
+    def extend(self, values):
+        values = list(values)
+        with self._lock:
+            self._load().extend(values)
+            self._modified()
+            if values:
+                self._size += estimate_items_size(values) - sys.getsizeof(values)
+
+    def __iter__(self):
+        # L'itérateur garde une référence à la liste : un déchargement concurrent ne l'interrompt pas
+        return iter(self._load())
+
+    def to_list(self):
+        """Copie en mémoire du contenu"""
+        return list(self._load())
+
+    def __repr__(self):
+        state = "sur disque" if self.is_spilled else "en mémoire"
+        return f"SpillableList({self._length} éléments, ~{self._size / 1e6:.1f} Mo, {state})"
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class MemoryGovernor:
+    """Suit la taille des résultats volumineux de chaque session et les décharge sur disque :
+
+    - une session dont les résultats en mémoire dépassent `session_threshold` voit ses plus gros
+      résultats déchargés à la fin de chaque rerun ;
+    - les résultats d'une session inactive depuis `idle_seconds` sont déchargés ;
+    - tant que le total en mémoire (toutes sessions) dépasse `global_budget`, les résultats des
+      sessions les moins récemment actives sont déchargés en premier.
+
+    Les valeurs d'une session ne sont jamais déchargées pendant l'un de ses reruns (`script_run`) :
+    le script peut modifier en place les éléments obtenus en les parcourant, et une modification faite
+    après l'écriture du fichier serait perdue au rechargement.
+
+    Les valeurs sont suivies par référence faible : une session fermée libère ses fichiers. Seules les
+    listes créées par `create` sont suivies : les caches dérivés, reconstruits à la demande (tableaux
+    et index de produits, moteur d'analyse SQL, tendances, matrice des volumes), ne sont pas comptés."""
+
+    def __init__(self, session_threshold, global_budget, idle_seconds, spill_dir, clock=time.monotonic):
+        self.session_threshold = session_threshold
+        self.global_budget = global_budget
+        self.idle_seconds = idle_seconds
+        self.spill_dir = Path(spill_dir)
+        self._clock = clock
+        self._sessions = {}
+        self._last_seen = {}
+        self._active_runs = {}
+        self._lock = threading.Lock()
+
+    def create(self, session_id, key, items=(), items_mutable=True):
+        """Crée une SpillableList pour la clé `key` de la session et la place sous contrôle"""
+        value = SpillableList(items, spill_dir=self.spill_dir / (session_id or "local"), items_mutable=items_mutable)
+        with self._lock:
+            self._sessions.setdefault(session_id, {})[key] = weakref.ref(value)
+        return value
+
+    def touch(self, session_id):
+        """Signale une activité de la session (début de rerun)"""
+        with self._lock:
+            self._last_seen[session_id] = self._clock()
+
+    @contextmanager
+    def script_run(self, session_id):
+        """Rerun en cours de la session : activité signalée au début et à la fin, valeurs épinglées en mémoire"""
+        with self._lock:
+            self._active_runs[session_id] = self._active_runs.get(session_id, 0) + 1
+            self._last_seen[session_id] = self._clock()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_runs[session_id] -= 1
+                if not self._active_runs[session_id]:
+                    del self._active_runs[session_id]
+                self._last_seen[session_id] = self._clock()
+
+    def _live_values(self):
+        """Valeurs encore référencées : [(session_id, key, valeur)] ; purge les sessions fermées"""
+        live = []
+        with self._lock:
+            for session_id in list(self._sessions):
+                values = self._sessions[session_id]
+                for key in list(values):
+                    value = values[key]()
+                    if value is None:
+                        del values[key]
+                    else:
+                        live.append((session_id, key, value))
+                if not values:
+                    del self._sessions[session_id]
+                    self._last_seen.pop(session_id, None)
+        return live
+
+    def enforce(self):
+        """Applique les seuils par session, l'inactivité et le budget global aux sessions sans rerun en cours ;
+        retourne les octets libérés"""
+        now = self._clock()
+        live = self._live_values()
+        with self._lock:
+            pinned = set(self._active_runs)
+        freed = 0
+
+        by_session = {}
+        for session_id, key, value in live:
+            if session_id not in pinned:
+                by_session.setdefault(session_id, []).append(value)
+
+        for session_id, values in by_session.items():
+            idle = now - self._last_seen.get(session_id, now) > self.idle_seconds
+            resident = sum(value.resident_bytes for value in values)
+            for value in sorted(values, key=lambda v: v.resident_bytes, reverse=True):
+                if not idle and resident <= self.session_threshold:
+                    break
+                if value.is_spilled:
+                    continue
+                released = value.spill()
+                resident -= released
+                freed += released
+
+        total = sum(value.resident_bytes for _, _, value in live)
+        if total > self.global_budget:
+            by_age = sorted(live, key=lambda item: (self._last_seen.get(item[0], 0), -item[2].resident_bytes))
+            for session_id, _, value in by_age:
+                if total <= self.global_budget:
+                    break
+                if value.is_spilled or session_id in pinned:
+                    continue
+                released = value.spill()
+                total -= released
+                freed += released
+        return freed
+
+    def start_periodic_enforcement(self, interval=60):
+        """Applique aussi les règles à intervalle régulier (sessions inactives sans autre activité sur le serveur)"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.enforce()
+                except Exception:
+                    pass
+        threading.Thread(target=run, name="memory-governor", daemon=True).start()
+
+    def stats(self):
+        """Octets en mémoire et sur disque, nombre de sessions et de valeurs suivies"""
+        live = self._live_values()
+        return {
+            "sessions": len({session_id for session_id, _, _ in live}),
+            "values": len(live),
+            "resident_bytes": sum(value.resident_bytes for _, _, value in live),
+            "spilled_values": sum(1 for _, _, value in live if value.is_spilled),
+            "spilled_bytes": sum(value.approx_bytes for _, _, value in live if value.is_spilled)
+        }
+
+    def session_stats(self, session_id):
+        """Taille estimée de chaque valeur suivie d'une session"""
+        return {
+            key: {"items": len(value), "bytes": value.approx_bytes, "spilled": value.is_spilled}
+            for sid, key, value in self._live_values() if sid == session_id
+        }
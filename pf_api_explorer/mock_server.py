@@ -0,0 +1,539 @@
+"""Serveur local simulant l'API Ratings & Reviews, pour le développement hors ligne et les tests de charge.
+
+Les données sont synthétiques et déterministes (même seed = mêmes avis) ; elles sont générées
+à la volée, ce qui permet de simuler des corpus de plusieurs millions d'avis sans les stocker.
+
+Lancement :
+
+    python -m pf_api_explorer.mock_server --port 8600 --reviews 100000 --latency-ms 40
+
+puis, pour y brancher l'application :
+
+    PF_API_BASE_URL=http://127.0.0.1:8600 streamlit run pf_api_explorer/app.py
+"""
+import argparse
+import base64
+import bisect
+import datetime
+import json
+import math
+import random
+import threading
+import time
+import urllib.parse
+from array import array
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREDEFINED_ATTRIBUTES = [
+    'Composition', 'Efficiency', 'Packaging', 'Price',
+    'Quality', 'Safety', 'Scent', 'Taste', 'Texture'
+]
+
+CATEGORIES = {
+    "bodycare": ["body creams & milks", "shower gels", "deodorants"],
+    "facecare": ["moisturizers", "serums", "cleansers", "sun care"],
+    "make up": ["mascara", "lipsticks", "foundations"],
+    "haircare": ["shampoos", "conditioners"]
+}
+
+BRAND_STEMS = [
+    "AVÈNE", "BIODERMA", "La Roche-Posay", "Vichy", "Nuxe", "Caudalie", "Uriage", "aderma",
+    "arthrodont", "Ducray", "Klorane", "SVR", "Filorga", "Embryolisse", "Mustela", "Noreva"
+]
+
+PRODUCT_WORDS = [
+    "crème", "sérum", "gel", "lait", "baume", "eau", "huile", "fluide", "masque", "mousse",
+    "hydratante", "apaisante", "nettoyante", "réparatrice", "matifiante", "nutritive", "spf50", "teintée"
+]
+
+COUNTRIES = ["France", "Germany", "Spain", "Italy", "United Kingdom", "Belgium"]
+SOURCES_BY_COUNTRY = {
+    country: [f"{country.lower().replace(' ', '')}-{site}" for site in ("amazon", "pharmacie", "marketplace", "brandsite")]
+    for country in COUNTRIES
+}
+MARKETS = ["Mass market", "Pharmacy", "Selective"]
+
+
+def _mix(value):
+    """Hash entier 64 bits rapide et déterministe (splitmix64)"""
+    value = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return value ^ (value >> 31)
+
+
+@dataclass
+class MockConfig:
+    """Paramètres du corpus synthétique et du comportement réseau simulé"""
+
+    reviews: int = 100_000
+    brands: int = 40
+    products_per_brand: int = 50
+    start_date: datetime.date = datetime.date(2022, 1, 1)
+    end_date: datetime.date = field(default_factory=datetime.date.today)
+    seed: int = 42
+    latency_ms: float = 0.0
+    slow_rate: float = 0.0
+    slow_ms: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    quota: int = 10_000_000
+    token: str = None
+    token_rate: float = 0.0
+
+
+@dataclass
+class Series:
+    """Bloc contigu d'avis partageant produit, pays, source et market, triés par date"""
+
+    brand: str
+    product: str
+    category: str
+    subcategory: str
+    country: str
+    source: str
+    market: str
+    offset: int
+    count: int
+
+
+class SyntheticCorpus:
+    """Corpus d'avis généré à la volée : seules les séries (quelques milliers) sont en mémoire"""
+
+    def __init__(self, config):
+        self.config = config
+        rng = random.Random(config.seed)
+        self.span_days = max(1, (config.end_date - config.start_date).days + 1)
+
+        self.brands = []
+        for i in range(config.brands):
+            stem = BRAND_STEMS[i % len(BRAND_STEMS)]
+            self.brands.append(stem if i < len(BRAND_STEMS) else f"{stem} {i // len(BRAND_STEMS) + 1}")
+
+        self.series = []
+        weights = []
+        self.products_by_brand = {}
+        categories = list(CATEGORIES)
+        for brand in self.brands:
+            products = []
+            for p in range(config.products_per_brand):
+                category = rng.choice(categories)
+                subcategory = rng.choice(CATEGORIES[category])
+                name = f"{brand} {' '.join(rng.sample(PRODUCT_WORDS, 2))} {p + 1}"
+                products.append((name, category, subcategory))
+                popularity = rng.paretovariate(1.2)
+                for country in rng.sample(COUNTRIES, rng.randint(1, 3)):
+                    source = rng.choice(SOURCES_BY_COUNTRY[country])
+                    market = rng.choice(MARKETS)
+                    self.series.append(Series(brand, name, category, subcategory, country, source, market, 0, 0))
+                    weights.append(popularity * rng.uniform(0.5, 1.5))
+            self.products_by_brand[brand] = products
+
+        # Répartition exacte de `reviews` avis entre les séries, proportionnellement aux poids
+        total_weight = sum(weights)
+        counts = [int(config.reviews * w / total_weight) for w in weights]
+        for i in range(config.reviews - sum(counts)):
+            counts[i % len(counts)] += 1
+        offset = 0
+        for serie, count in zip(self.series, counts):
+            serie.offset = offset
+            serie.count = count
+            offset += count
+        self._offsets = [serie.offset for serie in self.series]
+
+        self._plans = OrderedDict()
+        self._plans_lock = threading.Lock()
+
+    # Référentiels -----------------------------------------------------------
+
+    def categories(self):
+        return [{"category": c, "subcategories": subs} for c, subs in CATEGORIES.items()]
+
+    def brand_names(self, category=None, subcategory=None):
+        return [
+            brand for brand in self.brands
+            if any((not category or c == category) and (not subcategory or s == subcategory)
+                   for _, c, s in self.products_by_brand[brand])
+        ]
+
+    def product_names(self, query):
+        plan = self.plan(query)
+        seen = OrderedDict()
+        for serie, j_lo, j_hi in plan["ranges"]:
+            if j_hi > j_lo:
+                seen[serie.product] = True
+        return list(seen)
+
+    # Requêtes ---------------------------------------------------------------
+
+    def _date_index_range(self, serie, query):
+        """Sous-intervalle [j_lo, j_hi) des avis d'une série compris dans la période demandée"""
+        n, span = serie.count, self.span_days
+        lo_day = (query["start-date"] - self.config.start_date).days if query.get("start-date") else 0
+        hi_day = (query["end-date"] - self.config.start_date).days if query.get("end-date") else span - 1
+        lo_day = max(0, lo_day)
+        hi_day = min(span - 1, hi_day)
+        if hi_day < lo_day:
+            return 0, 0
+        # date(j) = start + (j * span) // n  : inversion exacte en arithmétique entière
+        j_lo = (lo_day * n + span - 1) // span
+        j_hi = ((hi_day + 1) * n + span - 1) // span
+        return min(j_lo, n), min(j_hi, n)
+
+    def _serie_matches(self, serie, query):
+        for name in ("brand", "product", "country", "source", "market"):
+            values = query.get(name)
+            if values and getattr(serie, name) not in values:
+                return False
+        if query.get("category") and serie.category != query["category"]:
+            return False
+        if query.get("subcategory") and serie.subcategory != query["subcategory"]:
+            return False
+        return True
+
+    def plan(self, query):
+        """Calcule (et met en cache) les intervalles d'avis correspondant à une requête"""
+        key = json.dumps(query, sort_keys=True, default=str)
+        with self._plans_lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+
+        ranges = []
+        cumulative = []
+        total = 0
+        for serie in self.series:
+            if serie.count == 0 or not self._serie_matches(serie, query):
+                continue
+            j_lo, j_hi = self._date_index_range(serie, query)
+            if j_hi > j_lo:
+                ranges.append((serie, j_lo, j_hi))
+                cumulative.append(total)
+                total += j_hi - j_lo
+
+        indices = None
+        if query.get("attribute") or query.get("attribute-positive") or query.get("attribute-negative"):
+            # Filtre au niveau de l'avis : on matérialise les index correspondants
+            indices = array("q")
+            for serie, j_lo, j_hi in ranges:
+                for j in range(j_lo, j_hi):
+                    if self._attributes_match(serie.offset + j, query):
+                        indices.append(serie.offset + j)
+            total = len(indices)
+
+        plan = {"ranges": ranges, "cumulative": cumulative, "total": total, "indices": indices}
+        with self._plans_lock:
+            self._plans[key] = plan
+            while len(self._plans) > 256:
+                self._plans.popitem(last=False)
+        return plan
+
+    def _attributes(self, index):
+        h = _mix(self.config.seed * 1_000_003 + index)
+        mentioned, positive, negative = [], [], []
+        for i, attribute in enumerate(PREDEFINED_ATTRIBUTES):
+            bits = (h >> (i * 6)) & 0x3F
+            if bits < 12:  # ~19% des avis mentionnent chaque attribut
+                mentioned.append(attribute)
+                if bits < 6:
+                    positive.append(attribute)
+                elif bits < 10:
+                    negative.append(attribute)
+                else:
+                    positive.append(attribute)
+                    negative.append(attribute)
+        return mentioned, positive, negative
+
+    def _attributes_match(self, index, query):
+        mentioned, positive, negative = self._attributes(index)
+        for name, values in (("attribute", mentioned), ("attribute-positive", positive), ("attribute-negative", negative)):
+            wanted = query.get(name)
+            if wanted and not any(a in values for a in wanted):
+                return False
+        return True
+
+    def locate(self, plan, position):
+        """Retourne l'index global de l'avis à la position `position` du résultat"""
+        if plan["indices"] is not None:
+            return plan["indices"][position]
+        k = bisect.bisect_right(plan["cumulative"], position) - 1
+        serie, j_lo, _ = plan["ranges"][k]
+        return serie.offset + j_lo + (position - plan["cumulative"][k])
+
+    def review(self, index):
+        """Génère l'avis d'index global `index`"""
+        serie = self.series[bisect.bisect_right(self._offsets, index) - 1]
+        j = index - serie.offset
+        day = (j * self.span_days) // serie.count
+        h = _mix(index ^ (self.config.seed << 40))
+        mentioned, positive, negative = self._attributes(index)
+        rating = 1 + (h % 5)
+        words = [PRODUCT_WORDS[(h >> (8 + 4 * k)) % len(PRODUCT_WORDS)] for k in range(12)]
+        content = f"Avis {index} sur {serie.product} : " + " ".join(words) + ". " + ("Très satisfaite." if rating >= 4 else "Déçue par ce produit.")
+        return {
+            "id": f"{h:016x}",
+            "date": (self.config.start_date + datetime.timedelta(days=day)).isoformat(),
+            "brand": serie.brand,
+            "product": serie.product,
+            "category": serie.category,
+            "subcategory": serie.subcategory,
+            "country": serie.country,
+            "source": serie.source,
+            "market": serie.market,
+            "rating": rating,
+            "title": " ".join(words[:3]).capitalize(),
+            "content origin": content,
+            "content trad": content,
+            "attributes": mentioned,
+            "attributes positive": positive,
+            "attributes negative": negative,
+            "business indicator": "Sampling Rate" if (h >> 60) == 0 else "Organic"
+        }
+
+
+def _encode_cursor(position):
+    return base64.urlsafe_b64encode(f"pos:{position}".encode()).decode()
+
+
+def _decode_cursor(cursor):
+    if not cursor or cursor == "*":
+        return 0
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)[1])
+    except (ValueError, IndexError):
+        raise ValueError(f"cursorMark invalide: {cursor}")
+
+
+def _permuted(position, total, seed):
+    """Permutation affine déterministe de [0, total) pour le paramètre `random`"""
+    a = (_mix(seed) % total) | 1
+    while math.gcd(a, total) != 1:
+        a += 2
+    b = _mix(seed + 1) % total
+    return (a * position + b) % total
+
+
+class MockApi:
+    """Logique des endpoints, indépendante du transport HTTP"""
+
+    def __init__(self, config):
+        self.config = config
+        self.corpus = SyntheticCorpus(config)
+        self._lock = threading.Lock()
+        self.used_volume = 0
+        self.used_by_token = defaultdict(int)
+        self.requests_count = 0
+        # Seau à jetons par token (token_rate requêtes / s) : {token: (jetons, date du dernier calcul)}
+        self._token_buckets = {}
+
+    def _take_token_slot(self, token):
+        """Débit par token : False si le token a dépassé `token_rate` requêtes / s"""
+        rate = self.config.token_rate
+        if not rate:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._token_buckets.get(token, (rate, now))
+            tokens = min(rate, tokens + (now - last) * rate)
+            allowed = tokens >= 1
+            self._token_buckets[token] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def parse_query(self, raw):
+        """Normalise les paramètres (listes séparées par des virgules, dates)"""
+        query = {}
+        for name in ("brand", "product", "country", "source", "market", "attribute", "attribute-positive", "attribute-negative"):
+            if raw.get(name):
+                values = [v for v in raw[name].split(",") if v and v != "ALL"]
+                if values:
+                    query[name] = values
+        for name in ("category", "subcategory"):
+            if raw.get(name) and raw[name] != "ALL":
+                query[name] = raw[name]
+        for name in ("start-date", "end-date"):
+            if raw.get(name):
+                query[name] = datetime.date.fromisoformat(raw[name][:10])
+        return query
+
+    def handle(self, endpoint, raw):
+        """Retourne (statut, corps JSON, en-têtes) pour un appel"""
+        with self._lock:
+            self.requests_count += 1
+        if self.config.token and raw.get("token") not in self.config.token.split(","):
+            return 401, {"error": "invalid token"}, {}
+        if not raw.get("token"):
+            return 401, {"error": "missing token"}, {}
+        if not self._take_token_slot(raw["token"]):
+            return 429, {"error": "token rate limit exceeded"}, {"Retry-After": "1"}
+
+        rng = random.random()
+        if rng < self.config.rate_limit_rate:
+            return 429, {"error": "too many requests"}, {"Retry-After": str(self.config.retry_after)}
+        if rng < self.config.rate_limit_rate + self.config.error_rate:
+            return 500, {"error": "internal error"}, {}
+
+        try:
+            query = self.parse_query(raw)
+        except ValueError as e:
+            return 400, {"error": str(e)}, {}
+
+        corpus = self.corpus
+        if endpoint == "/categories":
+            result = {"categories": corpus.categories()}
+        elif endpoint == "/brands":
+            result = {"brands": corpus.brand_names(query.get("category"), query.get("subcategory"))}
+        elif endpoint == "/countries":
+            result = {"countries": list(COUNTRIES)}
+        elif endpoint == "/sources":
+            countries = query.get("country") or COUNTRIES
+            result = {"sources": [s for c in countries for s in SOURCES_BY_COUNTRY.get(c, [])]}
+        elif endpoint == "/markets":
+            result = {"markets": list(MARKETS)}
+        elif endpoint == "/attributes":
+            result = {"attributes": list(PREDEFINED_ATTRIBUTES)}
+        elif endpoint == "/products":
+            result = {"products": corpus.product_names(query)}
+        elif endpoint == "/metrics":
+            result = {"nbDocs": corpus.plan(query)["total"]}
+        elif endpoint == "/quotas":
+            # Chaque token a son propre quota
+            with self._lock:
+                used = self.used_by_token[raw["token"]]
+            result = {
+                "used volume": used,
+                "remaining volume": max(0, self.config.quota - used),
+                "quota": self.config.quota,
+                "end date": (datetime.date.today() + datetime.timedelta(days=365)).isoformat()
+            }
+        elif endpoint == "/reviews":
+            try:
+                result = self.reviews(query, raw)
+            except ValueError as e:
+                return 400, {"error": str(e)}, {}
+        else:
+            return 404, {"error": f"unknown endpoint {endpoint}"}, {}
+        return 200, {"result": result}, {}
+
+    def reviews(self, query, raw):
+        """Page de reviews paginée par curseur (sémantique cursorMark/nextCursorMark de Solr)"""
+        rows = max(1, min(int(raw.get("rows", 10)), 1000))
+        cursor = raw.get("cursorMark", "*")
+        start = _decode_cursor(cursor)
+        plan = self.corpus.plan(query)
+        total = plan["total"]
+        end = min(start + rows, total)
+
+        seed = raw.get("random")
+        docs = []
+        for position in range(start, end):
+            source_position = _permuted(position, total, int(seed)) if seed else position
+            docs.append(self.corpus.review(self.corpus.locate(plan, source_position)))
+
+        with self._lock:
+            self.used_volume += len(docs)
+            self.used_by_token[raw["token"]] += len(docs)
+        next_cursor = _encode_cursor(end) if docs else cursor
+        return {"docs": docs, "nextCursorMark": next_cursor, "nbDocs": total}
+
+
+def make_handler(api):
+    """Crée la classe de handler HTTP liée à une instance de MockApi"""
+
+    class MockApiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parsed = urllib.parse.urlsplit(self.path)
+            raw = {k: v[-1] for k, v in urllib.parse.parse_qs(parsed.query, keep_blank_values=True).items()}
+
+            config = api.config
+            delay = config.latency_ms * (0.5 + random.random()) if config.latency_ms else 0.0
+            if config.slow_rate and random.random() < config.slow_rate:
+                delay += config.slow_ms
+            if delay:
+                time.sleep(delay / 1000)
+
+            status, body, headers = api.handle(parsed.path, raw)
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockApiHandler
+
+
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    """Démarre le serveur dans un thread ; retourne (serveur, url de base). `port=0` choisit un port libre"""
+    api = MockApi(config or MockConfig())
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    server.api = api
+    thread = threading.Thread(target=server.serve_forever, name="mock-api", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur local simulant l'API Ratings & Reviews")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--reviews", type=int, default=100_000, help="Taille du corpus synthétique")
+    parser.add_argument("--brands", type=int, default=40)
+    parser.add_argument("--products-per-brand", type=int, default=50)
+    parser.add_argument("--start-date", default="2022-01-01", help="Date du plus ancien avis (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latence moyenne par requête")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Part des requêtes anormalement lentes")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="Latence ajoutée aux requêtes lentes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part des requêtes en erreur 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Part des requêtes en erreur 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Valeur de l'en-tête Retry-After des 429")
+    parser.add_argument("--quota", type=int, default=10_000_000, help="Quota de chaque token")
+    parser.add_argument("--token", default=None, help="Token(s) acceptés, séparés par des virgules (par défaut, tout token non vide)")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Débit maximal par token (requêtes / s), au-delà : 429")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = MockConfig(
+        reviews=args.reviews,
+        brands=args.brands,
+        products_per_brand=args.products_per_brand,
+        start_date=datetime.date.fromisoformat(args.start_date),
+        seed=args.seed,
+        latency_ms=args.latency_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        quota=args.quota,
+        token=args.token,
+        token_rate=args.token_rate
+    )
+    api = MockApi(config)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    server.daemon_threads = True
+    print(f"🧪 API simulée sur http://{args.host}:{args.port} ({config.reviews:,} avis, {len(api.corpus.series)} séries)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
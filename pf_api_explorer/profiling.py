@@ -0,0 +1,245 @@
+"""Profilage des reruns Streamlit : durée de chaque fonction `display_*` / `load_*` par rerun.
+
+Le mode est opt-in (`?profile=1` ou PF_PROFILE=1). Un rerun peut aussi être capturé sur disque,
+soit avec cProfile (fichier .prof lisible par pstats / snakeviz), soit par échantillonnage de la
+pile (fichier .folded lisible par flamegraph.pl ou speedscope).
+"""
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+DEFAULT_PROFILE_DIR = "profiles"
+HISTORY_FILE_NAME = "reruns.jsonl"
+HISTORY_SIZE = 200
+# Au-delà de cette taille, reruns.jsonl est réécrit avec les HISTORY_SIZE derniers reruns
+MAX_HISTORY_FILE_BYTES = 1024 * 1024
+SAMPLING_INTERVAL = 0.005
+
+_current = threading.local()
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_history_loaded = False
+
+logger = logging.getLogger(__name__)
+
+
+def get_profile_dir():
+    """Dossier des captures et de l'historique (PF_PROFILE_DIR, sinon ./profiles)"""
+    return Path(os.environ.get("PF_PROFILE_DIR", DEFAULT_PROFILE_DIR))
+
+
+class RerunRecord:
+    """Durées cumulées par fonction pendant un rerun"""
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.total = None
+        self.functions = {}
+        self.capture_path = None
+        self._stack = []
+
+    def add(self, name, elapsed, nested):
+        stats = self.functions.setdefault(name, {"calls": 0, "seconds": 0.0, "nested": nested})
+        stats["calls"] += 1
+        stats["seconds"] += elapsed
+
+    def to_dict(self):
+        return {
+            "session_id": self.session_id,
+            "started_at": self.started_at,
+            "total": self.total,
+            "functions": self.functions,
+            "capture_path": self.capture_path
+        }
+
+
+def profiled(func):
+    """Chronomètre `func` quand un rerun est profilé dans le thread courant ; transparent sinon"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        record = getattr(_current, "record", None)
+        if record is None:
+            return func(*args, **kwargs)
+        nested = bool(record._stack)
+        record._stack.append(func.__name__)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record._stack.pop()
+            record.add(func.__name__, time.perf_counter() - start, nested)
+    wrapper.__profiled__ = True
+    return wrapper
+
+
+def profile_functions(namespace, prefixes=("display_", "load_")):
+    """Remplace dans `namespace` (globals d'un module) les fonctions préfixées par leur version chronométrée.
+    Les appels internes passent par les globals et sont donc mesurés eux aussi."""
+    for name, value in list(namespace.items()):
+        if name.startswith(prefixes) and callable(value) and not getattr(value, "__profiled__", False):
+            namespace[name] = profiled(value)
+
+
+class StackSampler:
+    """Échantillonne la pile d'un thread à intervalle régulier (format « folded » des flamegraphs)"""
+
+    def __init__(self, thread_id, interval=SAMPLING_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+
+def run_profiled(func, session_id=None, capture=None):
+    """Exécute `func` (un rerun complet) en chronométrant les fonctions profilées.
+    `capture` vaut None, "cprofile" ou "sampling" ; la capture est écrite dans get_profile_dir()."""
+    record = RerunRecord(session_id)
+    _current.record = record
+    profiler = sampler = None
+    if capture == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif capture == "sampling":
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+    start = time.perf_counter()
+    try:
+        return func()
+    finally:
+        record.total = time.perf_counter() - start
+        _current.record = None
+        if profiler is not None:
+            profiler.disable()
+            record.capture_path = _write_capture(record, "prof", profiler.dump_stats)
+        if sampler is not None:
+            sampler.stop()
+            record.capture_path = _write_capture(record, "folded", sampler.write)
+        _append_history(record)
+
+
+def _write_capture(record, extension, writer):
+    profile_dir = get_profile_dir()
+    try:
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        session = "".join(c if c.isalnum() else "-" for c in record.session_id or "local")
+        path = profile_dir / f"rerun_{time.strftime('%Y%m%d-%H%M%S', time.localtime(record.started_at))}_{session}.{extension}"
+        writer(str(path))
+        return str(path)
+    except OSError as e:
+        logger.warning("Capture du profil impossible : %s", e)
+        return None
+
+
+def _append_history(record):
+    """Ajoute le rerun à l'historique en mémoire et au fichier reruns.jsonl du dossier de profils.
+    Le fichier est plafonné : passé MAX_HISTORY_FILE_BYTES, il ne garde que l'historique en mémoire."""
+    entry = record.to_dict()
+    with _history_lock:
+        _ensure_history_loaded()
+        _history.append(entry)
+        try:
+            profile_dir = get_profile_dir()
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            path = profile_dir / HISTORY_FILE_NAME
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            if path.stat().st_size > MAX_HISTORY_FILE_BYTES:
+                _rewrite_history_file(path)
+        except OSError as e:
+            logger.warning("Historique des reruns non enregistré : %s", e)
+
+
+def _rewrite_history_file(path):
+    """Réécrit reruns.jsonl avec les seuls reruns de l'historique en mémoire (appelé sous _history_lock)"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in _history:
+            f.write(json.dumps(entry) + "\n")
+    os.replace(tmp_path, path)
+
+
+def get_history(session_id=None):
+    """Historique des reruns profilés (le plus récent en dernier), rechargé du disque au premier appel"""
+    with _history_lock:
+        _ensure_history_loaded()
+        entries = list(_history)
+    if session_id is not None:
+        entries = [entry for entry in entries if entry["session_id"] == session_id]
+    return entries
+
+
+def _ensure_history_loaded():
+    """Recharge une fois par processus la fin de reruns.jsonl (appelé sous _history_lock)"""
+    global _history_loaded
+    if _history_loaded:
+        return
+    _history_loaded = True
+    path = get_profile_dir() / HISTORY_FILE_NAME
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = deque(f, maxlen=HISTORY_SIZE)
+    except OSError:
+        return
+    for line in lines:
+        try:
+            _history.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+
+
+def find_regressions(history, factor=1.5, min_seconds=0.05):
+    """Compare le dernier rerun à la médiane des précédents ; retourne les fonctions nettement plus lentes"""
+    if len(history) < 2:
+        return []
+    latest = history[-1]["functions"]
+    regressions = []
+    for name, stats in latest.items():
+        previous = sorted(entry["functions"][name]["seconds"] for entry in history[:-1] if name in entry["functions"])
+        if not previous:
+            continue
+        median = previous[len(previous) // 2]
+        if stats["seconds"] >= min_seconds and stats["seconds"] > median * factor:
+            regressions.append({"function": name, "seconds": stats["seconds"], "median": median})
+    return sorted(regressions, key=lambda r: r["seconds"] - r["median"], reverse=True)
+
+
+def summarize_cprofile(path, limit=25):
+    """Résumé texte (temps cumulé) d'une capture cProfile"""
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
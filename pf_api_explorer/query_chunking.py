@@ -0,0 +1,64 @@
+"""Découpage des requêtes dont l'URL dépasse un budget de longueur.
+
+Une sélection de centaines de produits (ou de marques) produit des URL de plusieurs dizaines de Ko,
+refusées ou traitées lentement par l'API et les proxys. Les paramètres multi-valeurs découpables
+(`product`, `brand`) sont répartis en sous-requêtes dont l'URL tient dans le budget. Une review
+n'ayant qu'un produit et qu'une marque, et les valeurs en double étant retirées, les sous-requêtes
+couvrent des ensembles disjoints : leurs compteurs s'additionnent. Les reviews des sous-requêtes sont
+fusionnées en écartant les identifiants déjà vus (voir `paginate_reviews_concurrently`).
+"""
+import os
+
+from pf_api_explorer.api_client import build_url, quote_strict
+
+# Longueur maximale d'une URL d'appel (PF_API_MAX_URL_LENGTH), dont une réserve pour le token et le curseur
+URL_LENGTH_BUDGET = int(os.environ.get("PF_API_MAX_URL_LENGTH", "4000"))
+URL_RESERVE = 256
+# Paramètres découpables (le plus long d'abord) : une review n'a qu'une valeur pour chacun
+SPLITTABLE_PARAMS = ("product", "brand")
+
+
+def _split_values(value):
+    """Valeurs distinctes d'un paramètre multi-valeurs, dans l'ordre de sélection"""
+    return list(dict.fromkeys(v for v in str(value).split(",") if v))
+
+
+def url_length(base_url, endpoint, params):
+    """Longueur de l'URL d'un appel, réserve pour le token et le curseur comprise"""
+    return len(build_url(base_url, endpoint, params, "")) + URL_RESERVE
+
+
+def split_params(params, base_url, endpoint, budget=URL_LENGTH_BUDGET):
+    """Découpe `params` en sous-requêtes dont l'URL tient dans `budget` caractères.
+
+    Retourne `[params]` si l'URL tient déjà (ou si rien n'est découpable). Le paramètre découpable le
+    plus long est réparti en lots ; si une seule valeur ne tient toujours pas, le lot est découpé à son
+    tour sur le paramètre suivant."""
+    if not isinstance(params, dict) or url_length(base_url, endpoint, params) <= budget:
+        return [params]
+    candidates = [name for name in SPLITTABLE_PARAMS if len(_split_values(params.get(name, ""))) > 1]
+    if not candidates:
+        return [params]
+    name = max(candidates, key=lambda candidate: len(str(params[candidate])))
+    values = _split_values(params[name])
+
+    # Longueur fixe (URL sans ce paramètre), puis longueur encodée de chaque valeur et du séparateur
+    fixed = url_length(base_url, endpoint, {**params, name: ""})
+    separator = len(quote_strict(","))
+    chunks, chunk, length = [], [], fixed
+    for value in values:
+        value_length = len(quote_strict(value)) + (separator if chunk else 0)
+        if chunk and length + value_length > budget:
+            chunks.append(chunk)
+            chunk, length = [], fixed
+            value_length -= separator
+        chunk.append(value)
+        length += value_length
+    chunks.append(chunk)
+    if len(chunks) == 1:
+        return [params]
+
+    result = []
+    for chunk in chunks:
+        result.extend(split_params({**params, name: ",".join(chunk)}, base_url, endpoint, budget))
+    return result
@@ -0,0 +1,125 @@
+import datetime
+from dataclasses import dataclass
+
+# Délai (jours) après lequel une période passée est considérée comme close : les avis
+# d'une date donnée peuvent encore être ingérés pendant quelques jours
+HISTORY_SETTLE_DAYS = 7
+# Durées de cache (secondes) : période qui touche les jours récents (encore alimentée), requête sans dates
+RECENT_CACHE_TTL = 600
+DEFAULT_CACHE_TTL = 3600
+
+
+def params_from_filters(filters, include_attributes=True):
+    """Construit les paramètres API communs à partir des filtres de la sidebar"""
+    params = {
+        "start-date": filters["start_date"],
+        "end-date": filters["end_date"]
+    }
+    if filters["category"] != "ALL":
+        params["category"] = filters["category"]
+    if filters["subcategory"] != "ALL":
+        params["subcategory"] = filters["subcategory"]
+    if filters.get("brand"):
+        params["brand"] = ",".join(filters["brand"])
+    if filters.get("country") and "ALL" not in filters["country"]:
+        params["country"] = ",".join(filters["country"])
+    if filters.get("source") and "ALL" not in filters["source"]:
+        params["source"] = ",".join(filters["source"])
+    if filters.get("market") and "ALL" not in filters["market"]:
+        params["market"] = ",".join(filters["market"])
+    if include_attributes:
+        if filters.get("attributes"):
+            params["attribute"] = ",".join(filters["attributes"])
+        if filters.get("attributes_positive"):
+            params["attribute-positive"] = ",".join(filters["attributes_positive"])
+        if filters.get("attributes_negative"):
+            params["attribute-negative"] = ",".join(filters["attributes_negative"])
+    return params
+
+
+def _parse_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class QuerySpec:
+    """Description canonique et hashable d'une requête API : endpoint + paramètres triés"""
+
+    endpoint: str
+    params: tuple
+
+    @classmethod
+    def from_params(cls, endpoint, params):
+        """Crée une QuerySpec ; le token et le curseur de pagination ne font pas partie de la requête"""
+        items = []
+        for key, value in (params or {}).items():
+            if key in ("token", "cursorMark") or value is None:
+                continue
+            items.append((key, str(value)))
+        return cls(endpoint, tuple(sorted(items)))
+
+    def to_params(self):
+        """Retourne les paramètres sous forme de dict"""
+        return dict(self.params)
+
+    def get(self, key, default=None):
+        return self.to_params().get(key, default)
+
+    def with_params(self, params):
+        """Retourne une copie avec des paramètres ajoutés, remplacés ou retirés (valeur None)"""
+        merged = self.to_params()
+        merged.update(params)
+        return QuerySpec.from_params(self.endpoint, merged)
+
+    def without(self, *keys):
+        """Retourne une copie sans les paramètres indiqués"""
+        return QuerySpec(self.endpoint, tuple(item for item in self.params if item[0] not in keys))
+
+    @property
+    def start_date(self):
+        return _parse_date(self.get("start-date"))
+
+    @property
+    def end_date(self):
+        return _parse_date(self.get("end-date"))
+
+    def is_closed_history(self, today=None, settle_days=HISTORY_SETTLE_DAYS):
+        """Vrai si la période de la requête est close depuis au moins `settle_days` jours"""
+        end_date = self.end_date
+        if end_date is None:
+            return False
+        today = today or datetime.date.today()
+        return end_date <= today - datetime.timedelta(days=settle_days)
+
+    def month_pieces(self):
+        """Découpe la période en mois calendaires, plus les fractions de mois au début et à la fin : liste de
+        QuerySpec disjointes dont les compteurs s'additionnent ([self] si la période n'a pas de dates)"""
+        start_date, end_date = self.start_date, self.end_date
+        if start_date is None or end_date is None or start_date > end_date:
+            return [self]
+        pieces = []
+        piece_start = start_date
+        while piece_start <= end_date:
+            next_month = (piece_start.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+            piece_end = min(end_date, next_month - datetime.timedelta(days=1))
+            pieces.append(self.with_params({"start-date": piece_start.isoformat(), "end-date": piece_end.isoformat()}))
+            piece_start = next_month
+        return pieces
+
+    def cache_ttl(self, today=None):
+        """Durée de cache (secondes) d'une réponse selon sa période : None (sans expiration) si la période
+        est close, RECENT_CACHE_TTL si elle touche les jours récents, DEFAULT_CACHE_TTL sans date de fin"""
+        if self.end_date is None:
+            return DEFAULT_CACHE_TTL
+        if self.is_closed_history(today):
+            return None
+        return RECENT_CACHE_TTL
@@ -0,0 +1,193 @@
+"""Contrôle du débit et de la concurrence des appels API, par token et partagé par tout le processus serveur.
+
+Chaque token a son propre contrôleur : ses limites de débit et son quota sont suivis séparément
+(voir token_pool.py). Chaque appel prend un jeton (seau à jetons) et une place parmi les requêtes simultanées autorisées.
+Le débit et la concurrence augmentent de façon additive tant que l'API répond, sont divisés par deux
+sur un 429 et réduits plus modérément sur une erreur serveur (AIMD). Un en-tête Retry-After suspend
+tous les appels pour la durée demandée, et un quota presque épuisé (réponse de /quotas) plafonne le débit.
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Débit initial, minimal et maximal (requêtes / s) ; PF_API_RATE et PF_API_MAX_RATE pour les ajuster
+DEFAULT_RATE = float(os.environ.get("PF_API_RATE", "20"))
+MIN_RATE = 0.5
+MAX_RATE = float(os.environ.get("PF_API_MAX_RATE", "200"))
+# Requêtes simultanées : initial et maximum (PF_API_MAX_CONCURRENCY)
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = int(os.environ.get("PF_API_MAX_CONCURRENCY", "32"))
+# Gain du débit par seconde sans erreur, et facteurs appliqués sur un 429 et sur une erreur serveur
+ADDITIVE_INCREASE = 5.0
+MULTIPLICATIVE_DECREASE = 0.5
+SERVER_ERROR_DECREASE = 0.8
+# Délai minimal entre deux réductions (des 429 simultanés ne comptent qu'une fois)
+DECREASE_COOLDOWN = 1.0
+# Sous cette part de quota restante, le débit est plafonné à LOW_QUOTA_RATE_FACTOR * MAX_RATE
+LOW_QUOTA_RATIO = 0.05
+LOW_QUOTA_RATE_FACTOR = 0.1
+# Réessais des GET (idempotents) : nombre maximal et bornes de l'attente exponentielle avec gigue
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+def parse_retry_after(value, now=None):
+    """Durée d'attente (secondes) d'un en-tête Retry-After (secondes ou date HTTP), None si absent ou invalide"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - (now if now is not None else time.time()))
+
+
+def backoff_delay(attempt):
+    """Attente avant le réessai n° `attempt` (0 pour le premier) : exponentielle bornée, gigue complète"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class RateController:
+    """Seau à jetons et limite de concurrence ajustés par AIMD selon les réponses de l'API"""
+
+    def __init__(self, rate=DEFAULT_RATE, concurrency=DEFAULT_CONCURRENCY, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 max_concurrency=MAX_CONCURRENCY, clock=time.monotonic):
+        self.rate = min(rate, max_rate)
+        self.concurrency = float(min(concurrency, max_concurrency))
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.quota = None
+        self._clock = clock
+        self._tokens = self.rate
+        self._last_refill = clock()
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    # --- plafond de débit ---
+    @property
+    def rate_ceiling(self):
+        """Débit maximal autorisé, réduit quand le quota restant est faible"""
+        if self.quota and self.quota["total"] and self.quota["remaining"] is not None:
+            if self.quota["remaining"] / self.quota["total"] < LOW_QUOTA_RATIO:
+                return max(self.min_rate, self.max_rate * LOW_QUOTA_RATE_FACTOR)
+        return self.max_rate
+
+    @property
+    def quota_low(self):
+        return self.rate_ceiling < self.max_rate
+
+    def _refill(self, now):
+        burst = max(1.0, self.rate)
+        self._tokens = min(burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    # --- prise et libération d'une place ---
+    def acquire(self):
+        """Attend un jeton, une place libre et la fin d'un éventuel Retry-After"""
+        with self._cond:
+            while True:
+                now = self._clock()
+                self._refill(now)
+                if self._blocked_until > now:
+                    timeout = self._blocked_until - now
+                elif self.in_flight >= max(1, int(self.concurrency)):
+                    timeout = None  # Réveillé par release()
+                elif self._tokens < 1:
+                    timeout = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1
+                    self.in_flight += 1
+                    return
+                self._cond.wait(timeout)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Place d'un appel API : `with controller.slot(): requests.get(...)`"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    # --- ajustements ---
+    def on_success(self):
+        """Augmentation additive : environ +ADDITIVE_INCREASE req/s par seconde de réponses correctes"""
+        with self._cond:
+            self.rate = min(self.rate_ceiling, self.rate + ADDITIVE_INCREASE / max(self.rate, 1.0))
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / max(self.concurrency, 1.0))
+            self._cond.notify_all()
+
+    def on_throttle(self, retry_after=None):
+        """Réponse 429 : réduction multiplicative et suspension des appels pendant `retry_after` secondes"""
+        with self._cond:
+            self.throttled += 1
+            now = self._clock()
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._decrease(now, MULTIPLICATIVE_DECREASE)
+
+    def on_server_error(self):
+        """Erreur serveur ou de connexion : réduction multiplicative plus modérée"""
+        with self._cond:
+            self.server_errors += 1
+            self._decrease(self._clock(), SERVER_ERROR_DECREASE)
+
+    def _decrease(self, now, factor):
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.concurrency = max(1.0, self.concurrency * factor)
+        self._tokens = min(self._tokens, 0.0)
+
+    def update_quota(self, used, remaining, total):
+        """Volume du quota (réponse de /quotas) : un quota presque épuisé plafonne le débit"""
+        with self._cond:
+            self.quota = {"used": used, "remaining": remaining, "total": total}
+            self.rate = min(self.rate, self.rate_ceiling)
+
+    def snapshot(self):
+        """État courant du contrôleur (affichage et métriques)"""
+        with self._cond:
+            return {
+                "rate": self.rate,
+                "rate_ceiling": self.rate_ceiling,
+                "concurrency": int(self.concurrency),
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+                "server_errors": self.server_errors,
+                "blocked_for": max(0.0, self._blocked_until - self._clock()),
+                "quota": dict(self.quota) if self.quota else None
+            }
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_rate_controller(token, max_rate=MAX_RATE):
+    """Contrôleur de débit d'un token, créé au premier appel avec le débit maximal `max_rate`"""
+    with _controllers_lock:
+        controller = _controllers.get(token)
+        if controller is None:
+            controller = _controllers[token] = RateController(max_rate=max_rate)
+        return controller
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from pf_api_explorer.data_dir import data_path
+from pf_api_explorer.query_spec import QuerySpec
+
+WAREHOUSE_FILE_NAME = "review_warehouse.sqlite"
+# Une récupération interrompue (jamais terminée) est purgée après ce délai (secondes)
+ABANDONED_RUN_SECONDS = 6 * 3600
+# Un contexte couvert est oublié après ce délai : un export plus ancien est de toute façon récupéré à nouveau
+MAX_CONTEXT_AGE_DAYS = float(os.environ.get("PF_WAREHOUSE_MAX_AGE_DAYS", "30"))
+# Au-delà de ce nombre de reviews, les contextes les plus anciens sont oubliés
+MAX_WAREHOUSE_REVIEWS = int(os.environ.get("PF_WAREHOUSE_MAX_REVIEWS", "2000000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    context_key TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    fetched INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS run_reviews (
+    run_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    review_id TEXT NOT NULL,
+    PRIMARY KEY (run_id, position)
+);
+CREATE TABLE IF NOT EXISTS contexts (
+    context_key TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    completed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_context ON runs (context_key);
+CREATE INDEX IF NOT EXISTS run_reviews_by_review ON run_reviews (review_id);
+"""
+
+
+def get_context_spec(params):
+    """Contexte de requête d'un export : paramètres /reviews hors taille de page, token et curseur"""
+    return QuerySpec.from_params("/reviews", params).without("rows")
+
+
+def context_key(spec):
+    return json.dumps([spec.endpoint, spec.params], ensure_ascii=False)
+
+
+def review_id(doc):
+    """Identifiant d'une review (`id`, sinon empreinte de son contenu)"""
+    if doc.get("id"):
+        return str(doc["id"])
+    return "sha1:" + hashlib.sha1(json.dumps(doc, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ReviewWarehouse:
+    """Entrepôt local (SQLite) des reviews déjà récupérées, partagé par les sessions et les exports.
+
+    Chaque review est stockée une seule fois (clé `id`). Une récupération complète d'un contexte de
+    requête (filtres, dates, seed aléatoire) enregistre l'ordre des reviews obtenues : un export
+    identique peut ensuite être servi depuis l'entrepôt sans appel à /reviews.
+
+    Une review n'est conservée que tant qu'une récupération (en cours ou de référence) la cite. Les
+    contextes plus anciens que `max_age_days`, puis les plus anciens au-delà de `max_reviews` reviews,
+    sont oubliés à chaque récupération terminée."""
+
+    def __init__(self, path=None, max_age_days=MAX_CONTEXT_AGE_DAYS, max_reviews=MAX_WAREHOUSE_REVIEWS):
+        self.path = Path(path) if path else data_path(WAREHOUSE_FILE_NAME)
+        self.max_age_days = max_age_days
+        self.max_reviews = max_reviews
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """Connexion SQLite propre au thread courant (mode WAL : lectures concurrentes des écritures)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_coverage(self, params):
+        """Couverture complète enregistrée pour le contexte de `params` : {"total", "completed_at"} ou None"""
+        row = self._connect().execute(
+            "SELECT total, completed_at FROM contexts WHERE context_key = ?", (context_key(get_context_spec(params)),)
+        ).fetchone()
+        return {"total": row[0], "completed_at": row[1]} if row else None
+
+    def load_docs(self, params):
+        """Reviews d'un contexte couvert, dans l'ordre de l'API (liste vide si non couvert)"""
+        rows = self._connect().execute(
+            """SELECT r.doc FROM contexts c
+               JOIN run_reviews rr ON rr.run_id = c.run_id
+               JOIN reviews r ON r.id = rr.review_id
+               WHERE c.context_key = ? ORDER BY rr.position""",
+            (context_key(get_context_spec(params)),)
+        )
+        return [json.loads(doc) for (doc,) in rows]
+
+    def writer(self, params):
+        """Ouvre l'enregistrement d'une récupération de `params` (voir WarehouseWriter)"""
+        return WarehouseWriter(self, get_context_spec(params))
+
+    def stats(self):
+        conn = self._connect()
+        reviews_count = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+        contexts_count = conn.execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+        size = sum(os.path.getsize(p) for p in (self.path, Path(f"{self.path}-wal")) if p.exists())
+        return {"reviews": reviews_count, "contexts": contexts_count, "bytes": size}
+
+    def prune(self, keep_key=None):
+        """Oublie les contextes expirés, puis les plus anciens tant que l'entrepôt dépasse `max_reviews`
+        (le contexte `keep_key`, qui vient d'être récupéré, est conservé) ; retourne les contextes oubliés"""
+        conn = self._connect()
+        with conn:
+            expired = conn.execute(
+                "SELECT context_key, run_id FROM contexts WHERE completed_at < ? ORDER BY completed_at",
+                (time.time() - self.max_age_days * 86400,)
+            ).fetchall()
+            for key, run_id in expired:
+                _delete_context(conn, key, run_id)
+            dropped = len(expired)
+            oldest_first = conn.execute(
+                "SELECT context_key, run_id FROM contexts WHERE context_key != ? ORDER BY completed_at", (keep_key or "",)
+            ).fetchall()
+            for key, run_id in oldest_first:
+                if conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0] <= self.max_reviews:
+                    break
+                _delete_context(conn, key, run_id)
+                dropped += 1
+        return dropped
+
+
+class WarehouseWriter:
+    """Enregistre les pages d'une récupération ; la couverture du contexte n'est remplacée qu'à `complete()`.
+
+    Deux sessions peuvent récupérer le même contexte en même temps : chacune écrit dans sa propre
+    « run » et la dernière terminée devient la référence."""
+
+    def __init__(self, warehouse, spec):
+        self._warehouse = warehouse
+        self.spec = spec
+        self.key = context_key(spec)
+        self.run_id = uuid.uuid4().hex
+        self.position = 0
+        conn = warehouse._connect()
+        with conn:
+            self._purge_abandoned_runs(conn)
+            conn.execute("INSERT INTO runs (run_id, context_key, started_at) VALUES (?, ?, ?)", (self.run_id, self.key, time.time()))
+
+    def add_page(self, docs):
+        """Ajoute (ou met à jour) les reviews d'une page et leur position dans la récupération"""
+        now = time.time()
+        review_rows = []
+        position_rows = []
+        for doc in docs:
+            rid = review_id(doc)
+            review_rows.append((rid, json.dumps(doc, ensure_ascii=False), now))
+            position_rows.append((self.run_id, self.position, rid))
+            self.position += 1
+        conn = self._warehouse._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO reviews (id, doc, fetched_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET doc = excluded.doc, fetched_at = excluded.fetched_at",
+                review_rows
+            )
+            conn.executemany("INSERT INTO run_reviews (run_id, position, review_id) VALUES (?, ?, ?)", position_rows)
+            conn.execute("UPDATE runs SET fetched = ? WHERE run_id = ?", (self.position, self.run_id))
+
+    def complete(self):
+        """Déclare la récupération complète : elle devient la couverture de référence du contexte"""
+        conn = self._warehouse._connect()
+        with conn:
+            previous = conn.execute("SELECT run_id FROM contexts WHERE context_key = ?", (self.key,)).fetchone()
+            conn.execute(
+                "INSERT INTO contexts (context_key, spec, run_id, total, completed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(context_key) DO UPDATE SET spec = excluded.spec, run_id = excluded.run_id, "
+                "total = excluded.total, completed_at = excluded.completed_at",
+                (self.key, json.dumps(self.spec.to_params(), ensure_ascii=False), self.run_id, self.position, time.time())
+            )
+            if previous and previous[0] != self.run_id:
+                _delete_run(conn, previous[0])
+        self._warehouse.prune(keep_key=self.key)
+
+    def abort(self):
+        """Abandonne la récupération (ses reviews ne sont conservées que si une autre récupération les cite)"""
+        conn = self._warehouse._connect()
+        with conn:
+            _delete_run(conn, self.run_id)
+
+    def _purge_abandoned_runs(self, conn):
+        limit = time.time() - ABANDONED_RUN_SECONDS
+        stale = conn.execute(
+            "SELECT run_id FROM runs WHERE started_at < ? AND run_id NOT IN (SELECT run_id FROM contexts)", (limit,)
+        ).fetchall()
+        for (run_id,) in stale:
+            _delete_run(conn, run_id)
+
+
+def _delete_run(conn, run_id):
+    """Supprime une récupération et les reviews qu'aucune autre récupération ne cite"""
+    conn.execute(
+        """DELETE FROM reviews WHERE id IN (SELECT review_id FROM run_reviews WHERE run_id = ?)
+           AND NOT EXISTS (SELECT 1 FROM run_reviews other WHERE other.review_id = reviews.id AND other.run_id != ?)""",
+        (run_id, run_id)
+    )
+    conn.execute("DELETE FROM run_reviews WHERE run_id = ?", (run_id,))
+    conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+
+def _delete_context(conn, key, run_id):
+    conn.execute("DELETE FROM contexts WHERE context_key = ?", (key,))
+    _delete_run(conn, run_id)
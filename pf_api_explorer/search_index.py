@@ -0,0 +1,132 @@
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+# Un token = suite de lettres/chiffres (unicode), le "_" faisant office de séparateur
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_PREFIX_CACHE_SIZE = 512
+# Au-delà de ce nombre de tokens ou d'occurrences, les lignes d'un préfixe sont précalculées à la construction
+_DENSE_PREFIX_TOKENS = 32
+_DENSE_PREFIX_POSTINGS = 2048
+
+
+def normalize_text(text):
+    """Normalise un texte pour la recherche : sans accents et insensible à la casse"""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """Découpe un texte normalisé en tokens alphanumériques"""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class ProductSearchIndex:
+    """Index de recherche par préfixe de tokens sur le catalogue produits.
+
+    Chaque ligne est identifiée par sa clé (l'identifiant du produit), et non par sa
+    position : les résultats restent justes si la liste source est réordonnée ou filtrée ensuite.
+    Une requête est découpée en tokens ; chaque token doit être le préfixe d'au moins un token de la
+    marque ou du produit (ET logique entre les tokens de la requête).
+
+    Les lignes d'un préfixe sont un masque de bits (une ligne par bit) : l'intersection de deux préfixes
+    coûte quelques microsecondes, même sur 50 000 produits, et s'arrête dès qu'elle est vide. Les préfixes
+    courts, qui couvrent beaucoup de tokens (« s », « 1 »...), sont précalculés à la construction.
+    """
+
+    def __init__(self, items):
+        keys = []
+        postings = {}
+        for position, (key, fields) in enumerate(items):
+            keys.append(key)
+            for field in fields:
+                for token in tokenize(field):
+                    rows = postings.setdefault(token, [])
+                    if not rows or rows[-1] != position:
+                        rows.append(position)
+        self._keys = np.empty(len(keys), dtype=object)
+        self._keys[:] = keys
+        # Vocabulaire trié : les tokens partageant un préfixe sont contigus (recherche par bisect)
+        self._vocabulary = sorted(postings)
+        self._postings = [np.array(postings[token], dtype=np.int32) for token in self._vocabulary]
+        # Nombre cumulé d'occurrences : taille d'une plage du vocabulaire en O(1)
+        self._offsets = np.cumsum([0] + [len(rows) for rows in self._postings])
+        self.size = len(keys)
+        self._dense_prefixes = self._precompute_dense_prefixes()
+        self._prefix_cache = {}
+
+    def __len__(self):
+        return self.size
+
+    def _range(self, prefix, lo=0, hi=None):
+        """Plage du vocabulaire des tokens commençant par `prefix`"""
+        hi = len(self._vocabulary) if hi is None else hi
+        lo = bisect.bisect_left(self._vocabulary, prefix, lo, hi)
+        return lo, bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff", lo, hi)
+
+    def _bitmap(self, lo, hi):
+        """Masque de bits des lignes des tokens de la plage [lo, hi) du vocabulaire"""
+        rows = np.zeros(self.size, dtype=bool)
+        for positions in self._postings[lo:hi]:
+            rows[positions] = True
+        return np.packbits(rows, bitorder="little")
+
+    def _precompute_dense_prefixes(self):
+        """Lignes des préfixes couvrant plusieurs tokens et plus de _DENSE_PREFIX_TOKENS tokens ou de
+        _DENSE_PREFIX_POSTINGS occurrences, niveau par niveau : un préfixe non précalculé couvre donc peu
+        d'occurrences, et son union reste rapide au moment de la recherche"""
+        dense = {}
+        parents = [("", 0, len(self._vocabulary))]
+        while parents:
+            children = []
+            for parent, lo, hi in parents:
+                i = lo
+                while i < hi:
+                    token = self._vocabulary[i]
+                    if len(token) <= len(parent):
+                        i += 1
+                        continue
+                    child = token[:len(parent) + 1]
+                    child_lo, child_hi = self._range(child, i, hi)
+                    tokens = child_hi - child_lo
+                    occurrences = self._offsets[child_hi] - self._offsets[child_lo]
+                    if tokens > 1 and (tokens > _DENSE_PREFIX_TOKENS or occurrences > _DENSE_PREFIX_POSTINGS):
+                        dense[child] = self._bitmap(child_lo, child_hi)
+                        children.append((child, child_lo, child_hi))
+                    i = child_hi
+            parents = children
+        return dense
+
+    def _match_prefix(self, prefix):
+        """Retourne le masque de bits des lignes dont un token commence par `prefix`"""
+        matches = self._dense_prefixes.get(prefix)
+        if matches is not None:
+            return matches
+        matches = self._prefix_cache.get(prefix)
+        if matches is not None:
+            return matches
+
+        matches = self._bitmap(*self._range(prefix))
+        if len(self._prefix_cache) >= _PREFIX_CACHE_SIZE:
+            self._prefix_cache.clear()
+        self._prefix_cache[prefix] = matches
+        return matches
+
+    def search(self, query):
+        """Retourne les clés (tableau numpy, dans l'ordre de l'index) des lignes correspondant à tous les
+        tokens de la requête"""
+        query_tokens = set(tokenize(query))
+        if not query_tokens:
+            return self._keys.copy()
+
+        # Tokens les plus longs (les plus sélectifs) d'abord : l'intersection s'arrête dès qu'elle est vide
+        result = None
+        for token in sorted(query_tokens, key=len, reverse=True):
+            matches = self._match_prefix(token)
+            result = matches if result is None else result & matches
+            if not result.any():
+                return self._keys[:0]
+        positions = np.flatnonzero(np.unpackbits(result, count=self.size, bitorder="little").view(bool))
+        return self._keys[positions]
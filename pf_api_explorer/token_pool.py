@@ -0,0 +1,108 @@
+"""Pool de tokens API : répartition des appels entre les tokens des différents centres de coûts.
+
+Chaque token a son propre contrôleur de débit (limites, Retry-After et quota suivis séparément, voir
+rate_control.py) : le débit total croît avec le nombre de tokens. Chaque appel prend le token le
+moins chargé par rapport à son débit courant ; un token suspendu par un Retry-After ou dont le quota
+est épuisé n'est choisi qu'en dernier recours. Un export peut être rattaché à un centre de coûts :
+seuls les tokens de ce centre sont alors utilisés.
+"""
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from pf_api_explorer.rate_control import MAX_RATE, get_rate_controller
+
+DEFAULT_TOKEN_NAME = "principal"
+
+
+@dataclass(frozen=True)
+class PoolToken:
+    """Token du pool : nom affiché, valeur, centre de coûts et débit maximal (requêtes / s)"""
+
+    name: str
+    token: str
+    cost_center: str = None
+    max_rate: float = MAX_RATE
+
+
+def parse_token_config(api_secrets):
+    """Tokens de la section [api] des secrets : liste `tokens` (token, name, cost_center, max_rate), sinon `token` seul"""
+    entries = api_secrets.get("tokens")
+    if not entries:
+        return [PoolToken(DEFAULT_TOKEN_NAME, api_secrets["token"])]
+    return [
+        PoolToken(
+            name=entry.get("name") or f"token {index}",
+            token=entry["token"],
+            cost_center=entry.get("cost_center"),
+            max_rate=float(entry.get("max_rate", MAX_RATE))
+        )
+        for index, entry in enumerate(entries, start=1)
+    ]
+
+
+class TokenPool:
+    """Ordonnancement des appels entre les tokens, partagé par les threads du processus"""
+
+    def __init__(self, tokens):
+        if not tokens:
+            raise ValueError("Aucun token API configuré")
+        names = [token.name for token in tokens]
+        if len(set(names)) != len(names):
+            raise ValueError("Les noms des tokens API doivent être uniques")
+        self.tokens = list(tokens)
+        self._outstanding = {token.name: 0 for token in self.tokens}
+        self._lock = threading.Lock()
+        for token in self.tokens:
+            get_rate_controller(token.token, max_rate=token.max_rate)
+
+    def get(self, name):
+        return next(token for token in self.tokens if token.name == name)
+
+    def cost_centers(self):
+        """Centres de coûts des tokens configurés"""
+        return sorted({token.cost_center for token in self.tokens if token.cost_center})
+
+    def candidates(self, cost_center=None):
+        """Tokens utilisables pour un centre de coûts (tous si `cost_center` est None)"""
+        if cost_center is None:
+            return list(self.tokens)
+        tokens = [token for token in self.tokens if token.cost_center == cost_center]
+        if not tokens:
+            raise ValueError(f"Aucun token API pour le centre de coûts « {cost_center} »")
+        return tokens
+
+    def _score(self, token):
+        control = get_rate_controller(token.token).snapshot()
+        quota = control["quota"]
+        exhausted = bool(quota and quota["remaining"] is not None and quota["remaining"] <= 0)
+        # Appels en cours ou en attente sur ce token, rapportés à son débit courant
+        load = (self._outstanding[token.name] + 1) / control["rate"]
+        return (exhausted, control["blocked_for"] > 0, load)
+
+    def choose(self, cost_center=None):
+        """Token le moins chargé parmi les candidats (sans le réserver)"""
+        with self._lock:
+            return min(self.candidates(cost_center), key=self._score)
+
+    @contextmanager
+    def lease(self, cost_center=None):
+        """Réserve un token pour la durée d'un appel : `with pool.lease() as token: get_result(..., token.token)`"""
+        with self._lock:
+            token = min(self.candidates(cost_center), key=self._score)
+            self._outstanding[token.name] += 1
+        try:
+            yield token
+        finally:
+            with self._lock:
+                self._outstanding[token.name] -= 1
+
+    def snapshot(self):
+        """État de chaque token (affichage et métriques) ; la valeur des tokens n'est pas exposée"""
+        rows = []
+        for token in self.tokens:
+            control = get_rate_controller(token.token).snapshot()
+            with self._lock:
+                outstanding = self._outstanding[token.name]
+            rows.append({"name": token.name, "cost_center": token.cost_center, "outstanding": outstanding, **control})
+        return rows
@@ -8,8 +8,10 @@ setup(
     install_requires=[
         'streamlit',
         'pandas',
+        'numpy',
         'requests',
-        'openpyxl'
+        'openpyxl',
+        'duckdb'
     ],
     entry_points={
         'console_scripts': [
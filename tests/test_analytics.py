@@ -0,0 +1,64 @@
+import pytest
+
+from pf_api_explorer import analytics
+from pf_api_explorer.analytics import CHART_QUERIES, PREBUILT_QUERIES, AnalyticsEngine, build_review_tables
+
+
+@pytest.mark.parametrize("docs", [[], [{"attributes": ["Foo"]}], [{"id": "1", "brand": "A", "attributes": "[]"}]])
+def test_build_review_tables_without_predefined_attributes(docs):
+    tables = build_review_tables(docs)
+    assert len(tables["reviews"]) == len(docs)
+    assert tables["review_attributes"].empty
+    assert {"id", "brand", "product", "month", "rating", "attribute", "polarity"} <= set(tables["review_attributes"].columns)
+
+
+def test_build_review_tables_with_attributes():
+    attribute = sorted(analytics.PREDEFINED_ATTRIBUTES)[0]
+    docs = [{"id": "1", "brand": "A", "attributes": [attribute], "attributes positive": [attribute]}, {"id": "2", "brand": "B"}]
+    review_attributes = build_review_tables(docs)["review_attributes"]
+    assert review_attributes[["id", "brand", "attribute", "polarity"]].values.tolist() == [["1", "A", attribute, "positive"]]
+
+
+@pytest.fixture(params=["duckdb", "sqlite"])
+def engine(request, monkeypatch, tmp_path):
+    if request.param == "sqlite":
+        monkeypatch.setattr(analytics, "_import_duckdb", lambda: None)
+    elif analytics._import_duckdb() is None:
+        pytest.skip("DuckDB non installé")
+    engine = AnalyticsEngine(build_review_tables([{"id": "1", "brand": "A", "rating": 5, "date": "2023-01-02"}]))
+    assert engine.backend == request.param
+    yield engine
+    engine.close()
+
+
+def test_select_queries_are_allowed(engine):
+    df, _ = engine.query("WITH r AS (SELECT brand, rating FROM reviews) SELECT brand, COUNT(*) AS n FROM r JOIN review_attributes USING (brand) GROUP BY brand")
+    assert df.empty
+    df, _ = engine.query("SELECT brand, rating FROM reviews")
+    assert df.values.tolist() == [["A", 5]]
+
+
+def test_prebuilt_and_chart_queries_are_allowed(engine):
+    for sql in [*PREBUILT_QUERIES.values(), *CHART_QUERIES.values()]:
+        engine.query(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM read_text('{secret}')",
+    "COPY (SELECT 42 AS x) TO '{target}'",
+    "ATTACH '{target}' AS other",
+    "PRAGMA table_info(reviews)",
+    "DROP TABLE reviews",
+    "SELECT 1; DROP TABLE reviews",
+    "WITH x AS (SELECT 1) DELETE FROM reviews",
+    "SELECT * FROM sqlite_master",
+    "SELECT * FROM duckdb_settings() JOIN information_schema.tables ON true",
+])
+def test_other_statements_are_refused(engine, sql, tmp_path):
+    secret = tmp_path / "secrets.toml"
+    secret.write_text("token = 'x'")
+    target = tmp_path / "written"
+    with pytest.raises(Exception):
+        engine.query(sql.format(secret=secret, target=target))
+    assert not target.exists()
+    assert engine.query("SELECT COUNT(*) AS n FROM reviews")[0]["n"].tolist() == [1]
@@ -0,0 +1,104 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pf_api_explorer.catalog_store import CatalogStore
+from pf_api_explorer.query_spec import QuerySpec
+
+CONTEXT = QuerySpec.from_params("/products", {"start-date": "2025-01-01", "end-date": "2025-01-31"})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_stale_entry_triggers_a_single_background_refresh():
+    clock = FakeClock()
+    release = threading.Event()
+    calls = []
+
+    def loader(brand, context):
+        calls.append(brand)
+        if len(calls) > 1:
+            release.wait(5)
+        return [f"{brand} {len(calls)}"]
+
+    store = CatalogStore(loader, ttl=10, stale_ttl=100, max_workers=1, clock=clock)
+    assert store.get("AVÈNE", CONTEXT) == ["AVÈNE 1"]
+    clock.now = 20
+    # Le thread de rechargement est occupé : la tâche soumise ne démarre pas tout de suite
+    busy = threading.Event()
+    store._executor.submit(busy.wait, 5)
+
+    # Le rechargement est enregistré avant le retour : aucun autre appel ne peut en lancer un second
+    try:
+        with ThreadPoolExecutor(max_workers=16) as callers:
+            results = list(callers.map(lambda _: store.get("AVÈNE", CONTEXT), range(200)))
+        assert results == [["AVÈNE 1"]] * 200
+        assert store.stats()["inflight"] == 1
+    finally:
+        busy.set()
+        release.set()
+        store._executor.shutdown(wait=True)
+    assert calls == ["AVÈNE", "AVÈNE"]
+    assert store.peek("AVÈNE", CONTEXT) == ["AVÈNE 2"]
+    assert store.stats()["inflight"] == 0
+
+
+def test_fresh_stale_and_expired_entries():
+    clock = FakeClock()
+    calls = []
+
+    def loader(brand, context):
+        calls.append(brand)
+        return [f"{brand} {len(calls)}"]
+
+    store = CatalogStore(loader, ttl=10, stale_ttl=100, clock=clock)
+    assert store.get("AVÈNE", CONTEXT) == ["AVÈNE 1"]
+    clock.now = 5
+    assert store.get("AVÈNE", CONTEXT) == ["AVÈNE 1"]
+    assert calls == ["AVÈNE"]
+
+    # Au-delà de ttl + stale_ttl, l'entrée est rechargée de façon synchrone
+    clock.now = 200
+    assert store.get("AVÈNE", CONTEXT) == ["AVÈNE 2"]
+    store.invalidate("AVÈNE")
+    assert store.peek("AVÈNE", CONTEXT) is None
+
+
+def test_closed_periods_do_not_expire():
+    clock = FakeClock()
+    store = CatalogStore(lambda brand, context: [brand], ttl=lambda context: None, clock=clock)
+    store.get("AVÈNE", CONTEXT)
+    clock.now = 10 ** 9
+    assert store.stats() == {"entries": 1, "fresh": 1, "stale": 0, "inflight": 0}
+
+
+def test_concurrent_misses_share_one_load_and_its_error():
+    release = threading.Event()
+    calls = []
+
+    def loader(brand, context):
+        calls.append(brand)
+        release.wait(5)
+        raise RuntimeError("API indisponible")
+
+    store = CatalogStore(loader)
+
+    def get(_):
+        try:
+            return store.get("AVÈNE", CONTEXT)
+        except RuntimeError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=8) as callers:
+        futures = [callers.submit(get, i) for i in range(8)]
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in futures]
+    assert results == ["API indisponible"] * 8
+    assert calls == ["AVÈNE"] and store.stats()["inflight"] == 0
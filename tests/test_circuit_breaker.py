@@ -0,0 +1,55 @@
+from pf_api_explorer.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LastGoodCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_consecutive_failures_only():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30
+    assert breaker.snapshot()["opened_count"] == 1
+
+
+def test_half_open_allows_a_single_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now = 30
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    # Essai en échec : nouvelle période d'ouverture complète
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.retry_in() == 30
+    clock.now = 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow() and breaker.allow()
+    assert breaker.snapshot()["opened_count"] == 1
+
+
+def test_last_good_cache_keeps_the_most_recent_entries():
+    cache = LastGoodCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("a", 3)
+    cache.put("c", 4)
+    assert cache.get("b") is None
+    assert cache.get("a")[0] == 3 and cache.get("c")[0] == 4
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import streamlit as st
+
+from pf_api_explorer.api_client import ApiError, get_result
+from pf_api_explorer.mock_server import MockConfig, start_mock_server
+from pf_api_explorer.query_spec import QuerySpec
+from pf_api_explorer.token_pool import PoolToken, TokenPool
+
+
+@pytest.fixture(scope="module")
+def app_on_mock():
+    server, url = start_mock_server(MockConfig(reviews=20000, latency_ms=1))
+    from pf_api_explorer import app
+    app.BASE_URL, previous_url = url, app.BASE_URL
+    app.get_token_pool, previous_pool = (lambda: TokenPool([PoolToken("test", "x")])), app.get_token_pool
+    yield app, server, url
+    app.BASE_URL, app.get_token_pool = previous_url, previous_pool
+    server.shutdown()
+
+
+@pytest.mark.parametrize("params", [
+    {"brand": "AVÈNE", "start-date": "2023-01-15", "end-date": "2023-09-10"},
+    {"brand": "AVÈNE,BIODERMA", "start-date": "2022-11-03", "end-date": "2024-02-29"},
+    {"brand": "BIODERMA", "start-date": "2023-03-01", "end-date": "2023-03-31"},
+])
+def test_composed_count_matches_direct_count(app_on_mock, params):
+    app, _, url = app_on_mock
+    spec = QuerySpec.from_params("/metrics", params)
+    direct = get_result("/metrics", params, url, "x")["nbDocs"]
+    assert app.fetch_counts_concurrently([spec])[spec] == direct
+    assert app.fetch("/metrics", params) == {"nbDocs": direct}
+    assert app.fetch_counts_concurrently([spec], by_month=False)[spec] == direct
+
+
+def test_widening_the_range_only_fetches_new_months(app_on_mock):
+    app, server, _ = app_on_mock
+    specs = [QuerySpec.from_params("/metrics", {"brand": brand, "start-date": "2021-01-01", "end-date": "2021-06-30"}) for brand in ("Vichy", "Nuxe")]
+    app.fetch_counts_concurrently(specs)
+    before = server.api.requests_count
+    widened = [spec.with_params({"end-date": "2021-09-30"}) for spec in specs]
+    counts = app.fetch_counts_concurrently(widened)
+    assert server.api.requests_count - before == 3 * len(specs)
+    for spec in widened:
+        assert counts[spec] == get_result("/metrics", spec.to_params(), app.BASE_URL, "x")["nbDocs"]
+
+
+def test_estimate_reports_stale_counts_without_touching_session_state(app_on_mock, monkeypatch):
+    app, _, _ = app_on_mock
+    filters = {"brand": ["AVÈNE"], "start_date": "2020-01-01", "end_date": "2020-03-31", "category": "ALL", "subcategory": "ALL"}
+    spec = QuerySpec.from_params("/metrics", app.params_from_filters(filters))
+    months = [QuerySpec.from_params("/metrics", term) for term in app.get_count_terms(spec.to_params())]
+    for month in months:
+        app.get_last_good_cache().put(month, {"nbDocs": 10})
+
+    def unavailable(endpoint, params, _cost_center=None):
+        raise ApiError("Erreur 503", status_code=503)
+
+    monkeypatch.setattr(app, "get_fetch_cache", lambda endpoint, params: unavailable)
+    st.session_state.pop("stale_data", None)
+    store = type("Store", (), {"get": lambda self, brand, context: [{}] * 600})()
+    with ThreadPoolExecutor(max_workers=1) as background:
+        estimate = background.submit(app.compute_product_volume_estimate, store, filters).result()
+
+    assert estimate["reviews"] == 30
+    assert set(estimate["stale"]) == set(months) | {spec}
+    assert "stale_data" not in st.session_state
@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pf_api_explorer.export_telemetry import ExportTelemetry
+
+
+def test_quota_consumed_counts_docs_of_this_export_only():
+    params = {"start-date": "2025-01-01", "end-date": "2025-01-31", "brand": "AVÈNE", "rows": 100}
+    telemetry = ExportTelemetry("STANDARD", params, quota_used_before=1000)
+    fetch = telemetry.timed_fetch(lambda page_params: {"docs": [{}] * page_params["rows"]})
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(fetch, [{"rows": 100}] * 7 + [{"rows": 42}]))
+
+    # Les tokens ont aussi servi à d'autres exports pendant celui-ci : le delta /quotas est plus grand
+    row = telemetry.finish(742, quota_used_after=5000)
+    assert row["quota_consumed"] == 742
+    assert row["pages"] == 8
+    assert (row["quota_used_before"], row["quota_used_after"]) == (1000, 5000)
+
+
+def test_parallel_fetch_is_timed_as_elapsed_time_and_stages_are_separate():
+    telemetry = ExportTelemetry("STANDARD", {"start-date": "2025-01-01", "end-date": "2025-01-31", "rows": 10})
+
+    def slow_page(page_params):
+        time.sleep(0.1)
+        return {"docs": [{}] * 10}
+
+    fetch = telemetry.timed_fetch(slow_page)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(fetch, [{}] * 8))
+    with telemetry.stage("normalize"):
+        time.sleep(0.05)
+    with telemetry.stage("flatten"):
+        time.sleep(0.02)
+
+    row = telemetry.finish(80)
+    # Huit pages de 0,1 s en parallèle : ~0,1 s écoulée, et non 0,8 s cumulée
+    assert 0.1 <= row["fetch_s"] < 0.3
+    assert row["fetch_s"] <= row["wall_s"]
+    assert row["normalize_s"] >= 0.05 and row["flatten_s"] >= 0.02
+    assert row["process_s"] < row["wall_s"] - row["fetch_s"]
@@ -0,0 +1,48 @@
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pf_api_explorer.hedging import HedgingPolicy
+
+
+def test_concurrent_calls_are_not_queued_nor_hedged():
+    policy = HedgingPolicy(enabled=True)
+    policy._thresholds["/metrics"] = (0.15, time.monotonic() + 3600)
+
+    def slow_call():
+        time.sleep(0.1)
+        return {"nbDocs": 1}
+
+    # Une collecte complète du ramasse-miettes pendant la rafale de threads dépasserait la marge de 50 ms
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=100) as callers:
+            results = list(callers.map(lambda _: policy.call("/metrics", slow_call), range(100)))
+    finally:
+        gc.enable()
+    assert results == [{"nbDocs": 1}] * 100
+    assert time.perf_counter() - start < 1.0
+    assert policy.summary()[0]["hedged"] == 0
+
+
+def test_slow_primary_is_hedged():
+    policy = HedgingPolicy(enabled=True)
+    policy._thresholds["/metrics"] = (0.05, time.monotonic() + 3600)
+    calls = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            calls.append(None)
+            first = len(calls) == 1
+        time.sleep(1.0 if first else 0.01)
+        return "hedge" if not first else "primary"
+
+    start = time.perf_counter()
+    assert policy.call("/metrics", call) == "hedge"
+    assert time.perf_counter() - start < 0.5
+    summary = policy.summary()[0]
+    assert summary["hedged"] == 1 and summary["hedge_wins"] == 1
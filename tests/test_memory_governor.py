@@ -0,0 +1,35 @@
+from pf_api_explorer.memory_governor import MemoryGovernor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_session_values_are_not_spilled_during_a_run(tmp_path):
+    clock = FakeClock()
+    governor = MemoryGovernor(session_threshold=10 ** 9, global_budget=0, idle_seconds=60, spill_dir=tmp_path, clock=clock)
+    rows = governor.create("s1", "product_data_cache", [{"count": None} for _ in range(100)])
+    with governor.script_run("s1"):
+        clock.now += 3600  # Rerun plus long que le délai d'inactivité
+        for row in rows:
+            row["count"] = 1
+            assert governor.enforce() == 0
+        assert not rows.is_spilled
+    assert governor.enforce() > 0
+    assert rows.is_spilled
+    assert all(row["count"] == 1 for row in rows)
+
+
+def test_idle_sessions_are_spilled(tmp_path):
+    clock = FakeClock()
+    governor = MemoryGovernor(session_threshold=10 ** 9, global_budget=10 ** 9, idle_seconds=60, spill_dir=tmp_path, clock=clock)
+    rows = governor.create("s1", "all_docs", [{"id": i} for i in range(10)])
+    with governor.script_run("s1"):
+        pass
+    assert governor.enforce() == 0
+    clock.now += 120
+    assert governor.enforce() > 0 and rows.is_spilled
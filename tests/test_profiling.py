@@ -0,0 +1,15 @@
+from pf_api_explorer import profiling
+
+
+def test_rerun_history_file_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setenv("PF_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "MAX_HISTORY_FILE_BYTES", 4096)
+    monkeypatch.setattr(profiling, "_history", profiling.deque(maxlen=5))
+    monkeypatch.setattr(profiling, "_history_loaded", True)
+
+    for i in range(100):
+        profiling.run_profiled(lambda: None, session_id=f"s{i}")
+
+    path = tmp_path / profiling.HISTORY_FILE_NAME
+    assert path.stat().st_size <= 4096
+    assert [entry["session_id"] for entry in profiling.get_history()] == [f"s{i}" for i in range(95, 100)]
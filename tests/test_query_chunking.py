@@ -0,0 +1,34 @@
+from pf_api_explorer.query_chunking import split_params, url_length
+
+BASE_URL = "https://api.example.com"
+PARAMS = {"start-date": "2025-01-01", "end-date": "2025-01-31"}
+
+
+def test_short_urls_are_not_split():
+    params = dict(PARAMS, product="Crème A,Crème B")
+    assert split_params(params, BASE_URL, "/reviews") == [params]
+    assert split_params(None, BASE_URL, "/reviews") == [None]
+
+
+def test_long_selection_is_split_into_disjoint_chunks_within_budget():
+    products = [f"Crème hydratante n°{i}" for i in range(300)]
+    params = dict(PARAMS, brand="AVÈNE", product=",".join(products + products[:10]))
+    chunks = split_params(params, BASE_URL, "/reviews", budget=2000)
+
+    assert len(chunks) > 1
+    assert all(url_length(BASE_URL, "/reviews", chunk) <= 2000 for chunk in chunks)
+    assert all(chunk["brand"] == "AVÈNE" and chunk["start-date"] == "2025-01-01" for chunk in chunks)
+    # Doublons retirés, ordre de sélection conservé
+    assert [p for chunk in chunks for p in chunk["product"].split(",")] == products
+
+
+def test_chunks_are_split_again_on_the_next_parameter():
+    brands = [f"MARQUE {i}" for i in range(200)]
+    products = [f"Produit {i} " + "x" * 1500 for i in range(2)]
+    params = dict(PARAMS, brand=",".join(brands), product=",".join(products))
+    chunks = split_params(params, BASE_URL, "/reviews", budget=2500)
+
+    assert all(url_length(BASE_URL, "/reviews", chunk) <= 2500 for chunk in chunks)
+    assert {chunk["product"] for chunk in chunks} == set(products)
+    for product in products:
+        assert [b for chunk in chunks if chunk["product"] == product for b in chunk["brand"].split(",")] == brands
@@ -0,0 +1,46 @@
+import datetime
+
+from pf_api_explorer.query_spec import DEFAULT_CACHE_TTL, RECENT_CACHE_TTL, QuerySpec, params_from_filters
+
+TODAY = datetime.date(2025, 6, 15)
+
+
+def test_spec_is_canonical_and_ignores_token_and_cursor():
+    a = QuerySpec.from_params("/reviews", {"brand": "AVÈNE", "start-date": "2025-01-01", "token": "x", "cursorMark": "*"})
+    b = QuerySpec.from_params("/reviews", {"start-date": datetime.date(2025, 1, 1), "brand": "AVÈNE", "country": None})
+    assert a == b and hash(a) == hash(b)
+    assert a.with_params({"brand": None, "rows": 100}).to_params() == {"start-date": "2025-01-01", "rows": "100"}
+    assert a.without("brand") == QuerySpec.from_params("/reviews", {"start-date": "2025-01-01"})
+
+
+def test_params_from_filters():
+    filters = {
+        "start_date": "2025-01-01", "end_date": "2025-01-31", "category": "ALL", "subcategory": "SOIN",
+        "brand": ["AVÈNE", "BIODERMA"], "country": ["ALL"], "source": ["amazon"], "market": [],
+        "attributes": ["texture"], "attributes_positive": [], "attributes_negative": ["odeur"]
+    }
+    expected = {"start-date": "2025-01-01", "end-date": "2025-01-31", "subcategory": "SOIN",
+                "brand": "AVÈNE,BIODERMA", "source": "amazon"}
+    assert params_from_filters(filters, include_attributes=False) == expected
+    assert params_from_filters(filters) == dict(expected, attribute="texture", **{"attribute-negative": "odeur"})
+
+
+def test_cache_ttl_depends_on_the_period():
+    def spec(end_date):
+        return QuerySpec.from_params("/metrics", {"start-date": "2025-01-01", "end-date": end_date})
+
+    assert spec("2025-06-01").cache_ttl(TODAY) is None
+    assert spec("2025-06-10").cache_ttl(TODAY) == RECENT_CACHE_TTL
+    assert spec(None).cache_ttl(TODAY) == DEFAULT_CACHE_TTL
+
+
+def test_month_pieces_cover_the_period_without_overlap():
+    spec = QuerySpec.from_params("/metrics", {"start-date": "2025-01-20", "end-date": "2025-03-05", "brand": "AVÈNE"})
+    pieces = [(p.get("start-date"), p.get("end-date"), p.get("brand")) for p in spec.month_pieces()]
+    assert pieces == [
+        ("2025-01-20", "2025-01-31", "AVÈNE"),
+        ("2025-02-01", "2025-02-28", "AVÈNE"),
+        ("2025-03-01", "2025-03-05", "AVÈNE"),
+    ]
+    undated = QuerySpec.from_params("/metrics", {"brand": "AVÈNE"})
+    assert undated.month_pieces() == [undated]
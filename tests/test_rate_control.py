@@ -0,0 +1,100 @@
+import threading
+import time
+
+from pf_api_explorer.rate_control import (
+    ADDITIVE_INCREASE, DECREASE_COOLDOWN, LOW_QUOTA_RATE_FACTOR, RateController, parse_retry_after
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_success_increases_rate_and_concurrency_additively():
+    controller = RateController(rate=10, concurrency=4, max_rate=100, max_concurrency=8, clock=FakeClock())
+    controller.on_success()
+    assert controller.rate == 10 + ADDITIVE_INCREASE / 10
+    assert controller.concurrency == 4.25
+
+    for _ in range(10_000):
+        controller.on_success()
+    assert (controller.rate, controller.concurrency) == (100, 8)
+
+
+def test_throttle_halves_once_per_cooldown_and_server_errors_decrease_less():
+    clock = FakeClock()
+    controller = RateController(rate=40, concurrency=8, clock=clock)
+    # Des 429 simultanés ne réduisent le débit qu'une fois
+    for _ in range(5):
+        controller.on_throttle()
+    assert (controller.rate, controller.concurrency, controller.throttled) == (20, 4, 5)
+
+    clock.now += DECREASE_COOLDOWN
+    controller.on_server_error()
+    assert (controller.rate, controller.concurrency) == (16, 3.2)
+
+    clock.now += DECREASE_COOLDOWN
+    for _ in range(20):
+        controller.on_throttle()
+        clock.now += DECREASE_COOLDOWN
+    assert (controller.rate, controller.concurrency) == (controller.min_rate, 1.0)
+
+
+def test_retry_after_blocks_every_call_for_the_requested_delay():
+    controller = RateController(rate=1000, concurrency=8)
+    controller.on_throttle(retry_after=0.2)
+    assert controller.snapshot()["blocked_for"] > 0.1
+
+    start = time.perf_counter()
+    controller.acquire()
+    controller.release()
+    assert time.perf_counter() - start >= 0.19
+
+
+def test_parse_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT", now=1445412480) == 30.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412480) == 0.0
+    assert parse_retry_after("") is None
+    assert parse_retry_after("bientôt") is None
+
+
+def test_low_quota_caps_the_rate():
+    controller = RateController(rate=150, max_rate=200, clock=FakeClock())
+    controller.update_quota(used=9_000, remaining=1_000, total=10_000)
+    assert controller.rate == 150 and not controller.quota_low
+
+    controller.update_quota(used=9_900, remaining=100, total=10_000)
+    assert controller.quota_low
+    assert controller.rate == controller.rate_ceiling == 200 * LOW_QUOTA_RATE_FACTOR
+    for _ in range(100):
+        controller.on_success()
+    assert controller.rate == 200 * LOW_QUOTA_RATE_FACTOR
+
+
+def test_concurrency_limit_is_respected():
+    controller = RateController(rate=1000, concurrency=3, max_concurrency=3)
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def call():
+        with controller.slot():
+            with lock:
+                active.append(None)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=call) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 3
+    assert controller.in_flight == 0
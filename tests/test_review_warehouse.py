@@ -0,0 +1,92 @@
+import time
+
+from pf_api_explorer.review_warehouse import ReviewWarehouse
+
+PARAMS = {"start-date": "2025-01-01", "end-date": "2025-01-31", "brand": "AVÈNE", "rows": 100}
+
+
+def docs(*ids):
+    return [{"id": i, "content": f"review {i}"} for i in ids]
+
+
+def record(warehouse, params, page):
+    writer = warehouse.writer(params)
+    writer.add_page(page)
+    writer.complete()
+    return writer
+
+
+def test_identical_context_is_served_in_api_order(tmp_path):
+    warehouse = ReviewWarehouse(tmp_path / "w.sqlite")
+    record(warehouse, PARAMS, docs("b", "a", "c"))
+
+    # La taille de page ne fait pas partie du contexte
+    other_page_size = dict(PARAMS, rows=500)
+    assert warehouse.get_coverage(other_page_size)["total"] == 3
+    assert [d["id"] for d in warehouse.load_docs(other_page_size)] == ["b", "a", "c"]
+    assert warehouse.get_coverage(dict(PARAMS, brand="BIODERMA")) is None
+
+
+def test_replaced_and_aborted_runs_release_their_reviews(tmp_path):
+    warehouse = ReviewWarehouse(tmp_path / "w.sqlite")
+    record(warehouse, PARAMS, docs("a", "b"))
+    record(warehouse, dict(PARAMS, country="FR"), docs("b"))
+    record(warehouse, PARAMS, docs("c"))
+    # « a » n'est plus cité ; « b » l'est encore par le contexte FR
+    assert warehouse.stats()["reviews"] == 2
+
+    writer = warehouse.writer(dict(PARAMS, brand="BIODERMA"))
+    writer.add_page(docs("d", "c"))
+    writer.abort()
+    assert warehouse.stats()["reviews"] == 2
+    assert warehouse.get_coverage(dict(PARAMS, brand="BIODERMA")) is None
+
+
+def test_prune_drops_expired_then_oldest_contexts(tmp_path):
+    warehouse = ReviewWarehouse(tmp_path / "w.sqlite", max_age_days=1, max_reviews=3)
+    old = record(warehouse, PARAMS, docs("a"))
+    conn = warehouse._connect()
+    with conn:
+        conn.execute("UPDATE contexts SET completed_at = ? WHERE context_key = ?", (time.time() - 2 * 86400, old.key))
+
+    record(warehouse, dict(PARAMS, country="FR"), docs("b", "c"))
+    assert warehouse.get_coverage(PARAMS) is None
+    assert warehouse.stats()["reviews"] == 2
+
+    # Le contexte qui vient d'être récupéré est conservé même s'il dépasse à lui seul la limite
+    record(warehouse, dict(PARAMS, country="DE"), docs("d", "e", "f", "g"))
+    assert warehouse.get_coverage(dict(PARAMS, country="FR")) is None
+    assert warehouse.get_coverage(dict(PARAMS, country="DE"))["total"] == 4
+    assert warehouse.stats()["reviews"] == 4
+
+
+def test_default_path_is_in_the_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PF_DATA_DIR", str(tmp_path / "data"))
+    assert ReviewWarehouse().path == tmp_path / "data" / "review_warehouse.sqlite"
+
+
+def test_coverage_is_replaced_only_by_a_completed_run(tmp_path):
+    warehouse = ReviewWarehouse(tmp_path / "w.sqlite")
+    first = warehouse.writer(PARAMS)
+    second = warehouse.writer(PARAMS)
+    first.add_page(docs("a", "b"))
+    second.add_page(docs("b"))
+    assert warehouse.get_coverage(PARAMS) is None
+
+    first.complete()
+    assert [d["id"] for d in warehouse.load_docs(PARAMS)] == ["a", "b"]
+    second.add_page(docs("c"))
+    # La récupération terminée en dernier devient la référence
+    second.complete()
+    assert [d["id"] for d in warehouse.load_docs(PARAMS)] == ["b", "c"]
+    assert warehouse.stats()["reviews"] == 2
+
+
+def test_reviews_are_stored_once_and_kept_up_to_date(tmp_path):
+    warehouse = ReviewWarehouse(tmp_path / "w.sqlite")
+    record(warehouse, PARAMS, docs("a"))
+    record(warehouse, dict(PARAMS, country="FR"), [{"id": "a", "content": "review modifiée"}, {"content": "sans id"}])
+
+    assert warehouse.stats()["reviews"] == 2
+    assert warehouse.load_docs(PARAMS) == [{"id": "a", "content": "review modifiée"}]
+    assert warehouse.load_docs(dict(PARAMS, country="FR"))[1] == {"content": "sans id"}
@@ -0,0 +1,53 @@
+import random
+import time
+
+from pf_api_explorer.search_index import ProductSearchIndex
+
+PRODUCTS = [
+    (1, ("AVÈNE", "Cicalfate+ Crème réparatrice")),
+    (2, ("BIODERMA", "Sensibio H2O")),
+    (3, ("AVÈNE", "Eau thermale spray")),
+    (4, ("LA ROCHE-POSAY", "Cicaplast Baume B5")),
+]
+
+
+def test_accents_and_case_are_folded():
+    index = ProductSearchIndex(PRODUCTS)
+    assert list(index.search("avene")) == [1, 3]
+    assert list(index.search("CREME")) == [1]
+    assert list(index.search("roche posay")) == [4]
+
+
+def test_multi_token_query_is_a_prefix_and():
+    index = ProductSearchIndex(PRODUCTS)
+    assert list(index.search("cica")) == [1, 4]
+    assert list(index.search("cica ave")) == [1]
+    assert list(index.search("ave bio")) == []
+    assert list(index.search("  ")) == [1, 2, 3, 4]
+
+
+def test_results_are_keys_not_positions():
+    # Même catalogue dans un autre ordre : les clés renvoyées restent celles des produits trouvés
+    index = ProductSearchIndex(reversed(PRODUCTS))
+    assert sorted(index.search("avene")) == [1, 3]
+
+
+def test_multi_token_search_on_50k_products_is_under_a_millisecond():
+    rng = random.Random(0)
+    syllables = ["sa", "co", "ve", "ri", "ma", "lu", "pe", "to", "ni", "de", "s", "c"]
+
+    def word():
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))
+
+    brands = [word().upper() for _ in range(500)]
+    items = [(i, (rng.choice(brands), " ".join(word() for _ in range(4)))) for i in range(50_000)]
+    index = ProductSearchIndex(items)
+
+    for query in ["s c", "sa co", "ve ri ma"]:
+        index.search(query)
+        timings = []
+        for _ in range(20):
+            start = time.perf_counter()
+            index.search(query)
+            timings.append(time.perf_counter() - start)
+        assert sorted(timings)[len(timings) // 2] < 0.001, query
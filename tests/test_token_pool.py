@@ -0,0 +1,51 @@
+import uuid
+
+import pytest
+
+from pf_api_explorer.rate_control import MAX_RATE, get_rate_controller
+from pf_api_explorer.token_pool import DEFAULT_TOKEN_NAME, PoolToken, TokenPool, parse_token_config
+
+
+def pool_token(name, cost_center=None, max_rate=MAX_RATE):
+    # Valeurs uniques : les contrôleurs de débit sont partagés par tout le processus
+    return PoolToken(name, f"{name}-{uuid.uuid4().hex}", cost_center, max_rate)
+
+
+def test_parse_token_config():
+    assert parse_token_config({"token": "abc"}) == [PoolToken(DEFAULT_TOKEN_NAME, "abc")]
+    tokens = parse_token_config({"token": "abc", "tokens": [
+        {"token": "t1", "cost_center": "FR", "max_rate": 50},
+        {"token": "t2", "name": "export"}
+    ]})
+    assert tokens == [PoolToken("token 1", "t1", "FR", 50.0), PoolToken("export", "t2", None, MAX_RATE)]
+
+
+def test_invalid_pools_are_rejected():
+    with pytest.raises(ValueError):
+        TokenPool([])
+    with pytest.raises(ValueError):
+        TokenPool([pool_token("a"), pool_token("a")])
+    with pytest.raises(ValueError):
+        TokenPool([pool_token("a", "FR")]).candidates("DE")
+
+
+def test_leases_spread_calls_by_outstanding_load():
+    pool = TokenPool([pool_token("a"), pool_token("b")])
+    with pool.lease() as first, pool.lease() as second:
+        assert {first.name, second.name} == {"a", "b"}
+        with pool.lease() as third:
+            assert {row["name"]: row["outstanding"] for row in pool.snapshot()}[third.name] == 2
+    assert all(row["outstanding"] == 0 for row in pool.snapshot())
+
+
+def test_throttled_or_exhausted_tokens_are_a_last_resort():
+    a, b, c = pool_token("a", "FR"), pool_token("b", "FR"), pool_token("c", "DE")
+    pool = TokenPool([a, b, c])
+    assert pool.cost_centers() == ["DE", "FR"]
+
+    get_rate_controller(a.token).on_throttle(retry_after=60)
+    assert pool.choose("FR") == b
+    get_rate_controller(b.token).update_quota(used=1000, remaining=0, total=1000)
+    # Suspendu par un Retry-After plutôt que sans quota ; jamais un token d'un autre centre de coûts
+    assert pool.choose("FR") == a
+    assert pool.choose() == c